@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+科室关键词分类（抓取脚本和拜访安排脚本共用）
+所有关键词编译为一个正则，一次扫描科室名称即可得到类别标签，
+如 '中医妇产科' -> '妇产科'，'呼吸与危重症医学科' -> '呼吸科'，未匹配返回 None
+"""
+
+import re
+from functools import lru_cache
+
+OBGYN = '妇产科'
+
+# 拜访安排使用的科室类别：(类别, 关键词列表)，按优先级排列
+# 一个科室名称匹配多个类别时取排在前面的类别（如 '中医妇产科' 归为妇产科而不是中医科）
+DEPARTMENT_CATEGORIES = [
+    (OBGYN, ['妇科', '产科', '妇产科']),
+    ('呼吸科', ['呼吸', '肺']),
+    ('儿科', ['儿科', '儿内', '小儿普胸泌外科']),
+    ('泌尿科', ['泌尿', '男科']),
+    ('肾内科', ['肾']),
+    ('中医科', ['中医']),
+    ('全科', ['全科']),
+    ('老年科', ['老年']),
+]
+
+# 拜访时优先安排的科室类别
+PRIORITY_CATEGORIES = {'呼吸科', '儿科', '泌尿科', '肾内科', '中医科', '全科', '老年科'}
+
+# 医生抓取的目标科室
+SCRAPE_TARGET_CATEGORIES = [
+    ('呼吸科', ['呼吸']),  # 匹配呼吸科、呼吸内科、呼吸与危重症医学科等
+    ('儿科', ['儿科', '儿内科']),  # '小儿', '新生儿'
+    (OBGYN, ['妇科', '妇产科']),  # '产科'
+    ('泌尿科', ['泌尿']),  # 匹配泌尿科、泌尿外科等
+    ('肾内科', ['肾脏', '肾内科', '肾病']),
+    ('中医科', ['中医']),
+    ('全科', ['全科']),
+]
+
+
+class KeywordMatcher:
+    """多关键词匹配器：关键词合并为一个正则，按类别优先级返回科室类别"""
+
+    def __init__(self, categories):
+        self.categories = [label for label, _ in categories]
+        self._priority = {}
+        self._label = {}
+        for priority, (label, keywords) in enumerate(categories):
+            for keyword in keywords:
+                if keyword not in self._label:
+                    self._label[keyword] = label
+                    self._priority[keyword] = priority
+        # 前瞻匹配可找出每个位置开始的关键词（允许重叠）；同一位置优先高优先级类别、再优先长关键词
+        keywords = sorted(self._label, key=lambda k: (self._priority[k], -len(k)))
+        self._pattern = re.compile('(?=(' + '|'.join(map(re.escape, keywords)) + '))')
+        self.category = lru_cache(maxsize=4096)(self._category)
+
+    def _category(self, name):
+        if not isinstance(name, str):
+            return None
+        best = None
+        for match in self._pattern.finditer(name):
+            keyword = match.group(1)
+            if best is None or self._priority[keyword] < self._priority[best]:
+                best = keyword
+        return self._label[best] if best is not None else None
+
+    def matches(self, name):
+        return self.category(name) is not None
+
+
+DEPARTMENT_MATCHER = KeywordMatcher(DEPARTMENT_CATEGORIES)
+SCRAPE_TARGET_MATCHER = KeywordMatcher(SCRAPE_TARGET_CATEGORIES)
+
+
+def department_category(name):
+    """科室名称 -> 类别标签（DEPARTMENT_CATEGORIES），未匹配返回 None"""
+    return DEPARTMENT_MATCHER.category(name)
+
+
+def is_obgyn(name):
+    return DEPARTMENT_MATCHER.category(name) == OBGYN
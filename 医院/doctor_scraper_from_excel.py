@@ -5,17 +5,12 @@
 基于Excel文件中的'医院科室筛选后'标签页中的医院和科室信息抓取医生数据
 """
 
-import requests
-import time
-import json
 import pandas as pd
-from bs4 import BeautifulSoup
 from datetime import datetime
 import logging
 import os
-from urllib.parse import urljoin, urlparse
-import re
-import random
+
+from haodf_crawler import PAGE_CACHE_PATH, AsyncCrawler, DoctorPageCollector, PageCache, doctor_page_tasks
 
 # 配置区域 - 请根据实际情况修改以下配置
 EXCEL_FILE_PATH = "/Users/a000/Documents/济生/医院拜访25/贵州省医院科室信息_20251105-3.xlsx"
@@ -26,6 +21,10 @@ INPUT_DIR = os.path.dirname(EXCEL_FILE_PATH)
 # 输出文件放在输入文件同一目录下
 OUTPUT_FILE_NAME = os.path.join(INPUT_DIR, "贵州省医院医生信息_{}.xlsx").format(datetime.now().strftime("%Y%m%d_%H%M%S"))
 
+MAX_CONCURRENCY_PER_HOST = 4  # 同时请求数
+FIXTURE_DIR = None  # 设置目录后把抓到的页面保存为离线样本
+PAGE_CACHE_FILE = PAGE_CACHE_PATH  # 页面缓存文件，增量抓取并输出医生变动；设为 None 则每次全部重新抓取
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -38,35 +37,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class DoctorScraperFromExcel:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
+    def __init__(self, crawler=None):
+        self.crawler = crawler or AsyncCrawler(
+            max_per_host=MAX_CONCURRENCY_PER_HOST, fixture_dir=FIXTURE_DIR,
+            cache=PageCache(PAGE_CACHE_FILE) if PAGE_CACHE_FILE else None)
         
         self.doctors_data = []
         self.processed_departments = []
-        
-    def get_page(self, url, max_retries=3):
-        """获取页面内容"""
-        for attempt in range(max_retries):
-            try:
-                response = self.session.get(url, timeout=30)
-                response.raise_for_status()
-                response.encoding = 'utf-8'  # 好大夫网站使用utf-8编码
-                return response.text
-            except Exception as e:
-                logger.warning(f"获取页面失败 (尝试 {attempt + 1}/{max_retries}): {url}, 错误: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # 指数退避
-                else:
-                    logger.error(f"最终获取页面失败: {url}")
-                    return None
+        self.doctor_pages = DoctorPageCollector(self.crawler)  # 按 (记录序号, 页码) 暂存
+        self.doctor_changes = []  # 与上次抓取相比各科室新增/减少的医生
+        self.page_stats = {}  # 医生列表分页请求统计（含浪费的请求数）
     
     def read_hospitals_from_excel(self):
         """从Excel文件读取医院科室信息"""
@@ -102,138 +82,8 @@ class DoctorScraperFromExcel:
             logger.error(f"读取Excel文件时出错: {e}")
             return []
     
-    def get_department_doctors(self, dept_url, dept_name, hospital_name, city, hospital_level='未知', doctor_count=0):
-        """获取科室的医生列表，支持分页"""
-        doctors = []
-        
-        # 计算需要抓取的页数（每页20个医生）
-        total_pages = max(1, (doctor_count + 19) // 20) if doctor_count > 0 else 5  # 默认最多5页
-        
-        for page in range(1, total_pages + 1):
-            # 构造分页URL
-            if '/keshi/' in dept_url and not dept_url.endswith('/tuijian.html'):
-                if dept_url.endswith('.html'):
-                    base_url = dept_url.replace('.html', '/tuijian.html')
-                else:
-                    base_url = dept_url + '/tuijian.html'
-            else:
-                base_url = dept_url
-            
-            # 添加分页参数
-            if page == 1:
-                page_url = f"{base_url}?type=keshi"
-            else:
-                page_url = f"{base_url}?type=keshi&p={page}"
-            
-            logger.info(f"抓取第{page}页医生信息: {page_url}")
-            
-            html = self.get_page(page_url)
-            if not html:
-                continue
-
-            soup = BeautifulSoup(html, 'html.parser')
-            page_doctors = []
-
-            # 根据实际HTML结构查找医生信息
-            # 查找医生列表容器
-            doctor_list = soup.find('ul', class_='doc-list')
-            if doctor_list:
-                doctor_items = doctor_list.find_all('li', class_='item')
-                
-                for item in doctor_items:
-                    try:
-                        # 查找医生链接
-                        doctor_link = item.find('a', class_='item-bd')
-                        if not doctor_link:
-                            continue
-                        
-                        doctor_url = urljoin(dept_url, doctor_link.get('href', ''))
-                        
-                        # 提取医生姓名
-                        name_span = item.find('span', class_='name')
-                        raw_name = name_span.get_text(strip=True) if name_span else ''
-                        
-                        # 清洗医生姓名，移除科室前缀
-                        doctor_name = self.clean_doctor_name(raw_name, dept_name)
-                        
-                        # 提取职称
-                        grade_span = item.find('span', class_='grade')
-                        title = grade_span.get_text(strip=True) if grade_span else ''
-                        
-                        # 提取学历/教授信息
-                        edu_grade_span = item.find('span', class_='edu-grade')
-                        if edu_grade_span:
-                            edu_grade = edu_grade_span.get_text(strip=True)
-                            if edu_grade:
-                                title = f"{title} {edu_grade}" if title else edu_grade
-                        
-                        # 提取擅长领域
-                        goodat_p = item.find('p', class_='goodat')
-                        specialty = ''
-                        if goodat_p:
-                            specialty_text = goodat_p.get_text(strip=True)
-                            if specialty_text.startswith('擅长：'):
-                                specialty = specialty_text[3:]
-                            else:
-                                specialty = specialty_text
-                        
-                        if doctor_name and len(doctor_name) >= 2:
-                            doctor_info = {
-                                '医院名称': hospital_name,
-                                '所属城市': city,
-                                '医院等级': hospital_level,
-                                '科室名称': dept_name,
-                                '医生姓名': doctor_name,
-                                '职称': title,
-                                '擅长领域': specialty,
-                                '医生链接': doctor_url,
-                                '抓取时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                            }
-                            
-                            page_doctors.append(doctor_info)
-                            logger.info(f"发现医生: {hospital_name} - {dept_name} - {doctor_name}")
-                            
-                    except Exception as e:
-                        logger.error(f"解析医生信息时出错: {e}")
-                        continue
-            
-
-            
-            # 将当前页的医生添加到总列表
-            doctors.extend(page_doctors)
-            
-            # 如果当前页没有医生，可能已经到了最后一页
-            if not page_doctors:
-                break
-                
-        return doctors
-    
-    def clean_doctor_name(self, raw_name, dept_name):
-        """清洗医生姓名，移除科室前缀和其他无关信息"""
-        # 移除科室名称前缀
-        name = raw_name
-        if dept_name in name:
-            name = name.replace(dept_name, '')
-        
-        # 移除常见的职称后缀
-        title_patterns = [
-            r'主任医师.*?$', r'副主任医师.*?$', r'主治医师.*?$', r'住院医师.*?$',
-            r'教授.*?$', r'副教授.*?$', r'讲师.*?$',
-            r'科主任.*?$', r'副主任.*?$', r'主任.*?$',
-            r'\d+\.\d+$', r'\d+$'  # 移除评分数字
-        ]
-        
-        for pattern in title_patterns:
-            name = re.sub(pattern, '', name)
-        
-        # 清理空格和特殊字符
-        name = re.sub(r'\s+', '', name)
-        name = name.strip()
-        
-        return name if name else raw_name
-    
     def scrape_doctors_from_excel(self):
-        """根据Excel中的医院科室信息抓取医生数据"""
+        """根据Excel中的医院科室信息抓取医生数据（异步并发）"""
         logger.info("开始从Excel文件中的医院科室信息抓取医生数据...")
         
         # 从Excel读取医院科室信息
@@ -245,39 +95,28 @@ class DoctorScraperFromExcel:
         total_records = len(hospitals_depts)
         logger.info(f"共需处理 {total_records} 条医院科室记录")
         
-        for i, record in enumerate(hospitals_depts, 1):
-            hospital_name = record['name']
-            city = record['city']
-            hospital_level = record['level']
-            dept_name = record['department']
-            dept_url = record['dept_url']
-            doctor_count = record['doctor_count'] if 'doctor_count' in record else 0
-            
-            logger.info(f"正在处理 [{i}/{total_records}]: {hospital_name} - {dept_name}")
-            
-            try:
-                # 检查是否已经处理过相同的科室（避免重复抓取）
-                dept_identifier = f"{hospital_name}_{dept_name}"
-                if dept_identifier in self.processed_departments:
-                    logger.info(f"科室 {dept_name} 已处理过，跳过")
-                    continue
-                
-                # 获取科室医生信息
-                doctors = self.get_department_doctors(
-                    dept_url, dept_name, hospital_name, city, hospital_level, doctor_count
-                )
-                
-                self.doctors_data.extend(doctors)
-                self.processed_departments.append(dept_identifier)
-                
-                logger.info(f"科室 {dept_name} 抓取完成，共获取 {len(doctors)} 位医生")
-                
-                # 避免请求过于频繁
-                time.sleep(random.uniform(1, 3))
-                
-            except Exception as e:
-                logger.error(f"处理 {hospital_name} - {dept_name} 时出错: {e}")
+        tasks = []
+        for i, record in enumerate(hospitals_depts):
+            # 检查是否已经处理过相同的科室（避免重复抓取）
+            dept_identifier = f"{record['name']}_{record['department']}"
+            if dept_identifier in self.processed_departments:
+                logger.info(f"科室 {record['department']} 已处理过，跳过")
                 continue
+            self.processed_departments.append(dept_identifier)
+            
+            doctor_count = record['doctor_count']
+            tasks.extend(doctor_page_tasks(
+                record['dept_url'], int(doctor_count) if pd.notna(doctor_count) else 0,
+                hospital_name=record['name'], city=record['city'], hospital_level=record['level'],
+                dept_name=record['department'], order=(i,),
+            ))
+        
+        logger.info(f"共 {len(self.processed_departments)} 个科室，初始分页任务 {len(tasks)} 个")
+        self.crawler.crawl(tasks, self.doctor_pages.handle, should_fetch=self.doctor_pages.should_fetch)
+        
+        self.doctors_data.extend(self.doctor_pages.doctors())
+        self.page_stats = self.doctor_pages.page_stats()
+        self.doctor_changes = self.doctor_pages.roster_changes()
         
         logger.info(f"抓取完成！共获取 {len(self.doctors_data)} 位医生信息")
     
@@ -293,8 +132,11 @@ class DoctorScraperFromExcel:
             # 创建DataFrame
             df = pd.DataFrame(self.doctors_data)
             
-            # 保存到Excel文件
-            df.to_excel(OUTPUT_FILE_NAME, index=False, engine='openpyxl')
+            # 保存到Excel文件，医生变动另存一个标签页
+            with pd.ExcelWriter(OUTPUT_FILE_NAME, engine='openpyxl') as writer:
+                df.to_excel(writer, sheet_name='Sheet1', index=False)
+                if self.doctor_changes:
+                    pd.DataFrame(self.doctor_changes).to_excel(writer, sheet_name='医生变动', index=False)
             logger.info(f"数据已保存到 {OUTPUT_FILE_NAME}")
             
         except Exception as e:
@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+好大夫在线异步抓取引擎（各抓取脚本共用）
+功能：
+1. 基于 asyncio 的任务队列：医院列表页 → 医院科室页 → (医院, 科室, 页码) 医生列表页，处理结果可产生新任务
+2. 按主机限制并发数，每个主机独立的礼貌间隔：请求成功逐步缩短，被限流/出错时加倍
+3. 可选把抓到的页面保存为离线样本，并提供本地HTTP模拟服务器回放样本，便于离线测试
+4. 可选的磁盘页面缓存（SQLite）：按URL保存 ETag / Last-Modified / 内容哈希，
+   重新抓取时发送条件请求，页面未变化时直接复用上次的解析结果，并输出各科室医生的增减变化
+
+HTTP 客户端优先使用 aiohttp，未安装时退化为线程池中的 requests
+
+离线测试：
+    python haodf_crawler.py serve <样本目录> [端口]
+然后把抓取脚本的 HAODF_BASE_URL 改为 http://127.0.0.1:<端口> 运行
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import time
+import zlib
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from haodf_parser import DOCTORS_PER_PAGE, build_doctor_record, doctor_page_url, parse_doctor_list
+
+# aiohttp 可选：没有时用线程池执行 requests
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+# ===================== 配置项 =====================
+MAX_CONCURRENCY_PER_HOST = 4  # 每个主机的最大并发请求数
+MIN_DELAY = 0.5  # 同一主机两次请求的最小间隔（秒）
+MAX_DELAY = 30.0  # 被限流时间隔的上限（秒）
+MAX_RETRIES = 3
+REQUEST_TIMEOUT = 30
+# 视为被限流/服务器过载的状态码，遇到时加大间隔并重试
+THROTTLE_STATUS = (429, 500, 502, 503, 504)
+DEFAULT_MAX_PAGES = 5  # 科室医生数量未知时最多抓取的页数；已知数量时最多比计划多抓 DEFAULT_MAX_PAGES-1 页
+# 页面缓存文件（各抓取脚本共用）
+PAGE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "haodf_page_cache.sqlite")
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+# =================================================
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlTask:
+    """抓取任务：kind 为 'hospital_list' / 'hospital' / 'page'，meta 保存医院、科室、页码等上下文"""
+
+    __slots__ = ('kind', 'url', 'meta')
+
+    def __init__(self, kind, url, **meta):
+        self.kind = kind
+        self.url = url
+        self.meta = meta
+
+    def __repr__(self):
+        return f"CrawlTask({self.kind}, {self.url})"
+
+
+class FetchSkipped(Exception):
+    """轮到请求时任务已不再需要（should_fetch 返回 False）"""
+
+
+class HostThrottle:
+    """单个主机的并发限制和自适应礼貌间隔"""
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY_PER_HOST, min_delay=MIN_DELAY, max_delay=MAX_DELAY):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min_delay
+        self._next_time = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait_turn(self):
+        """等到距离本主机上一次请求至少 delay 秒（加随机抖动）再返回"""
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_time = max(now, self._next_time) + self.delay * random.uniform(0.5, 1.5)
+
+    def on_success(self):
+        self.delay = max(self.min_delay, self.delay * 0.9)
+
+    def on_throttled(self, retry_after=None):
+        self.delay = min(self.max_delay, max(self.delay * 2, retry_after or 0))
+        logger.info(f"请求被限流或失败，间隔调整为 {self.delay:.1f} 秒")
+
+
+def fixture_path(fixture_dir, url):
+    """URL 对应的离线样本文件路径，查询参数编码进文件名"""
+    parts = urlsplit(url)
+    path = parts.path.lstrip('/') or 'index.html'
+    if parts.query:
+        path = f"{path}__{parts.query.replace('&', '_').replace('=', '-')}"
+    return os.path.join(fixture_dir, *path.split('/'))
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """
+    磁盘页面缓存（SQLite）
+    pages: URL -> ETag、Last-Modified、内容哈希、压缩后的页面、该内容的解析结果
+    rosters: 科室 -> 上次抓取到的医生列表，用于输出医生增减变化
+    只在事件循环所在线程中使用
+    """
+
+    def __init__(self, path=PAGE_CACHE_PATH):
+        self.path = path
+        self.parse_hits = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                           "hash TEXT, body BLOB, parsed TEXT, fetched TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rosters (key TEXT PRIMARY KEY, doctors TEXT, updated TEXT)")
+        self._conn.commit()
+
+    def conditional_headers(self, url):
+        """返回条件请求头，没有缓存时返回空字典"""
+        row = self._conn.execute("SELECT etag, last_modified FROM pages WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers['If-None-Match'] = row[0]
+        if row and row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def get_body(self, url):
+        row = self._conn.execute("SELECT body FROM pages WHERE url = ?", (url,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row and row[0] is not None else None
+
+    def store(self, url, headers, text):
+        """保存新抓到的页面；内容哈希未变时保留原解析结果，返回内容是否变化"""
+        new_hash = content_hash(text)
+        row = self._conn.execute("SELECT hash FROM pages WHERE url = ?", (url,)).fetchone()
+        changed = row is None or row[0] != new_hash
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        if changed:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, hash, body, parsed, fetched) "
+                "VALUES (?, ?, ?, ?, ?, NULL, ?)",
+                (url, headers.get('ETag'), headers.get('Last-Modified'), new_hash,
+                 zlib.compress(text.encode('utf-8')), now),
+            )
+        else:
+            self._conn.execute("UPDATE pages SET etag = ?, last_modified = ?, fetched = ? WHERE url = ?",
+                               (headers.get('ETag'), headers.get('Last-Modified'), now, url))
+        self._conn.commit()
+        return changed
+
+    def parse(self, url, html, parse_func):
+        """返回 parse_func(html)；页面内容与上次解析时相同则直接返回缓存的解析结果"""
+        html_hash = content_hash(html)
+        row = self._conn.execute("SELECT hash, parsed FROM pages WHERE url = ?", (url,)).fetchone()
+        if row and row[0] == html_hash and row[1] is not None:
+            self.parse_hits += 1
+            return json.loads(row[1])
+        result = parse_func(html)
+        if row and row[0] == html_hash:
+            self._conn.execute("UPDATE pages SET parsed = ? WHERE url = ?",
+                               (json.dumps(result, ensure_ascii=False), url))
+            self._conn.commit()
+        return result
+
+    def diff_roster(self, key, doctors):
+        """
+        与上次保存的科室医生列表比较（按医生链接），并保存本次列表
+        返回: (新增医生, 减少的医生)；该科室第一次抓取时返回 None
+        """
+        row = self._conn.execute("SELECT doctors FROM rosters WHERE key = ?", (key,)).fetchone()
+        self._conn.execute("INSERT OR REPLACE INTO rosters (key, doctors, updated) VALUES (?, ?, ?)",
+                           (key, json.dumps(doctors, ensure_ascii=False), time.strftime("%Y-%m-%d %H:%M:%S")))
+        self._conn.commit()
+        if row is None:
+            return None
+        previous = {doctor['医生链接']: doctor for doctor in json.loads(row[0])}
+        current = {doctor['医生链接']: doctor for doctor in doctors}
+        added = [doctor for url, doctor in current.items() if url not in previous]
+        removed = [doctor for url, doctor in previous.items() if url not in current]
+        return added, removed
+
+    def close(self):
+        self._conn.close()
+
+
+class AsyncCrawler:
+    """异步抓取引擎：任务队列 + 按主机限流 + 失败重试"""
+
+    def __init__(self, max_per_host=MAX_CONCURRENCY_PER_HOST, min_delay=MIN_DELAY, max_delay=MAX_DELAY,
+                 max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT, headers=None, fixture_dir=None, cache=None):
+        self.max_per_host = max_per_host
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.headers = dict(DEFAULT_HEADERS if headers is None else headers)
+        # 设置后每个成功抓取的页面都另存为离线样本
+        self.fixture_dir = fixture_dir
+        # PageCache，设置后发送条件请求并复用未变化页面的解析结果
+        self.cache = cache
+        self.stats = {'requests': 0, 'failures': 0, 'throttled': 0, 'not_modified': 0, 'unchanged': 0, 'skipped': 0}
+        self._throttles = {}
+        self._session = None
+
+    def _throttle(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._throttles:
+            self._throttles[host] = HostThrottle(self.max_per_host, self.min_delay, self.max_delay)
+        return self._throttles[host]
+
+    async def _request(self, url, headers):
+        """发起一次GET请求，返回 (状态码, 响应头, 文本)"""
+        if AIOHTTP_AVAILABLE:
+            async with self._session.get(url, headers=headers) as response:
+                text = await response.text(encoding='utf-8', errors='replace')
+                return response.status, CaseInsensitiveDict(response.headers), text
+
+        def do_get():
+            response = self._session.get(url, headers=headers, timeout=self.timeout)
+            response.encoding = 'utf-8'  # 好大夫网站使用utf-8编码
+            return response.status_code, response.headers, response.text
+
+        return await asyncio.to_thread(do_get)
+
+    async def fetch(self, url, headers=None, still_needed=None):
+        """
+        获取页面，失败时按指数退避重试
+        still_needed: 可选回调，等到主机空闲、即将发出请求时返回 False 则抛出 FetchSkipped
+        返回: (状态码, 响应头, 文本)；最终失败返回 None
+        """
+        throttle = self._throttle(url)
+        for attempt in range(self.max_retries):
+            async with throttle.semaphore:
+                await throttle.wait_turn()
+                if still_needed is not None and not still_needed():
+                    raise FetchSkipped(url)
+                self.stats['requests'] += 1
+                try:
+                    status, response_headers, text = await self._request(url, headers)
+                except Exception as e:
+                    status, response_headers, text = None, {}, ''
+                    logger.warning(f"获取页面失败 (尝试 {attempt + 1}/{self.max_retries}): {url}, 错误: {e}")
+
+            if status == 304:
+                throttle.on_success()
+                return status, response_headers, text
+            if status is not None and status not in THROTTLE_STATUS:
+                throttle.on_success()
+                if status >= 400:
+                    logger.error(f"获取页面失败: {url}, 状态码: {status}")
+                    self.stats['failures'] += 1
+                    return None
+                if self.fixture_dir and status == 200:
+                    self._save_fixture(url, text)
+                return status, response_headers, text
+
+            if status is not None:
+                self.stats['throttled'] += 1
+                logger.warning(f"获取页面失败 (尝试 {attempt + 1}/{self.max_retries}): {url}, 状态码: {status}")
+            retry_after = response_headers.get('Retry-After', '')
+            throttle.on_throttled(float(retry_after) if retry_after.isdigit() else None)
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(2 ** attempt)  # 指数退避
+
+        logger.error(f"最终获取页面失败: {url}")
+        self.stats['failures'] += 1
+        return None
+
+    async def fetch_page(self, url, still_needed=None):
+        """获取页面文本；配置了缓存时发送条件请求，304 时返回缓存的页面。失败返回 None"""
+        if self.cache is None:
+            result = await self.fetch(url, still_needed=still_needed)
+            return result[2] if result else None
+
+        result = await self.fetch(url, self.cache.conditional_headers(url), still_needed)
+        if result is None:
+            return None
+        status, response_headers, text = result
+        if status == 304:
+            cached = self.cache.get_body(url)
+            if cached is not None:
+                self.stats['not_modified'] += 1
+                return cached
+            # 缓存的页面丢失，重新完整获取
+            result = await self.fetch(url)
+            if result is None:
+                return None
+            status, response_headers, text = result
+        if not self.cache.store(url, response_headers, text):
+            self.stats['unchanged'] += 1
+        return text
+
+    def parse(self, url, html, parse_func):
+        """解析页面；配置了缓存时未变化的页面直接返回上次的解析结果"""
+        if self.cache is None:
+            return parse_func(html)
+        return self.cache.parse(url, html, parse_func)
+
+    def _save_fixture(self, url, text):
+        path = fixture_path(self.fixture_dir, url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    async def _open(self):
+        if AIOHTTP_AVAILABLE:
+            self._session = aiohttp.ClientSession(
+                headers=self.headers, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        else:
+            self._session = requests.Session()
+            self._session.headers.update(self.headers)
+
+    async def _close(self):
+        if AIOHTTP_AVAILABLE:
+            await self._session.close()
+        else:
+            self._session.close()
+        self._session = None
+        self._throttles = {}
+
+    async def run(self, seeds, handler, workers=None, should_fetch=None):
+        """
+        处理任务队列直到全部完成
+        参数:
+            seeds: 初始任务列表
+            handler: handler(task, html) -> 新任务列表；html 为 None 表示抓取失败
+            workers: 并发协程数，默认为每主机并发数的2倍
+            should_fetch: 可选 should_fetch(task) -> bool，即将请求时返回 False 则跳过该任务（如已确认是多余的分页）
+        """
+        queue = asyncio.Queue()
+        for task in seeds:
+            queue.put_nowait(task)
+
+        async def worker():
+            while True:
+                task = await queue.get()
+                try:
+                    still_needed = (lambda: should_fetch(task)) if should_fetch is not None else None
+                    html = await self.fetch_page(task.url, still_needed)
+                    for new_task in handler(task, html) or []:
+                        queue.put_nowait(new_task)
+                except FetchSkipped:
+                    self.stats['skipped'] += 1
+                except Exception as e:
+                    logger.error(f"处理任务 {task} 时出错: {e}")
+                finally:
+                    queue.task_done()
+
+        await self._open()
+        try:
+            worker_tasks = [asyncio.create_task(worker()) for _ in range(workers or self.max_per_host * 2)]
+            await queue.join()
+            for worker_task in worker_tasks:
+                worker_task.cancel()
+            await asyncio.gather(*worker_tasks, return_exceptions=True)
+        finally:
+            await self._close()
+
+    def crawl(self, seeds, handler, workers=None, should_fetch=None):
+        """同步入口：运行事件循环处理任务队列，返回请求统计"""
+        start = time.time()
+        asyncio.run(self.run(seeds, handler, workers, should_fetch))
+        logger.info(f"抓取结束：请求 {self.stats['requests']} 次，限流 {self.stats['throttled']} 次，"
+                    f"失败 {self.stats['failures']} 个页面，用时 {time.time() - start:.1f} 秒")
+        if self.cache is not None:
+            logger.info(f"页面缓存：未修改(304) {self.stats['not_modified']} 个，内容未变 {self.stats['unchanged']} 个，"
+                        f"跳过解析 {self.cache.parse_hits} 次")
+        return self.stats
+
+
+def doctor_page_tasks(dept_url, doctor_count, **meta):
+    """
+    科室医生列表的初始分页任务：按科室页上 div.count 的医生数量计划页数（每页20位），
+    一次性生成全部计划页并发抓取；数量未知时只计划第1页
+    meta 需包含 hospital_name、city、hospital_level、dept_name，原样传给后续任务
+    """
+    planned_pages = max(1, (doctor_count + DOCTORS_PER_PAGE - 1) // DOCTORS_PER_PAGE)
+    return [CrawlTask('page', doctor_page_url(dept_url, page), dept_url=dept_url, page=page,
+                      doctor_count=doctor_count, planned_pages=planned_pages, **meta)
+            for page in range(1, planned_pages + 1)]
+
+
+class DoctorPageCollector:
+    """
+    处理医生列表页任务，按 (科室序号, 页码) 暂存并发抓取的结果，抓取结束后按原顺序汇总
+    分页任务的 meta 需包含 order（科室序号元组），由 doctor_page_tasks 的调用方传入
+
+    翻页规则：某页医生条目不足20条即为最后一页，之后的页不再请求；
+    计划的最后一页仍是满页（科室数量偏少或未知）时继续抓下一页
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.pages = {}  # order + (页码,) -> 该页医生记录
+        self.item_counts = {}  # order + (页码,) -> 该页医生条目数
+        self.last_page = {}  # order -> 已确认的最后一页（条目不足20条的最小页码）
+        self.departments = {}  # order -> (医院名称, 科室名称)
+        self.failed = set()  # 有页面抓取失败的科室 order
+
+    def should_fetch(self, task):
+        """已确认最后一页之后的分页不再请求"""
+        if task.kind != 'page':
+            return True
+        last_page = self.last_page.get(task.meta['order'])
+        return last_page is None or task.meta['page'] <= last_page
+
+    def handle(self, task, html):
+        """解析医生列表页，返回后续任务"""
+        meta = task.meta
+        order, page = meta['order'], meta['page']
+        self.departments[order] = (meta['hospital_name'], meta['dept_name'])
+        if html is None:
+            self.failed.add(order)
+            return []
+        doctors, item_count = self.crawler.parse(task.url, html,
+                                                 lambda text: parse_doctor_list(text, task.url, meta['dept_name']))
+        records = [build_doctor_record(doctor, meta['hospital_name'], meta['city'], meta['hospital_level'],
+                                       meta['dept_name']) for doctor in doctors]
+        self.pages[order + (page,)] = records
+        self.item_counts[order + (page,)] = item_count
+        logger.info(f"{meta['hospital_name']} - {meta['dept_name']} 第{page}页: {len(records)} 位医生")
+
+        if item_count < DOCTORS_PER_PAGE:
+            self.last_page[order] = min(page, self.last_page.get(order, page))
+            return []
+        max_page = meta['planned_pages'] + DEFAULT_MAX_PAGES - 1
+        if page >= meta['planned_pages'] and page < max_page:
+            next_meta = dict(meta, page=page + 1)
+            return [CrawlTask('page', doctor_page_url(meta['dept_url'], page + 1), **next_meta)]
+        return []
+
+    def _department_pages(self):
+        """order -> 按页码排序的 [(页码, 医生记录)]，只保留最后一页及之前的页"""
+        departments = {}
+        for key in sorted(self.pages):
+            order, page = key[:-1], key[-1]
+            if page <= self.last_page.get(order, page):
+                departments.setdefault(order, []).append((page, self.pages[key]))
+        return departments
+
+    def _department_doctors(self):
+        """order -> 按医生链接去重后的医生记录（翻页期间名单变动会导致同一医生出现在相邻两页）"""
+        rosters = {}
+        for order, pages in self._department_pages().items():
+            seen = set()
+            rosters[order] = []
+            for _, records in pages:
+                for record in records:
+                    if record['医生链接'] not in seen:
+                        seen.add(record['医生链接'])
+                        rosters[order].append(record)
+        return rosters
+
+    def doctors(self):
+        """按科室、页码顺序汇总全部医生记录（同一科室内按医生链接去重）"""
+        return [record for _, records in sorted(self._department_doctors().items()) for record in records]
+
+    def page_stats(self):
+        """
+        翻页请求统计：请求的分页数、浪费的请求（没有带来新医生的页）、重复医生条目数、
+        以及小科室（不超过1页医生）上浪费的请求数
+        """
+        stats = {'pages': len(self.pages), 'wasted': 0, 'wasted_small_departments': 0, 'duplicates': 0}
+        department_pages = self._department_pages()
+        for pages in department_pages.values():
+            seen = set()
+            wasted = 0
+            for _, records in pages:
+                new_urls = {record['医生链接'] for record in records} - seen
+                stats['duplicates'] += len(records) - len(new_urls)
+                seen |= new_urls
+                wasted += not new_urls
+            stats['wasted'] += wasted
+            if len(seen) <= DOCTORS_PER_PAGE:
+                stats['wasted_small_departments'] += wasted
+        # 确认最后一页之前已发出、结果被丢弃的请求也算浪费
+        discarded = len(self.pages) - sum(len(pages) for pages in department_pages.values())
+        stats['wasted'] += discarded
+        logger.info(f"医生列表分页：请求 {stats['pages']} 页，浪费 {stats['wasted']} 次"
+                    f"（其中小科室 {stats['wasted_small_departments']} 次），跳过 {self.crawler.stats['skipped']} 页，"
+                    f"重复医生条目 {stats['duplicates']} 条")
+        return stats
+
+    def roster_changes(self):
+        """
+        与页面缓存中保存的上次医生列表比较，返回各科室新增/减少的医生（变动明细行）
+        有页面抓取失败的科室不比较，也不更新保存的列表
+        """
+        if self.crawler.cache is None:
+            return []
+        rosters = self._department_doctors()
+        changes = []
+        new_departments = 0
+        for order, (hospital_name, dept_name) in sorted(self.departments.items()):
+            if order in self.failed:
+                continue
+            diff = self.crawler.cache.diff_roster(f"{hospital_name}|{dept_name}", rosters.get(order, []))
+            if diff is None:
+                new_departments += 1
+                continue
+            for change, doctors in zip(('新增', '减少'), diff):
+                for doctor in doctors:
+                    changes.append({
+                        '医院名称': hospital_name,
+                        '科室名称': dept_name,
+                        '变动': change,
+                        '医生姓名': doctor['医生姓名'],
+                        '职称': doctor['职称'],
+                        '医生链接': doctor['医生链接'],
+                    })
+        logger.info(f"医生变动：{len(changes)} 条（首次抓取的科室 {new_departments} 个，"
+                    f"抓取不完整未比较的科室 {len(self.failed)} 个）")
+        return changes
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """按 fixture_path 规则把URL映射到样本文件的本地模拟服务器（支持 ETag 条件请求）"""
+
+    fixture_dir = '.'
+
+    def do_GET(self):
+        path = fixture_path(self.fixture_dir, self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(os.path.getmtime(path), usegmt=True))
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def make_fixture_server(fixture_dir, port=0):
+    """创建回放离线样本的HTTP服务器（port=0 时自动分配端口），调用方负责 serve_forever"""
+    handler = type('Handler', (FixtureRequestHandler,), {'fixture_dir': fixture_dir})
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] != 'serve':
+        print("用法: python haodf_crawler.py serve <样本目录> [端口]")
+        return
+    port = int(sys.argv[3]) if len(sys.argv) > 3 else 8000
+    server = make_fixture_server(sys.argv[2], port)
+    print(f"离线样本服务器已启动: http://127.0.0.1:{server.server_address[1]} (目录: {sys.argv[2]})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
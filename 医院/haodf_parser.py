@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+好大夫在线页面解析函数（各抓取脚本共用）
+只负责把HTML解析为字典，不发起网络请求，便于同步/异步抓取共用以及离线测试
+
+解析后端：
+- lxml（默认，已安装时使用）：预编译的选择器，比 BeautifulSoup 快数倍
+- BeautifulSoup html.parser（未安装 lxml 时的备选），两者返回相同的字典
+
+性能对比（用 haodf_crawler.py 保存的离线样本页面）：
+    python haodf_parser.py benchmark <样本目录> [重复次数]
+两种后端结果一致性检查（内置样本页面，不需要样本目录）：
+    python haodf_parser.py check
+"""
+
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+# lxml 可选：没有时使用 BeautifulSoup 解析
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+    print("提示：未安装 lxml，将使用 BeautifulSoup 解析页面（较慢），建议安装：pip install lxml")
+
+# 好大夫网站地址，离线测试时可改为本地模拟服务器地址
+HAODF_BASE_URL = "https://www.haodf.com"
+
+# 默认解析后端
+PARSER_BACKEND = 'lxml' if LXML_AVAILABLE else 'bs4'
+
+# 医生列表每页医生数
+DOCTORS_PER_PAGE = 20
+
+
+def department_list_url(hospital_url, base_url=HAODF_BASE_URL):
+    """由医院主页URL构造科室列表页URL，无法提取医院ID时返回None"""
+    hospital_id = re.search(r'/hospital/(\d+)\.html', hospital_url)
+    if not hospital_id:
+        return None
+    return f"{base_url}/hospital/{hospital_id.group(1)}/keshi/list.html"
+
+
+def doctor_page_url(dept_url, page):
+    """构造科室医生列表的分页URL（第1页不带页码参数）"""
+    if '/keshi/' in dept_url and not dept_url.endswith('/tuijian.html'):
+        if dept_url.endswith('.html'):
+            base_url = dept_url.replace('.html', '/tuijian.html')
+        else:
+            base_url = dept_url + '/tuijian.html'
+    else:
+        base_url = dept_url
+
+    if page == 1:
+        return f"{base_url}?type=keshi"
+    return f"{base_url}?type=keshi&p={page}"
+
+
+def parse_hospital_level(type_text):
+    """从 "(三级甲等, 特色:妇产科)" 形式的文本中提取医院等级"""
+    hospital_level = '未知'
+    match = re.search(r'\(([^,]+),\s*特色:([^)]+)\)', type_text)
+    if match:
+        return match.group(1).strip()
+    # 尝试其他格式
+    match2 = re.search(r'\(([^)]+)\)', type_text)
+    if match2:
+        content = match2.group(1).strip()
+        hospital_level = content.split(',')[0].strip() if ',' in content else content
+    return hospital_level
+
+
+# ---------------- BeautifulSoup 解析（未安装 lxml 时的备选） ----------------
+
+def _parse_hospital_list_bs4(html, base_url):
+    soup = BeautifulSoup(html, 'html.parser')
+    hospitals = []
+
+    # 查找所有城市标题
+    for city_title in soup.find_all('div', class_='m_title_green'):
+        city_name = city_title.get_text(strip=True)
+
+        # 查找紧跟在城市标题后面的医院列表
+        hospital_list = city_title.find_next_sibling('div', class_='m_ctt_green')
+        if not hospital_list:
+            # 如果没有找到兄弟节点，尝试查找父节点下的医院列表
+            parent = city_title.parent
+            if parent:
+                hospital_list = parent.find('div', class_='m_ctt_green')
+        if not hospital_list:
+            continue
+
+        for li in hospital_list.find_all('li'):
+            link = li.find('a')
+            if not link:
+                continue
+            span = li.find('span')
+
+            hospital_url = link.get('href', '').strip()
+            # 确保URL是完整的
+            if hospital_url and not hospital_url.startswith('http'):
+                hospital_url = base_url + hospital_url
+
+            hospitals.append({
+                'name': link.get_text(strip=True),
+                'city': city_name,
+                'level': parse_hospital_level(span.get_text(strip=True)) if span else '未知',
+                'url': hospital_url,
+            })
+
+    return hospitals
+
+
+def _parse_department_link_bs4(link, page_url, category):
+    """解析单个科室链接，名称缺失时返回None"""
+    name_div = link.find('div', class_='name-txt')
+    if name_div:
+        dept_name = name_div.get_text(strip=True)
+    else:
+        # 尝试其他可能的类名
+        name_span = link.find('span', class_='name')
+        dept_name = name_span.get_text(strip=True) if name_span else link.get_text(strip=True)
+
+    dept_href = link.get('href')
+    if not dept_name or not dept_href:
+        return None
+
+    # 提取医生数量
+    doctor_count = 0
+    count_div = link.find('div', class_='count')
+    if count_div:
+        count_match = re.search(r'(\d+)', count_div.get_text(strip=True))
+        if count_match:
+            doctor_count = int(count_match.group(1))
+
+    return {
+        'category': category,
+        'name': dept_name,
+        'url': urljoin(page_url, dept_href),
+        'doctor_count': doctor_count,
+    }
+
+
+def _parse_departments_bs4(html, page_url):
+    soup = BeautifulSoup(html, 'html.parser')
+    departments = []
+
+    dept_container = soup.find('div', class_='hos-keshi')
+    if dept_container:
+        for category in dept_container.find_all('div', class_='item-wrap'):
+            category_name_elem = category.find('h3', class_='keshi-name-showall')
+            category_name = category_name_elem.get_text(strip=True) if category_name_elem else "未知科室"
+            for link in category.find_all('a', class_='faculty-item'):
+                department = _parse_department_link_bs4(link, page_url, category_name)
+                if department:
+                    departments.append(department)
+    if departments:
+        return departments
+
+    # 备选方法1: 查找带有faculty-item类的链接
+    dept_links = soup.find_all('a', class_='faculty-item')
+    # 备选方法2: 查找包含医院ID的科室链接
+    if not dept_links:
+        hospital_id = re.search(r'/hospital/(\d+)/keshi/', page_url)
+        if hospital_id:
+            dept_links = soup.find_all('a', href=re.compile(f'/hospital/{hospital_id.group(1)}/keshi/'))
+    # 备选方法3: 查找包含/keshi/的链接
+    if not dept_links:
+        dept_links = soup.find_all('a', href=re.compile(r'/keshi/'))
+
+    for link in dept_links:
+        department = _parse_department_link_bs4(link, page_url, '')
+        if department:
+            departments.append(department)
+    return departments
+
+
+def clean_doctor_name(raw_name, dept_name):
+    """清洗医生姓名，移除科室前缀和其他无关信息"""
+    # 移除科室名称前缀
+    name = raw_name
+    if dept_name in name:
+        name = name.replace(dept_name, '')
+
+    # 移除常见的职称后缀
+    title_patterns = [
+        r'主任医师.*?$', r'副主任医师.*?$', r'主治医师.*?$', r'住院医师.*?$',
+        r'教授.*?$', r'副教授.*?$', r'讲师.*?$',
+        r'科主任.*?$', r'副主任.*?$', r'主任.*?$',
+        r'\d+\.\d+$', r'\d+$'  # 移除评分数字
+    ]
+
+    for pattern in title_patterns:
+        name = re.sub(pattern, '', name)
+
+    # 清理空格和特殊字符
+    name = re.sub(r'\s+', '', name)
+    name = name.strip()
+
+    return name if name else raw_name
+
+
+def _parse_doctor_list_bs4(html, page_url, dept_name):
+    soup = BeautifulSoup(html, 'html.parser')
+    doctors = []
+
+    doctor_list = soup.find('ul', class_='doc-list')
+    if not doctor_list:
+        return doctors, 0
+    doctor_items = doctor_list.find_all('li', class_='item')
+
+    for item in doctor_items:
+        # 查找医生链接
+        doctor_link = item.find('a', class_='item-bd')
+        if not doctor_link:
+            continue
+
+        # 提取医生姓名，清洗掉科室前缀
+        name_span = item.find('span', class_='name')
+        raw_name = name_span.get_text(strip=True) if name_span else ''
+        doctor_name = clean_doctor_name(raw_name, dept_name)
+        if not doctor_name or len(doctor_name) < 2:
+            continue
+
+        # 提取职称及学历/教授信息
+        grade_span = item.find('span', class_='grade')
+        title = grade_span.get_text(strip=True) if grade_span else ''
+        edu_grade_span = item.find('span', class_='edu-grade')
+        if edu_grade_span:
+            edu_grade = edu_grade_span.get_text(strip=True)
+            if edu_grade:
+                title = f"{title} {edu_grade}" if title else edu_grade
+
+        # 提取擅长领域
+        specialty = ''
+        goodat_p = item.find('p', class_='goodat')
+        if goodat_p:
+            specialty = goodat_p.get_text(strip=True)
+            if specialty.startswith('擅长：'):
+                specialty = specialty[3:]
+
+        doctors.append({
+            'name': doctor_name,
+            'title': title,
+            'specialty': specialty,
+            'url': urljoin(page_url, doctor_link.get('href', '')),
+        })
+
+    return doctors, len(doctor_items)
+
+
+# ---------------- lxml 解析（预编译选择器） ----------------
+
+def _class_xpath(tag, class_name, axis='descendant'):
+    """编译与CSS选择器 tag.class_name 等价的XPath"""
+    return etree.XPath(f"{axis}::{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]")
+
+
+if LXML_AVAILABLE:
+    _LXML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+    SEL_CITY_TITLE = _class_xpath('div', 'm_title_green')  # div.m_title_green
+    SEL_HOSPITAL_LIST_SIBLING = _class_xpath('div', 'm_ctt_green', axis='following-sibling')
+    SEL_HOSPITAL_LIST = _class_xpath('div', 'm_ctt_green')
+    SEL_LI = etree.XPath('descendant::li')
+    SEL_A = etree.XPath('descendant::a')
+    SEL_SPAN = etree.XPath('descendant::span')
+    SEL_HOS_KESHI = _class_xpath('div', 'hos-keshi')  # div.hos-keshi div.item-wrap
+    SEL_ITEM_WRAP = _class_xpath('div', 'item-wrap')
+    SEL_CATEGORY_NAME = _class_xpath('h3', 'keshi-name-showall')
+    SEL_FACULTY_ITEM = _class_xpath('a', 'faculty-item')  # a.faculty-item
+    SEL_NAME_TXT = _class_xpath('div', 'name-txt')
+    SEL_SPAN_NAME = _class_xpath('span', 'name')
+    SEL_COUNT = _class_xpath('div', 'count')
+    SEL_A_HREF = etree.XPath('descendant::a[@href]')
+    SEL_DOC_LIST = _class_xpath('ul', 'doc-list')  # ul.doc-list li.item
+    SEL_DOC_ITEM = _class_xpath('li', 'item')
+    SEL_ITEM_BD = _class_xpath('a', 'item-bd')
+    SEL_GRADE = _class_xpath('span', 'grade')
+    SEL_EDU_GRADE = _class_xpath('span', 'edu-grade')
+    SEL_GOODAT = _class_xpath('p', 'goodat')
+
+
+def _lxml_document(html):
+    if not html or not html.strip():
+        return None
+    root = lxml_html.document_fromstring(html.encode('utf-8'), parser=_LXML_PARSER)
+    # BeautifulSoup 的 get_text 不包含 script/style/template 中的文字，先删掉这些元素（保留元素后面的文字）
+    etree.strip_elements(root, 'script', 'style', 'template', with_tail=False)
+    return root
+
+
+def _first(selector, element):
+    matches = selector(element)
+    return matches[0] if matches else None
+
+
+def _text(element):
+    """等价于 BeautifulSoup 的 get_text(strip=True)"""
+    return ''.join(text.strip() for text in element.itertext())
+
+
+def _parse_hospital_list_lxml(html, base_url):
+    root = _lxml_document(html)
+    hospitals = []
+    if root is None:
+        return hospitals
+
+    for city_title in SEL_CITY_TITLE(root):
+        city_name = _text(city_title)
+        hospital_list = _first(SEL_HOSPITAL_LIST_SIBLING, city_title)
+        if hospital_list is None:
+            parent = city_title.getparent()
+            if parent is not None:
+                hospital_list = _first(SEL_HOSPITAL_LIST, parent)
+        if hospital_list is None:
+            continue
+
+        for li in SEL_LI(hospital_list):
+            link = _first(SEL_A, li)
+            if link is None:
+                continue
+            span = _first(SEL_SPAN, li)
+
+            hospital_url = link.get('href', '').strip()
+            if hospital_url and not hospital_url.startswith('http'):
+                hospital_url = base_url + hospital_url
+
+            hospitals.append({
+                'name': _text(link),
+                'city': city_name,
+                'level': parse_hospital_level(_text(span)) if span is not None else '未知',
+                'url': hospital_url,
+            })
+
+    return hospitals
+
+
+def _parse_department_link_lxml(link, page_url, category):
+    name_div = _first(SEL_NAME_TXT, link)
+    if name_div is not None:
+        dept_name = _text(name_div)
+    else:
+        name_span = _first(SEL_SPAN_NAME, link)
+        dept_name = _text(name_span) if name_span is not None else _text(link)
+
+    dept_href = link.get('href')
+    if not dept_name or not dept_href:
+        return None
+
+    doctor_count = 0
+    count_div = _first(SEL_COUNT, link)
+    if count_div is not None:
+        count_match = re.search(r'(\d+)', _text(count_div))
+        if count_match:
+            doctor_count = int(count_match.group(1))
+
+    return {
+        'category': category,
+        'name': dept_name,
+        'url': urljoin(page_url, dept_href),
+        'doctor_count': doctor_count,
+    }
+
+
+def _parse_departments_lxml(html, page_url):
+    root = _lxml_document(html)
+    departments = []
+    if root is None:
+        return departments
+
+    dept_container = _first(SEL_HOS_KESHI, root)
+    if dept_container is not None:
+        for category in SEL_ITEM_WRAP(dept_container):
+            category_name_elem = _first(SEL_CATEGORY_NAME, category)
+            category_name = _text(category_name_elem) if category_name_elem is not None else "未知科室"
+            for link in SEL_FACULTY_ITEM(category):
+                department = _parse_department_link_lxml(link, page_url, category_name)
+                if department:
+                    departments.append(department)
+    if departments:
+        return departments
+
+    dept_links = SEL_FACULTY_ITEM(root)
+    if not dept_links:
+        hospital_id = re.search(r'/hospital/(\d+)/keshi/', page_url)
+        if hospital_id:
+            pattern = re.compile(f'/hospital/{hospital_id.group(1)}/keshi/')
+            dept_links = [link for link in SEL_A_HREF(root) if pattern.search(link.get('href'))]
+    if not dept_links:
+        dept_links = [link for link in SEL_A_HREF(root) if '/keshi/' in link.get('href')]
+
+    for link in dept_links:
+        department = _parse_department_link_lxml(link, page_url, '')
+        if department:
+            departments.append(department)
+    return departments
+
+
+def _parse_doctor_list_lxml(html, page_url, dept_name):
+    root = _lxml_document(html)
+    doctors = []
+    doctor_list = _first(SEL_DOC_LIST, root) if root is not None else None
+    if doctor_list is None:
+        return doctors, 0
+    doctor_items = SEL_DOC_ITEM(doctor_list)
+
+    for item in doctor_items:
+        doctor_link = _first(SEL_ITEM_BD, item)
+        if doctor_link is None:
+            continue
+
+        name_span = _first(SEL_SPAN_NAME, item)
+        raw_name = _text(name_span) if name_span is not None else ''
+        doctor_name = clean_doctor_name(raw_name, dept_name)
+        if not doctor_name or len(doctor_name) < 2:
+            continue
+
+        grade_span = _first(SEL_GRADE, item)
+        title = _text(grade_span) if grade_span is not None else ''
+        edu_grade_span = _first(SEL_EDU_GRADE, item)
+        if edu_grade_span is not None:
+            edu_grade = _text(edu_grade_span)
+            if edu_grade:
+                title = f"{title} {edu_grade}" if title else edu_grade
+
+        specialty = ''
+        goodat_p = _first(SEL_GOODAT, item)
+        if goodat_p is not None:
+            specialty = _text(goodat_p)
+            if specialty.startswith('擅长：'):
+                specialty = specialty[3:]
+
+        doctors.append({
+            'name': doctor_name,
+            'title': title,
+            'specialty': specialty,
+            'url': urljoin(page_url, doctor_link.get('href', '')),
+        })
+
+    return doctors, len(doctor_items)
+
+
+# ---------------- 对外接口 ----------------
+
+def parse_hospital_list(html, base_url=HAODF_BASE_URL, backend=None):
+    """
+    解析省份医院列表页（list-XX.html）
+    返回: [{'name', 'city', 'level', 'url'}, ...]
+    """
+    if (backend or PARSER_BACKEND) == 'lxml':
+        return _parse_hospital_list_lxml(html, base_url)
+    return _parse_hospital_list_bs4(html, base_url)
+
+
+def parse_departments(html, page_url, backend=None):
+    """
+    解析医院科室列表页（/hospital/<id>/keshi/list.html）
+    优先按 div.hos-keshi 下的科室大类解析，找不到时依次退化为 a.faculty-item、医院科室链接
+    返回: [{'category', 'name', 'url', 'doctor_count'}, ...]
+    """
+    if (backend or PARSER_BACKEND) == 'lxml':
+        return _parse_departments_lxml(html, page_url)
+    return _parse_departments_bs4(html, page_url)
+
+
+def parse_doctor_list(html, page_url, dept_name, backend=None):
+    """
+    解析科室医生列表页（tuijian.html?type=keshi&p=N）
+    返回: (医生列表 [{'name', 'title', 'specialty', 'url'}, ...], 页面上的医生条目数)
+    条目数包含被过滤掉的条目，用于判断是否已到最后一页
+    """
+    if (backend or PARSER_BACKEND) == 'lxml':
+        return _parse_doctor_list_lxml(html, page_url, dept_name)
+    return _parse_doctor_list_bs4(html, page_url, dept_name)
+
+
+def build_doctor_record(doctor, hospital_name, city, hospital_level, dept_name):
+    """把解析出的医生字典组装为输出到Excel的一行"""
+    return {
+        '医院名称': hospital_name,
+        '所属城市': city,
+        '医院等级': hospital_level,
+        '科室名称': dept_name,
+        '医生姓名': doctor['name'],
+        '职称': doctor['title'],
+        '擅长领域': doctor['specialty'],
+        '医生链接': doctor['url'],
+        '抓取时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def benchmark(fixture_dir, rounds=20):
+    """
+    用离线样本页面对比两种解析后端的耗时，并检查解析结果是否一致
+    样本按文件名识别页面类型：list-XX.html / keshi/list.html / tuijian.html*
+    """
+    pages = {'医院列表页': [], '科室列表页': [], '医生列表页': []}
+    for dirpath, _, filenames in os.walk(fixture_dir):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            page_url = HAODF_BASE_URL + '/' + os.path.relpath(path, fixture_dir).replace(os.sep, '/')
+            with open(path, 'r', encoding='utf-8') as f:
+                html = f.read()
+            if filename.startswith('tuijian.html'):
+                pages['医生列表页'].append(lambda backend, h=html, u=page_url: parse_doctor_list(h, u, '', backend))
+            elif filename == 'list.html' and os.path.basename(dirpath) == 'keshi':
+                pages['科室列表页'].append(lambda backend, h=html, u=page_url: parse_departments(h, u, backend))
+            elif re.match(r'list-\d+\.html$', filename):
+                pages['医院列表页'].append(lambda backend, h=html: parse_hospital_list(h, HAODF_BASE_URL, backend))
+
+    print(f"{'页面类型':<10}{'页面数':>8}{'bs4(毫秒/页)':>16}{'lxml(毫秒/页)':>16}{'加速比':>10}  结果一致")
+    for page_type, parsers in pages.items():
+        if not parsers:
+            continue
+        timings = {}
+        for backend in ('bs4', 'lxml'):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for parse in parsers:
+                    parse(backend)
+            timings[backend] = (time.perf_counter() - start) * 1000 / rounds / len(parsers)
+        same = all(parse('bs4') == parse('lxml') for parse in parsers)
+        print(f"{page_type:<10}{len(parsers):>8}{timings['bs4']:>16.3f}{timings['lxml']:>16.3f}"
+              f"{timings['bs4'] / timings['lxml']:>9.1f}x  {'是' if same else '否'}")
+
+
+# 一致性检查用的样本页面：文字中夹有 script/style/template、注释和空白
+_CHECK_NOISE = '<script>var a=1;</script><style>.x{color:red}</style><template>模板</template><!-- 注释 -->'
+_CHECK_PAGES = {
+    '医院列表页': f'''<html><body><div class="m_title_green">贵阳{_CHECK_NOISE}市</div>
+<div class="m_ctt_green"><ul>
+<li><a href="/hospital/1.html">贵州省人民{_CHECK_NOISE}医院</a><span>(三甲{_CHECK_NOISE})</span></li>
+<li><a href="/hospital/2.html"> 贵阳市第一人民医院 </a></li>
+</ul></div></body></html>''',
+    '科室列表页': f'''<html><body><div class="hos-keshi"><div class="item-wrap">
+<h3 class="keshi-name-showall">妇产{_CHECK_NOISE}科</h3>
+<a class="faculty-item" href="/hospital/1/keshi/10.html"><div class="name-txt">妇{_CHECK_NOISE}科</div>
+<div class="count">{_CHECK_NOISE}12位医生</div></a>
+<a class="faculty-item" href="/hospital/1/keshi/11.html"><span class="name">产科</span></a>
+</div></div></body></html>''',
+    '医生列表页': f'''<html><body><ul class="doc-list">
+<li class="item"><a class="item-bd" href="/doctor/1.html"><span class="name">王{_CHECK_NOISE}医生</span>
+<span class="grade">主任{_CHECK_NOISE}医师</span><span class="edu-grade">教授</span>
+<p class="goodat">擅长：{_CHECK_NOISE}妇科肿瘤</p></a></li>
+<li class="item"><a class="item-bd" href="/doctor/2.html"><span class="name">李<script>x</script></span></a></li>
+</ul></body></html>''',
+}
+
+
+def check_backends():
+    """用内置样本页面检查两种解析后端返回的字典是否一致，返回不一致的页面类型列表"""
+    parsers = {
+        '医院列表页': lambda backend, h: parse_hospital_list(h, HAODF_BASE_URL, backend),
+        '科室列表页': lambda backend, h: parse_departments(h, HAODF_BASE_URL + '/hospital/1/keshi/list.html', backend),
+        '医生列表页': lambda backend, h: parse_doctor_list(h, HAODF_BASE_URL + '/keshi/10/tuijian.html', '', backend),
+    }
+    mismatched = []
+    for page_type, html in _CHECK_PAGES.items():
+        expected = parsers[page_type]('bs4', html)
+        actual = parsers[page_type]('lxml', html)
+        print(f"{page_type}: {'一致' if expected == actual else '不一致'}")
+        if expected != actual:
+            print(f"  bs4:  {expected}\n  lxml: {actual}")
+            mismatched.append(page_type)
+    return mismatched
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == 'check':
+        if not LXML_AVAILABLE:
+            print("未安装 lxml，无法对比")
+        else:
+            sys.exit(1 if check_backends() else 0)
+    elif len(sys.argv) < 3 or sys.argv[1] != 'benchmark':
+        print("用法: python haodf_parser.py benchmark <样本目录> [重复次数]")
+        print("      python haodf_parser.py check")
+    elif not LXML_AVAILABLE:
+        print("未安装 lxml，无法对比")
+    else:
+        benchmark(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 20)
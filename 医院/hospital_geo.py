@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+医院坐标与按地理位置分配拜访人
+功能：
+1. 医院坐标：优先取 '医院地址' 标签页的 '经纬度' 列（百度坐标 "纬度,经度"），
+   其次查本地缓存，最后用百度地理编码API按地址查询；每个地址只查询一次，结果写入本地缓存
+2. 医院间路程时间矩阵：按距离分段车速估算，保存为本地CSV，可手工修改后直接读取，不调用路线规划API
+3. 把医院分成与拜访人数相同的若干片区：片区内医院尽量集中，各片区医生总量尽量均衡
+
+用法：
+    from hospital_geo import geocode_hospitals, assign_hospitals_by_location, load_or_build_travel_matrix
+    coords = geocode_hospitals(df_addr)
+    assignment = assign_hospitals_by_location(hospitals, visitors, df, coords)
+    travel = load_or_build_travel_matrix(df_addr)   # travel.minutes(医院A, 医院B)
+"""
+
+import json
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+# requests 可选：没有 '经纬度' 列且缓存未命中时才需要调用地理编码API
+try:
+    import requests
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+
+# =========================================
+# 参数配置
+# =========================================
+# 地址 -> [纬度, 经度] 的本地缓存（百度坐标）
+GEOCODE_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hospital_geocode_cache.json')
+GEOCODE_URL = 'https://api.map.baidu.com/geocoding/v3/'
+GEOCODE_INTERVAL = 0.35  # 两次API调用之间的间隔（秒）
+BAIDU_AK = ''  # 百度地图AK，为空时不调用API，只使用 '经纬度' 列和缓存
+
+# 路程估算：固定耗时（出入院、停车）加分段车速折算的行驶时间
+# 每段为 (该段终点距离km, 车速km/h)：前5公里按市区拥堵车速，5-30公里按城市快速路，更远按高速
+TRAVEL_BASE_MINUTES = 10
+TRAVEL_SPEED_BANDS = [(5, 20), (30, 35), (float('inf'), 60)]
+# 路程时间矩阵文件（医院 × 医院，单位分钟），存在时直接读取
+TRAVEL_MATRIX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hospital_travel_matrix.csv')
+
+# 片区划分：各片区医生总量最多超过平均值的比例；迭代次数
+BALANCE_TOLERANCE = 0.05
+CLUSTER_ITERATIONS = 30
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _parse_coord(value):
+    """解析 "纬度,经度" 字符串，无法解析时返回 None"""
+    try:
+        lat, lon = (float(part) for part in str(value).split(',', 1))
+    except ValueError:
+        return None
+    if np.isnan(lat) or np.isnan(lon):
+        return None
+    return lat, lon
+
+
+def load_geocode_cache(path=GEOCODE_CACHE_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取坐标缓存失败 {path}: {e}")
+        return {}
+
+
+def save_geocode_cache(cache, path=GEOCODE_CACHE_FILE):
+    # 写临时文件再替换，避免中断时损坏缓存
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def geocode_address(address, ak):
+    """百度地理编码：地址 -> (纬度, 经度)，失败返回 None"""
+    try:
+        response = requests.get(GEOCODE_URL, params={'address': address, 'output': 'json', 'ak': ak}, timeout=10)
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"地理编码请求失败 {address}: {e}")
+        return None
+    if data.get('status') != 0:
+        print(f"地理编码失败 {address}: {data.get('message', data.get('msg', data.get('status')))}")
+        return None
+    location = data['result']['location']
+    return location['lat'], location['lng']
+
+
+def geocode_hospitals(df_addr, ak=BAIDU_AK, cache_path=GEOCODE_CACHE_FILE):
+    """
+    获取医院坐标
+
+    参数:
+        df_addr: '医院地址' 标签页，需包含 '医院名称'、'地址' 列，可选 '经纬度' 列
+    返回:
+        {医院名称: (纬度, 经度)}，没有坐标的医院不在结果中
+    """
+    cache = load_geocode_cache(cache_path)
+    coords = {}
+    pending = []
+    for _, row in df_addr.iterrows():
+        hospital = row['医院名称']
+        coord = _parse_coord(row['经纬度']) if '经纬度' in df_addr.columns else None
+        address = row['地址'] if isinstance(row.get('地址'), str) and row['地址'].strip() else hospital
+        if coord is None and address in cache:
+            coord = tuple(cache[address])
+        if coord is None:
+            pending.append((hospital, address))
+        else:
+            coords[hospital] = coord
+
+    if pending and ak and REQUESTS_AVAILABLE:
+        print(f"地理编码：{len(pending)} 家医院不在缓存中，调用百度地理编码API...")
+        for i, (hospital, address) in enumerate(pending):
+            if i > 0:
+                time.sleep(GEOCODE_INTERVAL)
+            coord = geocode_address(address, ak)
+            if coord is not None:
+                coords[hospital] = coord
+                cache[address] = list(coord)
+        save_geocode_cache(cache, cache_path)
+    elif pending:
+        print(f"警告：{len(pending)} 家医院没有坐标（未提供 '经纬度' 列、缓存未命中且未配置百度AK或未安装 requests）")
+
+    print(f"医院坐标：{len(coords)}/{len(df_addr)} 家")
+    return coords
+
+
+def _distance_km(lat1, lon1, lat2, lon2):
+    """球面距离（公里，向量化）"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def estimate_travel_minutes(distance_km):
+    """按距离分段车速估算路程分钟数（向量化）"""
+    distance_km = np.asarray(distance_km, dtype=np.float64)
+    minutes = np.full(distance_km.shape, float(TRAVEL_BASE_MINUTES))
+    band_start = 0.0
+    for band_end, speed_kmh in TRAVEL_SPEED_BANDS:
+        minutes += np.clip(distance_km - band_start, 0, band_end - band_start) / speed_kmh * 60
+        band_start = band_end
+    return minutes
+
+
+def average_pair_travel_minutes(coords, hospitals):
+    """一组医院中任取两家的平均路程分钟数（随机搭配两家医院时的期望路程），不足两家有坐标时返回 None"""
+    located = [hospital for hospital in hospitals if hospital in coords]
+    if len(located) < 2:
+        return None
+    lat = np.array([coords[hospital][0] for hospital in located])
+    lon = np.array([coords[hospital][1] for hospital in located])
+    distances = _distance_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+    return float(estimate_travel_minutes(distances[np.triu_indices(len(located), k=1)]).mean())
+
+
+class TravelMatrix:
+    """医院间路程时间矩阵（分钟）"""
+
+    def __init__(self, hospitals, minutes):
+        self.hospitals = list(hospitals)
+        self.index = {hospital: i for i, hospital in enumerate(self.hospitals)}
+        self.matrix = np.asarray(minutes, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.hospitals)
+
+    @classmethod
+    def from_coords(cls, coords):
+        hospitals = list(coords)
+        lat = np.array([coords[hospital][0] for hospital in hospitals])
+        lon = np.array([coords[hospital][1] for hospital in hospitals])
+        minutes = np.rint(estimate_travel_minutes(_distance_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])))
+        np.fill_diagonal(minutes, 0)
+        return cls(hospitals, minutes)
+
+    @classmethod
+    def load(cls, path):
+        """读取CSV矩阵：第一列与表头均为医院名称，空白表示未知"""
+        table = pd.read_csv(path, index_col=0, encoding='utf-8-sig')
+        table = table.reindex(columns=table.index)
+        return cls(table.index, table.to_numpy(dtype=np.float64))
+
+    def save(self, path):
+        table = pd.DataFrame(self.matrix, index=self.hospitals, columns=self.hospitals)
+        table.index.name = '医院名称'
+        table.to_csv(path, encoding='utf-8-sig', float_format='%.0f')
+
+    def minutes(self, hospital_a, hospital_b):
+        """两家医院之间的路程分钟数；同一家医院为0，未知时返回 None"""
+        if hospital_a == hospital_b:
+            return 0
+        i = self.index.get(hospital_a)
+        j = self.index.get(hospital_b)
+        if i is None or j is None or np.isnan(self.matrix[i, j]):
+            return None
+        return int(self.matrix[i, j])
+
+    def average_pair_minutes(self, hospitals):
+        """一组医院中任取两家的平均路程分钟数，不足两家已知时返回 None"""
+        indices = [self.index[hospital] for hospital in hospitals if hospital in self.index]
+        if len(indices) < 2:
+            return None
+        values = self.matrix[np.ix_(indices, indices)][np.triu_indices(len(indices), k=1)]
+        values = values[~np.isnan(values)]
+        return float(values.mean()) if len(values) else None
+
+
+def load_or_build_travel_matrix(df_addr, path=TRAVEL_MATRIX_FILE, coords=None):
+    """
+    获取路程时间矩阵：文件存在且包含 df_addr 中全部医院时直接读取，
+    否则由医院坐标（coords，未提供时用 geocode_hospitals 获取，含本地缓存）重新估算并保存到文件；
+    path 为 None 时不读写文件
+    """
+    hospitals = set(df_addr['医院名称'])
+    if path and os.path.exists(path):
+        travel = TravelMatrix.load(path)
+        if hospitals <= set(travel.hospitals):
+            print(f"读取路程时间矩阵：{path}（{len(travel)} 家医院）")
+            return travel
+        print(f"路程时间矩阵 {path} 缺少 {len(hospitals - set(travel.hospitals))} 家医院，重新估算")
+    if coords is None:
+        coords = geocode_hospitals(df_addr)
+    travel = TravelMatrix.from_coords(coords)
+    if path and len(travel):
+        try:
+            travel.save(path)
+            print(f"路程时间矩阵已保存到：{path}（{len(travel)} 家医院，可手工修改后重新运行）")
+        except OSError as e:
+            print(f"保存路程时间矩阵失败 {path}: {e}")
+    return travel
+
+
+def assign_hospitals_by_location(hospitals, visitors, df, coords, seed=None):
+    """
+    按地理位置为拜访人员分配医院：每人一个片区，片区内医院尽量集中，各片区医生总量尽量均衡
+
+    医生数加权的 k-means：每轮按 "最近片区与次近片区的距离差" 从大到小依次分配医院，
+    医院放入仍有容量（平均医生数 × (1 + BALANCE_TOLERANCE)）的最近片区，然后重新计算片区中心。
+    没有坐标的医院最后分给医生总量最少的拜访人。seed 为空时使用全局 random（与拜访安排脚本一致）
+    """
+    rng = random.Random(seed) if seed is not None else random
+    doctor_counts = df.groupby('医院名称').size()
+    hospitals = list(hospitals)
+    located = [hospital for hospital in hospitals if hospital in coords]
+    unlocated = [hospital for hospital in hospitals if hospital not in coords]
+    weights = np.array([doctor_counts.get(hospital, 0) for hospital in located], dtype=np.float64)
+    points = np.array([coords[hospital] for hospital in located], dtype=np.float64).reshape(-1, 2)
+    k = len(visitors)
+    capacity = doctor_counts.reindex(hospitals).fillna(0).sum() / k * (1 + BALANCE_TOLERANCE)
+
+    labels = np.zeros(len(located), dtype=np.int64)
+    if len(located) >= k:
+        # 初始中心：k-means++（按距离平方加权随机选取）
+        centers = [points[rng.randrange(len(located))]]
+        for _ in range(1, k):
+            nearest = np.min([_distance_km(points[:, 0], points[:, 1], c[0], c[1]) for c in centers], axis=0) ** 2
+            total = nearest.sum()
+            if total == 0:
+                centers.append(points[rng.randrange(len(located))])
+                continue
+            centers.append(points[np.searchsorted(np.cumsum(nearest), rng.random() * total)])
+        centers = np.array(centers)
+
+        for _ in range(CLUSTER_ITERATIONS):
+            distances = _distance_km(points[:, 0, None], points[:, 1, None], centers[None, :, 0], centers[None, :, 1])
+            ranked = np.sort(distances, axis=1)
+            regret = ranked[:, 1] - ranked[:, 0] if k > 1 else np.zeros(len(located))
+            loads = np.zeros(k)
+            new_labels = np.empty(len(located), dtype=np.int64)
+            # 医生多、离次近片区远的医院先分配，容量不足时才退到更远的片区
+            for i in sorted(range(len(located)), key=lambda i: (regret[i], weights[i]), reverse=True):
+                for cluster in np.argsort(distances[i]):
+                    if loads[cluster] + weights[i] <= capacity or cluster == np.argmin(loads):
+                        break
+                new_labels[i] = cluster
+                loads[cluster] += weights[i]
+            for cluster in range(k):
+                members = new_labels == cluster
+                if members.any() and weights[members].sum() > 0:
+                    centers[cluster] = np.average(points[members], axis=0, weights=weights[members])
+            if np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+    else:
+        labels = np.arange(len(located))
+
+    hospital_assignment = {visitor: [] for visitor in visitors}
+    visitor_doctor_counts = {visitor: 0 for visitor in visitors}
+    for hospital, cluster in zip(located, labels):
+        hospital_assignment[visitors[cluster]].append(hospital)
+        visitor_doctor_counts[visitors[cluster]] += doctor_counts.get(hospital, 0)
+    for hospital in sorted(unlocated, key=lambda h: doctor_counts.get(h, 0), reverse=True):
+        min_visitor = min(visitors, key=lambda v: visitor_doctor_counts[v])
+        hospital_assignment[min_visitor].append(hospital)
+        visitor_doctor_counts[min_visitor] += doctor_counts.get(hospital, 0)
+
+    print("\n=== 医院分配结果（按地理位置） ===")
+    for visitor in visitors:
+        travel = average_pair_travel_minutes(coords, hospital_assignment[visitor])
+        travel_text = f", 片区内两家医院平均路程约{travel:.0f}分钟" if travel is not None else ''
+        print(f"{visitor}: {len(hospital_assignment[visitor])}家医院, 共{visitor_doctor_counts[visitor]}位医生{travel_text}")
+    if unlocated:
+        print(f"没有坐标的医院 {len(unlocated)} 家，按医生总量分配")
+    counts = list(visitor_doctor_counts.values())
+    print(f"医生总量差距: {max(counts) - min(counts) if counts else 0}")
+    return hospital_assignment
+
+
+def hospital_route(visits):
+    """一位拜访人一天按拜访顺序经过的医院（相邻重复的只保留一个），用于汇总路程时不必保留全部拜访"""
+    route = []
+    for visit in visits:
+        if not route or route[-1] != visit['医院名称']:
+            route.append(visit['医院名称'])
+    return route
+
+
+def summarize_daily_travel(routes, travel):
+    """
+    估算计划中每位拜访人每天跨医院的路程
+
+    参数:
+        routes: 每位拜访人每天的医院路线列表（见 hospital_route）
+        travel: TravelMatrix
+    返回:
+        (平均每天路程分钟, 不考虑位置时平均每天路程分钟)：后者按同样的跨医院次数、任取两家医院的平均路程计算；
+        没有可用路程时返回 (None, None)
+    """
+    routes = [route for route in routes if route]
+    baseline_pair = travel.average_pair_minutes({hospital for route in routes for hospital in route})
+    if baseline_pair is None:
+        return None, None
+    actual_total = 0.0
+    hops = 0
+    for route in routes:
+        for previous, current in zip(route, route[1:]):
+            minutes = travel.minutes(previous, current)
+            actual_total += minutes if minutes is not None else baseline_pair
+            hops += 1
+    return actual_total / len(routes), hops * baseline_pair / len(routes)
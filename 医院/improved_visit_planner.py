@@ -230,36 +230,30 @@ def calculate_visit_times(visits_today, visitor):
     
     return visits_today
 
-def check_same_surname(doctor_name, existing_doctors):
-    """检查医生姓氏是否与已安排的医生相同"""
-    if not existing_doctors:
-        return False
-    
-    # 处理医生姓名中的空格
-    clean_name = doctor_name.strip() if doctor_name else ''
-    doctor_surname = clean_name[0] if clean_name else ''
-    
-    for existing_doctor in existing_doctors:
-        clean_existing = existing_doctor.strip() if existing_doctor else ''
-        existing_surname = clean_existing[0] if clean_existing else ''
-        if doctor_surname == existing_surname and doctor_surname != '':
-            return True
-    
-    return False
+def get_surname(doctor_name):
+    """医生姓氏（去掉空格后的第一个字，没有姓名时为空字符串）"""
+    clean_name = doctor_name.strip() if isinstance(doctor_name, str) else ''
+    return clean_name[0] if clean_name else ''
+
+def check_same_surname(doctor_name, existing_surnames):
+    """检查医生姓氏是否与已安排的医生相同（existing_surnames 为已安排医生的姓氏集合）"""
+    surname = get_surname(doctor_name)
+    return surname != '' and surname in existing_surnames
 
 def check_consecutive_hospital_visits(visitor_hospital_history, hospital, current_date_str):
-    """检查拜访者是否连续3天及以上拜访同一家医院"""
-    if len(visitor_hospital_history) < 2:
-        return False  # 历史记录不足2天，不会连续3天
-    
-    # 获取最近2天的拜访记录
-    recent_visits = visitor_hospital_history[-2:]
+    """检查拜访者是否在连续2天拜访同一家医院后，第三天又安排同一家医院
     
-    # 检查最近2天是否都拜访了同一家医院
-    if all(visit['hospital'] == hospital for visit in recent_visits):
-        return True  # 如果今天再拜访同一家医院，就会连续3天
-    
-    return False
+    visitor_hospital_history: 日期字符串 -> 当天拜访的医院集合
+    注意：这里的"连续"是指日历上的连续日期，不考虑节假日
+    """
+    # 计算前两天的日期（日历上的连续日期，不考虑节假日）
+    current_date = datetime.strptime(current_date_str, '%Y-%m-%d').date()
+    prev_day_1 = (current_date - timedelta(days=1)).strftime('%Y-%m-%d')  # 前一天
+    prev_day_2 = (current_date - timedelta(days=2)).strftime('%Y-%m-%d')  # 前两天
+    
+    # 如果前两天都拜访了同一家医院，并且当前要安排的也是这家医院，则返回True（不允许）
+    return (hospital in visitor_hospital_history.get(prev_day_1, ()) and
+            hospital in visitor_hospital_history.get(prev_day_2, ()))
 
 def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits=400):
     """使用贪心算法制定拜访计划"""
@@ -275,9 +269,9 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits=400
     visit_plan = []
     doctor_visited = set()  # 记录已拜访的医生
     daily_hospital_dept_count = defaultdict(lambda: defaultdict(int))  # 每天每家医院每个科室的拜访次数
-    daily_hospital_dept_doctors = defaultdict(lambda: defaultdict(list))  # 每天每家医院每个科室已安排的医生姓名
+    daily_hospital_dept_surnames = defaultdict(lambda: defaultdict(set))  # 每天每家医院每个科室已安排医生的姓氏
     visitor_visit_count = {visitor: 0 for visitor in visitors}  # 记录每个拜访人的拜访次数
-    visitor_hospital_history = {visitor: [] for visitor in visitors}  # 记录每个拜访者的医院拜访历史
+    visitor_hospital_history = {visitor: {} for visitor in visitors}  # 记录每个拜访者的医院拜访历史：日期 -> 当天拜访的医院集合
     
     total_visits = 0
     
@@ -289,7 +283,7 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits=400
             
         day_str = day.strftime('%Y-%m-%d')
         daily_hospital_dept_count[day_str] = defaultdict(int)
-        daily_hospital_dept_doctors[day_str] = defaultdict(list)
+        daily_hospital_dept_surnames[day_str] = defaultdict(set)
         
         for visitor in visitors:
             # 检查该拜访人是否已达到目标拜访量
@@ -394,7 +388,7 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits=400
                     )
                     
                     # 逐个选择医生，确保不重复姓氏
-                    existing_doctors_in_dept = daily_hospital_dept_doctors[day_str][f"{hospital}_{dept}"]
+                    dept_surnames = set(daily_hospital_dept_surnames[day_str][f"{hospital}_{dept}"])
                     selected_doctors = []
                     available_doctors = list(dept_doctors.iterrows())
                     random.shuffle(available_doctors)  # 随机打乱顺序
@@ -404,9 +398,9 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits=400
                             break
                             
                         # 检查与已选择的医生和当天已安排的医生是否有相同姓氏
-                        current_dept_doctors = existing_doctors_in_dept + [d['医生名称'] for d in selected_doctors]
-                        if not check_same_surname(doctor_row['医生名称'], current_dept_doctors):
+                        if not check_same_surname(doctor_row['医生名称'], dept_surnames):
                             selected_doctors.append(doctor_row)
+                            dept_surnames.add(get_surname(doctor_row['医生名称']))
                     
                     if len(selected_doctors) == 0:
                         continue
@@ -431,7 +425,7 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits=400
                         visits_today.append(visit)
                         doctor_visited.add(doctor_row['医生名称'])
                         daily_hospital_dept_count[day_str][f"{hospital}_{dept}"] += 1
-                        daily_hospital_dept_doctors[day_str][f"{hospital}_{dept}"].append(doctor_row['医生名称'])
+                        daily_hospital_dept_surnames[day_str][f"{hospital}_{dept}"].add(get_surname(doctor_row['医生名称']))
                         hospital_visits += 1
                         total_visits += 1
                         visitor_visit_count[visitor] += 1
@@ -444,14 +438,7 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits=400
             
             # 更新拜访者的医院历史记录
             if visits_today:
-                # 获取当天拜访的医院列表（去重）
-                hospitals_visited_today = list(set([visit['医院名称'] for visit in visits_today]))
-                # 为每个拜访的医院添加记录
-                for hospital in hospitals_visited_today:
-                    visitor_hospital_history[visitor].append({
-                        'date': day_str,
-                        'hospital': hospital
-                    })
+                visitor_hospital_history[visitor].setdefault(day_str, set()).update(visit['医院名称'] for visit in visits_today)
     
     return visit_plan
 
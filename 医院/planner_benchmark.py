@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拜访安排脚本基准测试（全程离线）
+功能：
+1. 按规模生成合成的 '导出筛选结果' / '医院地址' 数据（医院、科室、医生、拜访人、天数可配置）
+2. 固定随机种子，逐个运行各拜访安排脚本的 greedy_visit_planning（每个脚本在独立子进程中运行）
+3. 报告耗时、峰值内存、安排的拜访条数和违反规则的条数（visit_plan_validator 校验）
+4. 结果追加到 planner_benchmark_results.jsonl，便于比较不同版本的运行结果
+
+使用方法：
+    python planner_benchmark.py run [--scale small,city] [--variants 妇产科动态优先,非妇产科优先] [--seed 42]
+    python planner_benchmark.py compare                      # 每个脚本/规模最近两次结果对比
+    python planner_benchmark.py generate 合成数据.xlsx --scale city   # 导出合成数据，可直接作为 EXCEL_FILE
+"""
+
+import argparse
+import contextlib
+import importlib
+import inspect
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from visit_plan_validator import summarize, validate_plan
+
+# resource 仅在 Linux/macOS 可用
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+# =========================================
+# 脚本参数配置区域
+# =========================================
+# 参与测试的拜访安排脚本：标签 -> 模块名（默认调用 greedy_visit_planning，'模块名:函数名' 指定其他规划函数）
+PLANNER_VARIANTS = {
+    '妇产科动态优先': '拜访安排妇产科动态优先',
+    '整数规划': '拜访安排妇产科动态优先:solver_visit_planning',
+    '非妇产科优先': '拜访安排非妇产科优先',
+    'unified': 'improved_visit_planner_unified',
+    'unified_day': 'improved_visit_planner_unified_day',
+    'improved': 'improved_visit_planner',
+}
+
+# 数据规模：医院数、每家医院科室数、每个科室平均医生数、拜访人数、拜访天数
+SCALES = {
+    'small': {'hospitals': 20, 'departments': 6, 'doctors_per_department': 8, 'visitors': 2, 'days': 10},
+    'city': {'hospitals': 60, 'departments': 8, 'doctors_per_department': 10, 'visitors': 4, 'days': 26},
+    'province': {'hospitals': 300, 'departments': 10, 'doctors_per_department': 12, 'visitors': 12, 'days': 26},
+}
+DEFAULT_SCALES = ['small', 'city']
+
+SEED = 42
+DAILY_VISITS_RANGE = (12, 17)
+START_DATE = datetime(2025, 12, 1)
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'planner_benchmark_results.jsonl')
+
+CITIES = {
+    '贵阳': (26.652, 106.637), '遵义': (27.731, 106.934), '六盘水': (26.598, 104.836),
+    '安顺': (26.259, 105.954), '毕节': (27.308, 105.291), '铜仁': (27.725, 109.195),
+    '凯里': (26.572, 107.988), '都匀': (26.263, 107.525), '兴义': (25.097, 104.902),
+}
+DEPARTMENT_NAMES = [
+    '妇科', '产科', '妇产科', '中医妇产科', '呼吸内科', '呼吸与危重症医学科', '儿科', '小儿内科',
+    '泌尿外科', '男科', '肾内科', '中医科', '全科医学科', '老年病科', '心血管内科', '消化内科',
+    '神经内科', '内分泌科', '骨科', '普外科',
+]
+SURNAMES = list('王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤')
+GIVEN_CHARS = list('伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍红鹏飞建国志文斌宇浩凯健俊帆琳雪梅婷晶颖慧欣')
+
+
+def generate_dataset(hospitals, departments, doctors_per_department, seed=SEED, **_):
+    """
+    生成合成数据
+    返回: (df, df_addr)，列与 read_excel_data 读取的 '导出筛选结果' / '医院地址' 一致
+    """
+    rng = random.Random(seed)
+    cities = list(CITIES)
+    used_names = set()
+    doctor_rows = []
+    addr_rows = []
+    for h in range(hospitals):
+        city = cities[h % len(cities)]
+        hospital = f"{city}市第{h + 1}人民医院"
+        center_lat, center_lon = CITIES[city]
+        addr_rows.append({
+            '医院名称': hospital,
+            '地址': f"贵州省{city}市合成路{h + 1}号",
+            '经纬度': f"{center_lat + rng.gauss(0, 0.03):.6f},{center_lon + rng.gauss(0, 0.03):.6f}",
+        })
+        level = rng.choice(['三级甲等', '三级乙等', '二级甲等'])
+        for dept in rng.sample(DEPARTMENT_NAMES, min(departments, len(DEPARTMENT_NAMES))):
+            for _ in range(max(1, int(rng.gauss(doctors_per_department, doctors_per_department / 3)))):
+                # 医生按姓名去重（拜访安排脚本以姓名作为医生标识）
+                while True:
+                    name = rng.choice(SURNAMES) + ''.join(rng.choice(GIVEN_CHARS) for _ in range(rng.choice((1, 2))))
+                    if name not in used_names:
+                        used_names.add(name)
+                        break
+                doctor_rows.append({
+                    '医院名称': hospital, '所属城市': city, '医院等级': level,
+                    '科室': dept, '医生名称': name, '职称': rng.choice(['主任医师', '副主任医师', '主治医师']),
+                })
+    return pd.DataFrame(doctor_rows), pd.DataFrame(addr_rows)
+
+
+def benchmark_days(days):
+    """从 START_DATE 起取 days 个拜访日（跳过周日，不依赖节假日表，保证各脚本天数一致）"""
+    working_days = []
+    current = START_DATE
+    while len(working_days) < days:
+        if current.weekday() != 6:
+            working_days.append(current)
+        current += timedelta(days=1)
+    return working_days
+
+
+def peak_rss_mb():
+    """当前进程的峰值内存（MB）"""
+    if not RESOURCE_AVAILABLE:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为 KB
+    return round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_variant(variant, scale_name, seed):
+    """在子进程中运行一个拜访安排脚本，返回测试结果"""
+    params = SCALES[scale_name]
+    # 拜访安排脚本输出大量进度信息（包括导入时的提示），测试时丢弃
+    with contextlib.redirect_stdout(io.StringIO()):
+        module_name, _, function_name = PLANNER_VARIANTS[variant].partition(':')
+        module = importlib.import_module(module_name)
+    if hasattr(module, 'TRAVEL_MATRIX_FILE'):
+        # 路程时间矩阵由合成数据的坐标现算，不读写配置的矩阵文件
+        module.TRAVEL_MATRIX_FILE = None
+    df, df_addr = generate_dataset(seed=seed, **params)
+    visitors = [f"拜访人{i + 1}" for i in range(params['visitors'])]
+    working_days = benchmark_days(params['days'])
+    target_visits = len(df)
+
+    planner = getattr(module, function_name or 'greedy_visit_planning')
+    kwargs = {}
+    if 'daily_visits_range' in inspect.signature(planner).parameters:
+        kwargs['daily_visits_range'] = DAILY_VISITS_RANGE
+
+    random.seed(seed)
+    np.random.seed(seed)
+    start = time.perf_counter()
+    error = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            visit_plan = planner(df, df_addr, working_days, visitors, target_visits, **kwargs)
+        except Exception as e:
+            visit_plan = []
+            error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+
+    return {
+        'variant': variant,
+        'scale': scale_name,
+        'seed': seed,
+        'doctors': len(df),
+        'wall_time_s': round(elapsed, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'visits': len(visit_plan),
+        'violations': summarize(validate_plan(visit_plan)),
+        'error': error,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(scales, variants, seed=SEED, results_file=RESULTS_FILE):
+    """逐个运行测试（每个脚本一个新进程，峰值内存互不影响），结果追加到 results_file"""
+    run_info = {'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'revision': git_revision()}
+    results = []
+    print(f"{'脚本':<14}{'规模':<10}{'医生数':>8}{'耗时(秒)':>10}{'峰值内存(MB)':>14}{'拜访条数':>10}  违规")
+    for scale_name in scales:
+        for variant in variants:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                result = executor.submit(run_variant, variant, scale_name, seed).result()
+            result.update(run_info)
+            results.append(result)
+            with open(results_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(result, ensure_ascii=False) + '\n')
+            violations = result['error'] or (', '.join(f"{k} {v}" for k, v in result['violations'].items()) or '无')
+            print(f"{variant:<14}{scale_name:<10}{result['doctors']:>8}{result['wall_time_s']:>10}"
+                  f"{str(result['peak_rss_mb']):>14}{result['visits']:>10}  {violations}")
+    print(f"\n结果已追加到: {results_file}")
+    return results
+
+
+def compare_results(results_file=RESULTS_FILE):
+    """每个脚本/规模对比最近两次测试结果"""
+    if not os.path.exists(results_file):
+        print(f"没有测试结果: {results_file}")
+        return
+    history = defaultdict(list)
+    with open(results_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            result = json.loads(line)
+            history[(result['variant'], result['scale'], result['seed'])].append(result)
+
+    print(f"{'脚本':<14}{'规模':<10}{'版本':<18}{'耗时(秒)':>18}{'峰值内存(MB)':>18}{'拜访条数':>14}{'违规':>10}")
+    for (variant, scale, _), runs in sorted(history.items()):
+        current = runs[-1]
+        previous = runs[-2] if len(runs) > 1 else current
+
+        def pair(key):
+            return f"{previous[key]}→{current[key]}"
+
+        revisions = f"{previous['revision']}→{current['revision']}"
+        violations = f"{sum(previous['violations'].values())}→{sum(current['violations'].values())}"
+        print(f"{variant:<14}{scale:<10}{revisions:<18}{pair('wall_time_s'):>18}{pair('peak_rss_mb'):>18}"
+              f"{pair('visits'):>14}{violations:>10}")
+
+
+def write_dataset_excel(output_file, scale_name, seed=SEED):
+    """导出合成数据为拜访安排脚本的输入Excel"""
+    df, df_addr = generate_dataset(seed=seed, **SCALES[scale_name])
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='导出筛选结果', index=False)
+        df_addr.to_excel(writer, sheet_name='医院地址', index=False)
+    print(f"合成数据已保存到: {output_file}（{len(df_addr)}家医院，{len(df)}位医生）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='拜访安排脚本基准测试')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='运行基准测试')
+    run_parser.add_argument('--scale', default=','.join(DEFAULT_SCALES), help=f"规模，逗号分隔：{', '.join(SCALES)}")
+    run_parser.add_argument('--variants', default=','.join(PLANNER_VARIANTS), help='脚本标签，逗号分隔')
+    run_parser.add_argument('--seed', type=int, default=SEED)
+    subparsers.add_parser('compare', help='对比最近两次结果')
+    generate_parser = subparsers.add_parser('generate', help='导出合成数据')
+    generate_parser.add_argument('output_file')
+    generate_parser.add_argument('--scale', default='city', choices=list(SCALES))
+    generate_parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        compare_results()
+    elif args.command == 'generate':
+        write_dataset_excel(args.output_file, args.scale, args.seed)
+    else:
+        scales = getattr(args, 'scale', ','.join(DEFAULT_SCALES)).split(',')
+        variants = getattr(args, 'variants', ','.join(PLANNER_VARIANTS)).split(',')
+        unknown = [s for s in scales if s not in SCALES] + [v for v in variants if v not in PLANNER_VARIANTS]
+        if unknown:
+            parser.error(f"未知的规模或脚本: {', '.join(unknown)}")
+        run_benchmark(scales, variants, getattr(args, 'seed', SEED))
+
+
+if __name__ == '__main__':
+    main()
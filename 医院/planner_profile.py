@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拜访安排脚本的分阶段计时
+用法：
+    from planner_profile import PROFILER
+    with PROFILER.phase('Excel读取'):
+        ...
+    PROFILER.enable()   # 未启用时 phase() 几乎没有开销
+    ...
+    PROFILER.report()   # 打印按耗时排序的表格
+    PROFILER.save_json('profile.json')  # 追加一条JSON记录，便于跟踪趋势
+"""
+
+import contextlib
+import cProfile
+import json
+import time
+from collections import defaultdict
+from datetime import datetime
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class PhaseProfiler:
+    """按阶段累计耗时和调用次数（各阶段应互不嵌套，未计入任何阶段的时间显示为 '其他'）"""
+
+    def __init__(self):
+        self.enabled = False
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._started = None
+        self._elapsed = 0.0
+        self._cprofile = None
+
+    def enable(self, cprofile=False):
+        """开始计时；cprofile=True 时同时用 cProfile 记录函数级数据（见 dump_cprofile）"""
+        self.enabled = True
+        self.totals.clear()
+        self.calls.clear()
+        self._started = time.perf_counter()
+        if cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def disable(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._started is not None:
+            self._elapsed = time.perf_counter() - self._started
+            self._started = None
+        self.enabled = False
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def rows(self):
+        """按累计耗时从高到低排列的 [(阶段, 耗时秒, 调用次数)]，包含 '其他'"""
+        rows = sorted(((name, self.totals[name], self.calls[name]) for name in self.totals),
+                      key=lambda row: row[1], reverse=True)
+        other = self._elapsed - sum(self.totals.values())
+        if other > 0:
+            rows.append(('其他', other, 0))
+        return rows
+
+    def report(self):
+        print("\n=== 分阶段耗时 ===")
+        print(f"{'阶段':<12}{'耗时(秒)':>10}{'占比':>8}{'调用次数':>10}{'平均(毫秒)':>12}")
+        for name, seconds, calls in self.rows():
+            share = seconds / self._elapsed * 100 if self._elapsed else 0
+            average = f"{seconds / calls * 1000:.3f}" if calls else '-'
+            print(f"{name:<12}{seconds:>10.3f}{share:>7.1f}%{calls:>10}{average:>12}")
+        print(f"{'合计':<12}{self._elapsed:>10.3f}")
+
+    def save_json(self, path, **extra):
+        """以一行JSON追加本次计时结果（extra 可记录规模等上下文）"""
+        record = {
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'total_s': round(self._elapsed, 4),
+            'phases': {name: {'seconds': round(seconds, 4), 'calls': calls} for name, seconds, calls in self.rows()},
+        }
+        record.update(extra)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"分阶段耗时已追加到: {path}")
+
+    def dump_cprofile(self, path):
+        """保存 cProfile 数据（可用 snakeviz / pstats 查看）"""
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(path)
+            print(f"cProfile 数据已保存到: {path}")
+
+
+PROFILER = PhaseProfiler()
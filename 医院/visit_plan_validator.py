@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拜访计划校验工具
+对已保存的 '拜访计划' 标签页（或拜访安排脚本返回的拜访列表）逐条检查拜访规则，
+全部按分组一次计算（线性时间），返回违规明细表，可作为拜访安排脚本改动后的回归检查。
+
+检查规则：
+1. 同一天同一医院同一科室不安排同姓医生
+2. 同一拜访人不连续第三天拜访同一医院（日历上的连续日期）
+3. 同一天同一医院同一科室最多 6 条（拜访安排脚本每个科室随机取 4-6 条上限）
+4. 同一拜访人同一天在一家医院至少 3 条
+5. 拜访开始时间不晚于 17:05
+6. 妇产科拜访占比不超过 20%
+7. 同一医生不重复拜访
+
+使用方法：
+    python visit_plan_validator.py 拜访计划.xlsx [违规明细.xlsx]
+有违规时退出码为 1。
+"""
+
+import sys
+import time
+
+import pandas as pd
+
+from department_categories import is_obgyn
+
+# =========================================
+# 规则参数
+# =========================================
+MAX_DEPT_VISITS_PER_DAY = 6
+MIN_HOSPITAL_VISITS_PER_DAY = 3
+LATEST_START_TIME = '17:05'
+MAX_OBGYN_RATIO = 0.2
+MAX_CONSECUTIVE_DAYS = 2
+
+VIOLATION_COLUMNS = ['规则', '日期', '拜访人', '医院名称', '科室', '医生名称', '说明']
+
+
+def _violations(rule, rows, description):
+    """由分组结果构造违规明细（rows 中缺少的列留空）"""
+    table = pd.DataFrame({column: rows[column].to_numpy() if column in rows else ''
+                          for column in VIOLATION_COLUMNS[1:-1]}, index=range(len(rows)))
+    table.insert(0, '规则', rule)
+    table['说明'] = description if isinstance(description, str) else list(description)
+    return table
+
+
+def validate_plan(plan):
+    """
+    校验拜访计划
+
+    参数:
+        plan: DataFrame（'拜访计划' 标签页）或拜访字典列表，需包含
+              日期、拜访人、医院名称、科室、医生名称、拜访开始时间 列
+    返回:
+        违规明细 DataFrame，列为 VIOLATION_COLUMNS，无违规时为空表
+    """
+    df = pd.DataFrame(plan).reset_index(drop=True)
+    if df.empty:
+        return pd.DataFrame(columns=VIOLATION_COLUMNS)
+    df['日期'] = pd.to_datetime(df['日期']).dt.normalize()
+    df['医生名称'] = df['医生名称'].fillna('').astype(str).str.strip()
+    df['姓氏'] = df['医生名称'].str[:1]
+    tables = []
+
+    # 1. 同科室同姓
+    dept_keys = ['日期', '医院名称', '科室']
+    named = df[df['姓氏'] != '']
+    surname_counts = named.groupby(dept_keys + ['姓氏'])['医生名称'].transform('size')
+    same_surname = named[surname_counts > 1]
+    if len(same_surname):
+        doctors = same_surname.groupby(dept_keys + ['姓氏'])['医生名称'].agg('、'.join).reset_index()
+        tables.append(_violations('同科室同姓', doctors, '同姓医生：' + doctors['医生名称']))
+
+    # 2. 连续第三天拜访同一医院：去重后按日期排序，与前面第2个拜访日相差2天即为连续3天
+    days = df[['拜访人', '医院名称', '日期']].drop_duplicates().sort_values(['拜访人', '医院名称', '日期'])
+    gap = days['日期'] - days.groupby(['拜访人', '医院名称'])['日期'].shift(MAX_CONSECUTIVE_DAYS)
+    consecutive = days[gap == pd.Timedelta(days=MAX_CONSECUTIVE_DAYS)]
+    if len(consecutive):
+        tables.append(_violations('连续第三天拜访同一医院', consecutive, f'连续{MAX_CONSECUTIVE_DAYS + 1}天拜访'))
+
+    # 3. 科室单日超量
+    dept_counts = df.groupby(dept_keys).size().reset_index(name='条数')
+    over = dept_counts[dept_counts['条数'] > MAX_DEPT_VISITS_PER_DAY]
+    if len(over):
+        tables.append(_violations('科室单日超量', over, over['条数'].map(lambda n: f'{n}条，上限{MAX_DEPT_VISITS_PER_DAY}条')))
+
+    # 4. 医院单日不足
+    hospital_counts = df.groupby(['日期', '拜访人', '医院名称']).size().reset_index(name='条数')
+    under = hospital_counts[hospital_counts['条数'] < MIN_HOSPITAL_VISITS_PER_DAY]
+    if len(under):
+        tables.append(_violations('医院单日不足', under, under['条数'].map(lambda n: f'{n}条，至少{MIN_HOSPITAL_VISITS_PER_DAY}条')))
+
+    # 5. 开始时间过晚（Excel 读回的时间可能是字符串或 time 对象，统一取 HH:MM）
+    start_times = df['拜访开始时间'].astype(str).str[:5].str.zfill(5)
+    late = df[start_times > LATEST_START_TIME]
+    if len(late):
+        tables.append(_violations('开始时间过晚', late, '开始时间 ' + start_times[late.index]))
+
+    # 6. 妇产科占比（科室名称先去重再分类）
+    obgyn = df['科室'].map({dept: is_obgyn(dept) for dept in df['科室'].unique()}).astype(bool)
+    ratio = obgyn.mean()
+    if ratio > MAX_OBGYN_RATIO:
+        tables.append(_violations('妇产科占比超标', pd.DataFrame([{}]), f'妇产科 {int(obgyn.sum())}/{len(df)} = {ratio:.1%}'))
+
+    # 7. 重复拜访医生
+    duplicated = df[df['医生名称'].ne('') & df.duplicated(['医院名称', '医生名称'], keep='first')]
+    if len(duplicated):
+        tables.append(_violations('重复拜访医生', duplicated, '该医生已在计划中'))
+
+    if not tables:
+        return pd.DataFrame(columns=VIOLATION_COLUMNS)
+    result = pd.concat(tables, ignore_index=True)
+    result['日期'] = pd.to_datetime(result['日期'], errors='coerce').dt.strftime('%Y/%m/%d').fillna('')
+    return result
+
+
+def summarize(violations):
+    """各规则违规条数 {规则: 条数}"""
+    return violations['规则'].value_counts().to_dict()
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("用法: python visit_plan_validator.py 拜访计划.xlsx [违规明细.xlsx]")
+        return 2
+    plan = pd.read_excel(argv[1], sheet_name='拜访计划')
+    start = time.perf_counter()
+    violations = validate_plan(plan)
+    elapsed = time.perf_counter() - start
+
+    print(f"校验 {len(plan)} 条拜访，用时 {elapsed:.3f} 秒")
+    if violations.empty:
+        print("✅ 未发现违规")
+        return 0
+    print(f"❌ 发现 {len(violations)} 条违规：")
+    for rule, count in summarize(violations).items():
+        print(f"  {rule}: {count}")
+    if len(argv) > 2:
+        violations.to_excel(argv[2], sheet_name='违规明细', index=False)
+        print(f"违规明细已保存到: {argv[2]}")
+    else:
+        print(violations.head(20).to_string(index=False))
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
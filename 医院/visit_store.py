@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拜访记录的列式存储
+每条拜访不再是一个字典，而是几列定长 NumPy 数组中的同一行：
+日期、拜访人、医院、科室、医生存为整数编码（编码表见 VisitStore.labels），
+拜访开始/结束时间存为当天第几分钟（int16，未安排时间为 -1）。
+拜访按安排顺序追加，撤回最近安排的若干条只需截断长度（truncate），不用遍历过滤整个列表。
+
+用法：
+    from visit_store import VisitStore
+    store = VisitStore()
+    mark = len(store)
+    store.append('2025-12-01', '张三', 'XX医院', '妇科', '李四')
+    store.truncate(mark)                       # 撤回 mark 之后的拜访
+    store.column('hospital')                   # 医院编码数组（只读视图）
+    store.to_dicts(addresses=addresses)        # 导出为与原来相同的拜访字典列表
+    store.to_frame(addresses=addresses)        # 导出为 DataFrame（分类列）
+"""
+
+import numpy as np
+import pandas as pd
+
+# 列名 -> (导出时的字段名, 编码类型)
+CODE_COLUMNS = {
+    'date': ('日期', np.int16),
+    'hospital': ('医院名称', np.int32),
+    'visitor': ('拜访人', np.int16),
+    'dept': ('科室', np.int32),
+    'doctor': ('医生名称', np.int32),
+}
+TIME_COLUMNS = {
+    'start': '拜访开始时间',
+    'end': '拜访结束时间',
+}
+NO_TIME = -1
+ADDRESS_NOT_FOUND = '地址未找到'
+
+
+def time_to_minutes(text):
+    """'HH:MM' -> 当天第几分钟"""
+    hour, minute = text.split(':')
+    return int(hour) * 60 + int(minute)
+
+
+def minutes_to_time(minutes):
+    """当天第几分钟 -> 'HH:MM'"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class VisitStore:
+    """按安排顺序追加的拜访记录，列式存储，容量不足时按倍数扩容"""
+
+    def __init__(self, capacity=1024):
+        self._size = 0
+        self._labels = {name: [] for name in CODE_COLUMNS}
+        self._codes = {name: {} for name in CODE_COLUMNS}
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, (_, dtype) in CODE_COLUMNS.items()}
+        for name in TIME_COLUMNS:
+            self._columns[name] = np.full(capacity, NO_TIME, dtype=np.int16)
+
+    def __len__(self):
+        return self._size
+
+    def code(self, name, label):
+        """取得（必要时新建）label 在 name 列中的编码"""
+        codes = self._codes[name]
+        code = codes.get(label)
+        if code is None:
+            code = codes[label] = len(self._labels[name])
+            self._labels[name].append(label)
+        return code
+
+    def labels(self, name):
+        """name 列的编码表：labels(name)[编码] 为原始字符串"""
+        return self._labels[name]
+
+    def _grow(self):
+        capacity = len(self._columns['date']) * 2
+        for name, column in self._columns.items():
+            grown = np.full(capacity, NO_TIME, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def append(self, date, visitor, hospital, dept, doctor):
+        """追加一条未安排时间的拜访，返回它的行号"""
+        if self._size == len(self._columns['date']):
+            self._grow()
+        row = self._size
+        for name, label in zip(CODE_COLUMNS, (date, hospital, visitor, dept, doctor)):
+            self._columns[name][row] = self.code(name, label)
+        self._columns['start'][row] = NO_TIME
+        self._columns['end'][row] = NO_TIME
+        self._size += 1
+        return row
+
+    def truncate(self, size):
+        """只保留前 size 条拜访（撤回之后安排的拜访），耗时只与撤回的条数有关"""
+        if size < self._size:
+            self._columns['start'][size:self._size] = NO_TIME
+            self._columns['end'][size:self._size] = NO_TIME
+            self._size = max(size, 0)
+
+    def column(self, name, start=0, stop=None):
+        """[start, stop) 行 name 列的只读视图（编码或分钟数）"""
+        view = self._columns[name][start:self._size if stop is None else min(stop, self._size)]
+        view.flags.writeable = False
+        return view
+
+    def label(self, name, row):
+        """第 row 行 name 列的原始字符串"""
+        return self._labels[name][self._columns[name][row]]
+
+    def set_times(self, start, visits):
+        """把拜访字典中的 '拜访开始时间'/'拜访结束时间' 写回从 start 行开始的各行"""
+        for offset, visit in enumerate(visits):
+            for name, field in TIME_COLUMNS.items():
+                if field in visit:
+                    self._columns[name][start + offset] = time_to_minutes(visit[field])
+
+    def to_dicts(self, start=0, stop=None, addresses=None):
+        """
+        导出 [start, stop) 行为拜访字典列表（字段与原来的拜访字典相同）
+
+        参数:
+            addresses: {医院名称: 地址}，不提供时不导出 '地址'；没有时间的拜访不导出时间字段
+        """
+        stop = self._size if stop is None else min(stop, self._size)
+        columns = {name: self._columns[name][start:stop].tolist() for name in self._columns}
+        visits = []
+        for offset in range(stop - start):
+            visit = {field: self._labels[name][columns[name][offset]] for name, (field, _) in CODE_COLUMNS.items()}
+            if addresses is not None:
+                visit['地址'] = addresses.get(visit['医院名称'], ADDRESS_NOT_FOUND)
+            for name, field in TIME_COLUMNS.items():
+                if columns[name][offset] != NO_TIME:
+                    visit[field] = minutes_to_time(columns[name][offset])
+            visits.append(visit)
+        return visits
+
+    def to_frame(self, start=0, stop=None, addresses=None):
+        """导出 [start, stop) 行为 DataFrame：编码列转为 pandas 分类列（共用编码表，不复制字符串）"""
+        stop = self._size if stop is None else min(stop, self._size)
+        data = {}
+        for name, (field, _) in CODE_COLUMNS.items():
+            data[field] = pd.Categorical.from_codes(self._columns[name][start:stop], categories=self._labels[name])
+        if addresses is not None:
+            data['地址'] = data['医院名称'].map(lambda hospital: addresses.get(hospital, ADDRESS_NOT_FOUND))
+        for name, field in TIME_COLUMNS.items():
+            minutes = self._columns[name][start:stop]
+            data[field] = [minutes_to_time(m) if m != NO_TIME else None for m in minutes.tolist()]
+        return pd.DataFrame(data)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta, time
@@ -9,6 +10,12 @@ from collections import defaultdict
 import openpyxl
 from openpyxl import Workbook
 
+from department_categories import is_obgyn
+from hospital_geo import (TravelMatrix, assign_hospitals_by_location, geocode_hospitals, hospital_route,
+                          load_or_build_travel_matrix, summarize_daily_travel)
+from planner_profile import PROFILER
+from visit_store import VisitStore
+
 # 使用 chinese_calendar 包来处理中国节假日
 try:
     import chinese_calendar as cc
@@ -18,6 +25,22 @@ except ImportError:
     print("警告：未安装 chinese_calendar 包，将使用简化的节假日处理")
     print("建议安装：pip install chinesecalendar")
 
+# scipy 可选：整数规划模式（PLANNING_MODE = 'solver'）需要
+try:
+    from scipy import sparse
+    from scipy.optimize import Bounds, LinearConstraint, milp
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# 整数规划的时间估算（分钟）：平均每条拜访（15-30分钟拜访加科室间隔，同科室连续拜访）、
+# 两家医院之间的路程（有路程矩阵时按矩阵，没有时按 calculate_visit_times 的45-60分钟取中间值）、
+# 一天可用时间（8:30-9:00开始到17:05最晚开始，扣除午休）
+# 按 calculate_visit_times 实测：一家医院16条基本不会被时间截断，17条约七成不被截断（截断的拜访留给后面的日期）
+AVG_VISIT_MINUTES = 25
+HOP_MINUTES = 53
+WORKDAY_MINUTES = 425
+
 # 配置项将在脚本末尾统一设置
 
 def is_workday(date):
@@ -99,8 +122,14 @@ def read_excel_data(file_path):
         print(f"读取Excel文件失败：{e}")
         return None, None
 
-def assign_hospitals_to_visitors(hospitals, visitors, df):
-    """为拜访人员分配医院（按照各拜访人分配的医院医生总量差距最小）"""
+def assign_hospitals_to_visitors(hospitals, visitors, df, hospital_coords=None):
+    """为拜访人员分配医院（按照各拜访人分配的医院医生总量差距最小）
+    
+    hospital_coords: {医院名称: (纬度, 经度)}，提供时按地理位置分片区分配（见 hospital_geo.assign_hospitals_by_location）
+    """
+    if hospital_coords:
+        return assign_hospitals_by_location(hospitals, visitors, df, hospital_coords)
+    
     hospital_assignment = {visitor: [] for visitor in visitors}
     hospitals_list = list(hospitals)
     
@@ -189,8 +218,119 @@ def select_daily_hospitals(visitor_hospitals, df, doctor_visited, max_hospitals=
     
     return selected_hospitals
 
-def calculate_visit_times(visits_today, visitor):
-    """计算一天的拜访开始和结束时间"""
+def count_visit_slots(working_days, day_index, visited_dates):
+    """从今天起到最后一个工作日，某家医院在不连续3天拜访的前提下最多还能拜访几天
+
+    visited_dates: 已拜访该医院的日期集合（date），用于判断今天、明天是否与之前的拜访连成3天
+    """
+    visited = set(visited_dates)
+    slots = 0
+    for day in working_days[day_index:]:
+        current_date = day.date()
+        if current_date - timedelta(days=1) in visited and current_date - timedelta(days=2) in visited:
+            continue
+        visited.add(current_date)
+        slots += 1
+    return slots
+
+def select_daily_hospitals_lookahead(visitor_hospitals, remaining_doctors, working_days, day_index, visitor_hospital_history,
+                                     daily_visits, allow_obgyn, max_hospitals=2, min_visits_per_hospital=3, hospital_travel=None,
+                                     visit_travel=None):
+    """前瞻选院：按日历估算每家医院还需要几天、还有几天可排，提前安排小医院，避免月底集中回滚
+
+    - 按科室最低上限（4条）和同科室不同姓估算医院今天能排的条数，不足 min_visits_per_hospital 条的不选
+    - 主医院：有医院余量（可排天数 - 还需天数）不足时优先安排余量最少的，否则选剩余医生最多的
+    - 剩余医生今天就能排完、且给另一家医院留下至少 min_visits_per_hospital 条的为小医院；
+      主医院排不满当天条数，或剩余工作日只比小医院数多 LOOKAHEAD_BUFFER_DAYS 天以内时，搭配一家小医院
+      （每天最多搭配一家，再晚就排不完），优先选余量最少的，余量相同时选剩余医生少的；
+      否则第二家同原规则选剩余医生最多的医院，主医院实际排不满时补足
+    - 第二家医院按整数规划的时间估算（AVG_VISIT_MINUTES、WORKDAY_MINUTES）：第一家排满后加上路程，
+      第二家的 min_visits_per_hospital 条排不进17:05前的不搭配（否则时间截断后第二家不足3条）
+
+    Args:
+        remaining_doctors: 该拜访人各医院未拜访的医生（需包含 '姓氏' 列）
+        visitor_hospital_history: 日期字符串 -> 当天拜访的医院集合
+        allow_obgyn: 妇产科占比未满，估算时计入妇产科医生
+        hospital_travel: (医院, 医院) -> 路程分钟数（未知为 None），提供时搭配的第二家医院在余量允许时选离主医院近的
+        visit_travel: 计算拜访时间用的路程矩阵（hospital_geo.TravelMatrix），未提供或没有这两家医院时路程按 HOP_MINUTES
+    返回:
+        (按安排顺序排列的医院列表（小医院在前）, 按原规则（剩余医生最多）会选中但今天排不满而跳过的医院数)
+    """
+    day_str = working_days[day_index].strftime('%Y-%m-%d')
+    hospital_counts = remaining_doctors.groupby('医院名称').size()
+    dept_surnames = remaining_doctors.groupby(['医院名称', '科室'])['姓氏'].nunique()
+    day_capacity = defaultdict(int)
+    for (hospital, dept), surname_count in dept_surnames.items():
+        if allow_obgyn or not is_obgyn(dept):
+            day_capacity[hospital] += min(4, surname_count)
+
+    candidates = [hospital for hospital in visitor_hospitals if hospital_counts.get(hospital, 0) >= min_visits_per_hospital]
+    feasible = {}
+    for hospital in candidates:
+        capacity = min(day_capacity[hospital], daily_visits)
+        if capacity >= min_visits_per_hospital and not check_consecutive_hospital_visits(visitor_hospital_history, hospital, day_str):
+            feasible[hospital] = capacity
+    most_remaining = sorted(candidates, key=lambda hospital: hospital_counts[hospital], reverse=True)[:max_hospitals]
+    skipped = sum(1 for hospital in most_remaining
+                  if hospital not in feasible and not check_consecutive_hospital_visits(visitor_hospital_history, hospital, day_str))
+    if not feasible:
+        return [], skipped
+
+    slack = {}
+    for hospital, capacity in feasible.items():
+        visited_dates = {datetime.strptime(date_str, '%Y-%m-%d').date()
+                         for date_str, hospitals in visitor_hospital_history.items() if hospital in hospitals}
+        days_needed = -(-hospital_counts[hospital] // capacity)
+        slack[hospital] = count_visit_slots(working_days, day_index, visited_dates) - days_needed
+
+    urgent = [hospital for hospital in feasible if slack[hospital] <= 0]
+    if urgent:
+        main_hospital = min(urgent, key=lambda hospital: (slack[hospital], -hospital_counts[hospital]))
+    else:
+        main_hospital = max(feasible, key=lambda hospital: hospital_counts[hospital])
+    small = [hospital for hospital in feasible
+             if hospital != main_hospital and hospital_counts[hospital] <= daily_visits - min_visits_per_hospital]
+    days_left = len(working_days) - day_index
+    
+    def travel_from_main(hospital):
+        travel = hospital_travel(main_hospital, hospital) if hospital_travel else None
+        return travel if travel is not None else float('inf')
+    
+    def fits_after(first, second):
+        # first 排满（给 second 留 min_visits_per_hospital 条）后赶到 second，second 的最后一条能否在17:05前开始
+        first_visits = min(feasible[first], daily_visits - min_visits_per_hospital)
+        travel = visit_travel.minutes(first, second) if visit_travel is not None else None
+        travel = HOP_MINUTES if travel is None else travel
+        return (first_visits + min_visits_per_hospital) * AVG_VISIT_MINUTES + travel <= WORKDAY_MINUTES
+    
+    if not small or (feasible[main_hospital] >= daily_visits and len(small) + LOOKAHEAD_BUFFER_DAYS < days_left):
+        # 不搭配小医院时同原规则：第二家为剩余医生最多的医院（有路程时选离主医院近的），主医院实际排不满时补足
+        others = sorted((hospital for hospital in feasible if hospital != main_hospital and fits_after(main_hospital, hospital)),
+                        key=lambda hospital: (travel_from_main(hospital), -hospital_counts[hospital]) if hospital_travel
+                        else -hospital_counts[hospital])
+        return ([main_hospital] + others)[:max_hospitals], skipped
+    # 余量不足的主医院先排，否则小医院先排
+    pairable = [hospital for hospital in small
+                if (fits_after(main_hospital, hospital) if urgent else fits_after(hospital, main_hospital))]
+    if not pairable:
+        return [main_hospital], skipped
+    if hospital_travel:
+        # 余量紧张（不超过 LOOKAHEAD_BUFFER_DAYS 天）的小医院优先，其余选离主医院近的
+        small_hospital = min(pairable, key=lambda hospital: (slack[hospital] > LOOKAHEAD_BUFFER_DAYS, travel_from_main(hospital),
+                                                              slack[hospital], hospital_counts[hospital]))
+    else:
+        small_hospital = min(pairable, key=lambda hospital: (slack[hospital], hospital_counts[hospital]))
+    if urgent:
+        # 余量不足的主医院先排满，小医院用剩下的条数
+        return [main_hospital, small_hospital][:max_hospitals], skipped
+    return [small_hospital, main_hospital][:max_hospitals], skipped
+
+def calculate_visit_times(visits_today, visitor, travel=None):
+    """计算一天的拜访开始和结束时间
+    
+    travel: 医院间路程时间矩阵（hospital_geo.TravelMatrix），跨医院时按矩阵中的分钟数；
+            未提供或矩阵中没有这两家医院时按45-60分钟
+    """
     # 每人每天的拜访开始时间为早上八点半到9点间随机
     start_hour = 8
     start_minute = random.randint(30, 59)
@@ -207,8 +347,10 @@ def calculate_visit_times(visits_today, visitor):
         if previous_visit is not None:
             # 判断是否跨医院
             if visit['医院名称'] != previous_visit['医院名称']:
-                # 跨医院：上一个医院的拜访结束时间加上45-60分钟
-                travel_time = random.randint(45, 60)
+                # 跨医院：上一个医院的拜访结束时间加上路程时间（没有路程数据时45-60分钟）
+                travel_time = travel.minutes(previous_visit['医院名称'], visit['医院名称']) if travel is not None else None
+                if travel_time is None:
+                    travel_time = random.randint(45, 60)
                 current_time += timedelta(minutes=travel_time)
             # 判断是否跨科室（同医院不同科室）
             elif visit['科室'] != previous_visit['科室']:
@@ -251,83 +393,119 @@ def calculate_visit_times(visits_today, visitor):
     
     return visits_today
 
-def check_same_surname(doctor_name, existing_doctors):
-    """检查医生姓氏是否与已安排的医生相同"""
-    if not existing_doctors:
-        return False
-    
-    # 处理医生姓名中的空格
-    clean_name = doctor_name.strip() if doctor_name else ''
-    doctor_surname = clean_name[0] if clean_name else ''
-    
-    for existing_doctor in existing_doctors:
-        clean_existing = existing_doctor.strip() if existing_doctor else ''
-        existing_surname = clean_existing[0] if clean_existing else ''
-        if doctor_surname == existing_surname and doctor_surname != '':
-            return True
-    
-    return False
+def drop_short_last_hospital(visits_today, min_visits=3):
+    """时间截断后当天最后一家医院不足 min_visits 条时整体去掉（截断只截掉最后几条，只有最后一家医院可能不足）"""
+    tail = len(visits_today)
+    while tail > 0 and visits_today[tail - 1]['医院名称'] == visits_today[-1]['医院名称']:
+        tail -= 1
+    return visits_today[:tail] if len(visits_today) - tail < min_visits else visits_today
+
+def get_surname(doctor_name):
+    """医生姓氏（去掉空格后的第一个字，没有姓名时为空字符串）"""
+    clean_name = doctor_name.strip() if isinstance(doctor_name, str) else ''
+    return clean_name[0] if clean_name else ''
+
+def check_same_surname(doctor_name, existing_surnames):
+    """检查医生姓氏是否与已安排的医生相同（existing_surnames 为已安排医生的姓氏集合）"""
+    surname = get_surname(doctor_name)
+    return surname != '' and surname in existing_surnames
 
 def check_consecutive_hospital_visits(visitor_hospital_history, hospital, current_date_str):
     """检查拜访者是否在连续2天拜访同一家医院后，第三天又安排同一家医院
     
+    visitor_hospital_history: 日期字符串 -> 当天拜访的医院集合
     注意：这里的"连续"是指日历上的连续日期，不考虑节假日
     """
-    if len(visitor_hospital_history) < 2:
-        return False  # 历史记录不足2天，无法形成连续2天后的第三天
-    
-    # 将当前日期字符串转换为日期对象
-    current_date = datetime.strptime(current_date_str, '%Y-%m-%d').date()
-    
     # 计算前两天的日期（日历上的连续日期，不考虑节假日）
-    prev_day_1 = current_date - timedelta(days=1)  # 前一天
-    prev_day_2 = current_date - timedelta(days=2)  # 前两天
-    
-    # 收集每一天拜访的所有医院（处理一天拜访多家医院的情况）
-    prev_day_1_hospitals = set()
-    prev_day_2_hospitals = set()
-    
-    for record in visitor_hospital_history:
-        record_date = datetime.strptime(record['date'], '%Y-%m-%d').date()
-        if record_date == prev_day_1:
-            prev_day_1_hospitals.add(record['hospital'])
-        elif record_date == prev_day_2:
-            prev_day_2_hospitals.add(record['hospital'])
+    current_date = datetime.strptime(current_date_str, '%Y-%m-%d').date()
+    prev_day_1 = (current_date - timedelta(days=1)).strftime('%Y-%m-%d')  # 前一天
+    prev_day_2 = (current_date - timedelta(days=2)).strftime('%Y-%m-%d')  # 前两天
     
     # 如果前两天都拜访了同一家医院，并且当前要安排的也是这家医院，则返回True（不允许）
-    # 检查两个集合的交集
-    common_hospitals = prev_day_1_hospitals & prev_day_2_hospitals
-    if common_hospitals and hospital in common_hospitals:
-        return True
+    return (hospital in visitor_hospital_history.get(prev_day_1, ()) and
+            hospital in visitor_hospital_history.get(prev_day_2, ()))
+
+def load_travel(df_addr, hospital_coords):
+    """医院间路程时间矩阵
     
-    return False
+    返回: (用于搭配医院的矩阵, 用于计算拜访时间的矩阵)，没有时为 None；
+          USE_TRAVEL_MATRIX 为 False 时拜访时间仍按45-60分钟，按地理位置分配时由坐标估算矩阵只用于搭配医院
+    """
+    if USE_TRAVEL_MATRIX:
+        travel = load_or_build_travel_matrix(df_addr, TRAVEL_MATRIX_FILE, coords=hospital_coords or None)
+        return travel, travel
+    if hospital_coords:
+        return TravelMatrix.from_coords(hospital_coords), None
+    return None, None
 
 def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, daily_visits_range):
-    """使用贪心算法制定拜访计划"""
+    """使用贪心算法制定拜访计划（一次返回全部拜访，逐天取结果见 iter_greedy_visit_plan）"""
+    visit_plan = []
+    for _, day_visits in iter_greedy_visit_plan(df, df_addr, working_days, visitors, target_visits, daily_visits_range):
+        visit_plan.extend(day_visits)
+    return visit_plan
+
+def iter_greedy_visit_plan(df, df_addr, working_days, visitors, target_visits, daily_visits_range):
+    """
+    使用贪心算法逐天制定拜访计划，每排定一天就产出 (日期字符串, 当天全部拜访列表)
+    
+    只产出有拜访的日期，按日期先后顺序。最后有拜访的一天要等全部排完后才产出，
+    因为最终的妇产科占比修正只会改动最后一批拜访所在的那一天；其余日期产出后不再改动。
+    调用方可以逐天写文件、显示进度，或在达到目标条数后提前停止迭代。
+    安排过程中拜访存放在列式的 VisitStore 中，产出时才转成拜访字典。
+    """
     # 获取所有医院
     hospitals = df['医院名称'].unique()
     
-    # 为拜访人员分配医院
-    hospital_assignment = assign_hospitals_to_visitors(hospitals, visitors, df)
+    # 为拜访人员分配医院（按地理位置分配时先取医院坐标）
+    with PROFILER.phase('医院分配'):
+        hospital_coords = geocode_hospitals(df_addr) if ASSIGNMENT_MODE == 'geo' else {}
+        hospital_assignment = assign_hospitals_to_visitors(hospitals, visitors, df, hospital_coords)
+        # 路程时间矩阵：用于计算跨医院时间和每天搭配路程近的医院
+        travel, visit_travel = load_travel(df_addr, hospital_coords)
+    hospital_travel = travel.minutes if travel is not None and len(travel) else None
     
     # 均衡拜访人的拜访量分配
     visitor_targets = balance_daily_visits(df, visitors, target_visits)
     
-    visit_plan = []
+    # 医院地址（同名医院取第一条）
+    addresses = dict(zip(*df_addr.drop_duplicates('医院名称')[['医院名称', '地址']].values.T)) if len(df_addr) else {}
+    store = VisitStore()  # 已安排的拜访，按安排顺序追加；撤回即截断
+    pending_day = None  # 最后有拜访的一天：(日期字符串, 起始行)，占比修正可能改动它，暂不产出
+    travel_routes = []  # 每位拜访人每天经过的医院，用于汇总路程
     doctor_visited = set()  # 记录已拜访的医生
     daily_hospital_dept_count = defaultdict(lambda: defaultdict(int))  # 每天每家医院每个科室的拜访次数
-    daily_hospital_dept_doctors = defaultdict(lambda: defaultdict(list))  # 每天每家医院每个科室已安排的医生姓名
+    daily_hospital_dept_surnames = defaultdict(lambda: defaultdict(set))  # 每天每家医院每个科室已安排医生的姓氏
     visitor_visit_count = {visitor: 0 for visitor in visitors}  # 记录每个拜访人的拜访次数
-    visitor_hospital_history = {visitor: [] for visitor in visitors}  # 记录每个拜访者的医院拜访历史
+    visitor_hospital_history = {visitor: {} for visitor in visitors}  # 记录每个拜访者的医院拜访历史：日期 -> 当天拜访的医院集合
     
     total_visits = 0
     obgyn_visit_count = 0
     prioritize_obgyn_next_batch = False
     first_batch_done = False
-    last_batch_visits = []
     last_batch_meta = None
+    rollback_count = 0  # 安排后不足3条而整体撤回的次数
+    lookahead_skips = 0  # 前瞻选院预判排不满而跳过的次数（即避免的回滚）
+    lookahead = HOSPITAL_SELECTION == 'lookahead'
     
-    for day in working_days:
+    def undo_visits(start, day_str, visitor):
+        # 撤回 start 之后的拜访，医生和各项计数恢复为未拜访（医生留给后面的日期）
+        nonlocal total_visits, obgyn_visit_count
+        for row in range(start, len(store)):
+            doctor = store.label('doctor', row)
+            row_dept = store.label('dept', row)
+            doctor_visited.discard(doctor)
+            total_visits -= 1
+            visitor_visit_count[visitor] -= 1
+            dept_key = f"{store.label('hospital', row)}_{row_dept}"
+            daily_hospital_dept_count[day_str][dept_key] -= 1
+            daily_hospital_dept_surnames[day_str][dept_key].discard(get_surname(doctor))
+            # 如果是妇产科，还需要减少妇产科计数
+            if is_obgyn(row_dept):
+                obgyn_visit_count -= 1
+        store.truncate(start)
+    
+    for day_index, day in enumerate(working_days):
         # 检查是否所有拜访人都已达到目标
         all_completed = all(visitor_visit_count[visitor] >= visitor_targets[visitor] for visitor in visitors)
         if all_completed or total_visits >= target_visits:
@@ -335,7 +513,8 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
             
         day_str = day.strftime('%Y-%m-%d')
         daily_hospital_dept_count[day_str] = defaultdict(int)
-        daily_hospital_dept_doctors[day_str] = defaultdict(list)
+        daily_hospital_dept_surnames[day_str] = defaultdict(set)
+        day_start = len(store)
         
         for visitor in visitors:
             # 检查该拜访人是否已达到目标拜访量
@@ -351,14 +530,26 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
             
             visitor_hospitals = hospital_assignment[visitor]
             
-            # 每天选择医院（优先选择剩余医生较多的医院）
-            daily_hospitals = select_daily_hospitals(visitor_hospitals, df, doctor_visited, max_hospitals=2)
+            with PROFILER.phase('每日选院'):
+                if lookahead:
+                    # 前瞻选院：提前搭配小医院，跳过今天排不满3条的医院
+                    remaining_doctors = df[df['医院名称'].isin(visitor_hospitals) & ~df['医生名称'].isin(doctor_visited)]
+                    remaining_doctors = remaining_doctors.assign(姓氏=remaining_doctors['医生名称'].map(get_surname))
+                    allow_obgyn = total_visits == 0 or obgyn_visit_count / total_visits < 0.2
+                    daily_hospitals, skipped = select_daily_hospitals_lookahead(
+                        visitor_hospitals, remaining_doctors, working_days, day_index,
+                        visitor_hospital_history[visitor], daily_visits, allow_obgyn, max_hospitals=2,
+                        hospital_travel=hospital_travel, visit_travel=visit_travel)
+                    lookahead_skips += skipped
+                else:
+                    # 每天选择医院（优先选择剩余医生较多的医院）
+                    daily_hospitals = select_daily_hospitals(visitor_hospitals, df, doctor_visited, max_hospitals=2)
             
-            # 过滤掉会导致连续3天拜访同一医院的医院（基于日历上的连续日期，不考虑节假日）
-            filtered_hospitals = []
-            for hospital in daily_hospitals:
-                if not check_consecutive_hospital_visits(visitor_hospital_history[visitor], hospital, day_str):
-                    filtered_hospitals.append(hospital)
+                # 过滤掉会导致连续3天拜访同一医院的医院（基于日历上的连续日期，不考虑节假日）
+                filtered_hospitals = []
+                for hospital in daily_hospitals:
+                    if not check_consecutive_hospital_visits(visitor_hospital_history[visitor], hospital, day_str):
+                        filtered_hospitals.append(hospital)
             
             # 如果过滤后没有可选医院，则跳过该拜访者今天的安排
             if not filtered_hospitals:
@@ -366,41 +557,47 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                 
             daily_hospitals = filtered_hospitals
             
-            # 贪心策略：优先选择医生较多的医院，减少医院数量
-            hospital_doctor_count = {}
-            for hospital in daily_hospitals:
-                available_doctors = df[
-                    (df['医院名称'] == hospital) & 
-                    (~df['医生名称'].isin(doctor_visited))
-                ]
-                hospital_doctor_count[hospital] = len(available_doctors)
+            with PROFILER.phase('医院排序'):
+                # 贪心策略：优先选择医生较多的医院，减少医院数量
+                hospital_doctor_count = {}
+                for hospital in daily_hospitals:
+                    available_doctors = df[
+                        (df['医院名称'] == hospital) & 
+                        (~df['医生名称'].isin(doctor_visited))
+                    ]
+                    hospital_doctor_count[hospital] = len(available_doctors)
             
-            # 按医生数量排序医院
-            sorted_hospitals = sorted(hospital_doctor_count.items(), 
-                                    key=lambda x: x[1], reverse=True)
+                # 按医生数量排序医院（前瞻选院保持选出的顺序：小医院先排）
+                if lookahead:
+                    sorted_hospitals = [(hospital, hospital_doctor_count[hospital]) for hospital in daily_hospitals]
+                else:
+                    sorted_hospitals = sorted(hospital_doctor_count.items(), 
+                                            key=lambda x: x[1], reverse=True)
             
-            visits_today = []
+            visitor_start = len(store)  # 该拜访人今天的拜访从这一行开始
             hospital_visits_today = defaultdict(int)
             
             for hospital, available_count in sorted_hospitals:
-                if len(visits_today) >= daily_visits or total_visits >= target_visits:
+                if (len(store) - visitor_start) >= daily_visits or total_visits >= target_visits:
                     break
                     
                 if available_count == 0:
                     continue
                     
-                # 获取该医院未拜访的医生
-                available_doctors = df[
-                    (df['医院名称'] == hospital) & 
-                    (~df['医生名称'].isin(doctor_visited))
-                ]
+                with PROFILER.phase('医生筛选'):
+                    # 获取该医院未拜访的医生
+                    available_doctors = df[
+                        (df['医院名称'] == hospital) & 
+                        (~df['医生名称'].isin(doctor_visited))
+                    ]
                 
                 if len(available_doctors) == 0:
                     continue
                 
-                # 动态调整最少拜访限制：后期清理剩余医生时放宽限制
-                remaining_total_doctors = len(df[~df['医生名称'].isin(doctor_visited)])
-                total_remaining_visits = target_visits - total_visits
+                with PROFILER.phase('剩余统计'):
+                    # 动态调整最少拜访限制：后期清理剩余医生时放宽限制
+                    remaining_total_doctors = len(df[~df['医生名称'].isin(doctor_visited)])
+                    total_remaining_visits = target_visits - total_visits
                 
                 # 如果剩余医生较少或接近目标完成，放宽最少拜访限制
                 if remaining_total_doctors <= 50 or total_remaining_visits <= 100:
@@ -409,7 +606,7 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                     min_visits_per_hospital = 3  # 正常情况下最少3条
                 
                 max_visits_this_hospital = min(
-                    daily_visits - len(visits_today),
+                    daily_visits - (len(store) - visitor_start),
                     len(available_doctors),
                     target_visits - total_visits
                 )
@@ -417,21 +614,22 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                 if max_visits_this_hospital < min_visits_per_hospital:
                     continue
                     
-                dept_groups = available_doctors.groupby('科室')
-                obgyn_departments = ['妇科', '产科', '妇产科', '中医妇产科']
-                non_obgyn_groups = []
-                obgyn_groups = []
-                for dept, dept_doctors in dept_groups:
-                    if dept in obgyn_departments:
-                        obgyn_groups.append((dept, dept_doctors))
-                    else:
-                        non_obgyn_groups.append((dept, dept_doctors))
-                groups_non = non_obgyn_groups[:]
-                groups_ob = obgyn_groups[:]
+                with PROFILER.phase('科室分组'):
+                    dept_groups = available_doctors.groupby('科室')
+                    non_obgyn_groups = []
+                    obgyn_groups = []
+                    for dept, dept_doctors in dept_groups:
+                        if is_obgyn(dept):
+                            obgyn_groups.append((dept, dept_doctors))
+                        else:
+                            non_obgyn_groups.append((dept, dept_doctors))
+                    groups_non = non_obgyn_groups[:]
+                    groups_ob = obgyn_groups[:]
+                hospital_start = len(store)
                 hospital_visits = 0
                 while (
                     hospital_visits < max_visits_this_hospital and
-                    len(visits_today) < daily_visits and
+                    (len(store) - visitor_start) < daily_visits and
                     total_visits < target_visits and
                     (len(groups_non) > 0 or len(groups_ob) > 0)
                 ):
@@ -470,47 +668,37 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                         remaining_dept_visits,
                         len(dept_doctors),
                         max_visits_this_hospital - hospital_visits,
-                        daily_visits - len(visits_today)
+                        daily_visits - (len(store) - visitor_start)
                     )
-                    existing_doctors_in_dept = daily_hospital_dept_doctors[day_str][f"{hospital}_{dept}"]
-                    selected_doctors = []
-                    available_doctors_list = list(dept_doctors.iterrows())
-                    random.shuffle(available_doctors_list)
-                    for _, doctor_row in available_doctors_list:
-                        if len(selected_doctors) >= dept_visits:
-                            break
-                        current_dept_doctors = existing_doctors_in_dept + [d['医生名称'] for d in selected_doctors]
-                        if not check_same_surname(doctor_row['医生名称'], current_dept_doctors):
-                            selected_doctors.append(doctor_row)
+                    with PROFILER.phase('姓氏检查'):
+                        dept_surnames = set(daily_hospital_dept_surnames[day_str][f"{hospital}_{dept}"])
+                        selected_doctors = []
+                        available_doctors_list = list(dept_doctors.iterrows())
+                        random.shuffle(available_doctors_list)
+                        for _, doctor_row in available_doctors_list:
+                            if len(selected_doctors) >= dept_visits:
+                                break
+                            if not check_same_surname(doctor_row['医生名称'], dept_surnames):
+                                selected_doctors.append(doctor_row)
+                                dept_surnames.add(get_surname(doctor_row['医生名称']))
                     if len(selected_doctors) == 0:
                         chosen_list.pop(0)
                         continue
-                    batch_obg = len(selected_doctors) if dept in obgyn_departments else 0
-                    current_batch_visits = []
+                    batch_obg = len(selected_doctors) if is_obgyn(dept) else 0
+                    batch_start = len(store)
                     for doctor_row in selected_doctors:
-                        if len(visits_today) >= daily_visits or total_visits >= target_visits or hospital_visits >= max_visits_this_hospital:
+                        if (len(store) - visitor_start) >= daily_visits or total_visits >= target_visits or hospital_visits >= max_visits_this_hospital:
                             break
-                        hospital_addr = df_addr[df_addr['医院名称'] == doctor_row['医院名称']]
-                        address = hospital_addr['地址'].iloc[0] if len(hospital_addr) > 0 else '地址未找到'
-                        visit = {
-                            '日期': day_str,
-                            '医院名称': doctor_row['医院名称'],
-                            '拜访人': visitor,
-                            '科室': doctor_row['科室'],
-                            '医生名称': doctor_row['医生名称'],
-                            '地址': address
-                        }
-                        visits_today.append(visit)
-                        current_batch_visits.append(visit)
+                        store.append(day_str, visitor, doctor_row['医院名称'], doctor_row['科室'], doctor_row['医生名称'])
                         doctor_visited.add(doctor_row['医生名称'])
                         daily_hospital_dept_count[day_str][f"{hospital}_{dept}"] += 1
-                        daily_hospital_dept_doctors[day_str][f"{hospital}_{dept}"].append(doctor_row['医生名称'])
+                        daily_hospital_dept_surnames[day_str][f"{hospital}_{dept}"].add(get_surname(doctor_row['医生名称']))
                         hospital_visits += 1
                         total_visits += 1
                         visitor_visit_count[visitor] += 1
                     obgyn_visit_count += batch_obg
-                    last_batch_visits = current_batch_visits
-                    last_batch_meta = {'day_str': day_str, 'visitor': visitor, 'hospital': hospital, 'dept': dept}
+                    last_batch_meta = {'day_str': day_str, 'visitor': visitor, 'hospital': hospital, 'dept': dept,
+                                       'rows': (batch_start, len(store)), 'visitor_start': visitor_start}
                     first_batch_done = True
                     ratio = (obgyn_visit_count / total_visits) if total_visits > 0 else 0
                     prioritize_obgyn_next_batch = True if ratio < 0.2 else False
@@ -519,62 +707,73 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                 
                 # 后置验证：检查该医院今天实际安排的条数是否>=3
                 if hospital_visits > 0 and hospital_visits < 3:
-                    # 回滚：移除该医院今天的所有安排
-                    visits_to_remove = [v for v in visits_today if v['医院名称'] == hospital]
-                    for v in visits_to_remove:
-                        visits_today.remove(v)
-                        doctor_visited.discard(v['医生名称'])
-                        total_visits -= 1
-                        visitor_visit_count[visitor] -= 1
-                        dept_key = f"{hospital}_{v['科室']}"
-                        daily_hospital_dept_count[day_str][dept_key] -= 1
-                        if v['医生名称'] in daily_hospital_dept_doctors[day_str][dept_key]:
-                            daily_hospital_dept_doctors[day_str][dept_key].remove(v['医生名称'])
-                        # 如果是妇产科，还需要减少妇产科计数
-                        if v['科室'] in ['妇科', '产科', '妇产科', '中医妇产科']:
-                            obgyn_visit_count -= 1
+                    # 回滚：移除该医院今天的所有安排（即 hospital_start 之后追加的各行）
+                    rollback_count += 1
+                    undo_visits(hospital_start, day_str, visitor)
                     hospital_visits = 0  # 重置该医院的拜访次数
                 
                 hospital_visits_today[hospital] = hospital_visits
             
             # 计算拜访时间
-            visits_today = calculate_visit_times(visits_today, visitor)
-            visit_plan.extend(visits_today)
+            with PROFILER.phase('时间安排'):
+                visits_today = calculate_visit_times(store.to_dicts(visitor_start), visitor, visit_travel)
+                store.set_times(visitor_start, visits_today)
+                # 时间截断的拜访和截断后不足3条的医院撤回，医生留给后面的日期
+                kept = drop_short_last_hospital(visits_today)
+                if len(kept) < len(visits_today):
+                    rollback_count += 1
+                undo_visits(visitor_start + len(kept), day_str, visitor)
+                visits_today = kept
             
             if visits_today:
-                hospitals_visited_today = list(set([visit['医院名称'] for visit in visits_today]))
-                for hospital in hospitals_visited_today:
-                    visitor_hospital_history[visitor].append({'date': day_str, 'hospital': hospital})
+                visitor_hospital_history[visitor].setdefault(day_str, set()).update(visit['医院名称'] for visit in visits_today)
+                travel_routes.append(hospital_route(visits_today))
             ratio_finalize = (obgyn_visit_count / total_visits) if total_visits > 0 else 0
             prioritize_obgyn_next_batch = True if ratio_finalize < 0.2 else False
+        
+        # 今天有新的批次时，之前暂存的一天不会再被改动，可以产出
+        if last_batch_meta and last_batch_meta['day_str'] == day_str:
+            if pending_day is not None and day_start > pending_day[1]:
+                yield pending_day[0], store.to_dicts(pending_day[1], day_start, addresses)
+            pending_day = (day_str, day_start)
+    
+    print(f"医院当天不足3条的回滚：{rollback_count} 次")
+    if lookahead:
+        print(f"前瞻选院：预判排不满3条而跳过 {lookahead_skips} 次（避免的回滚）")
+    if hospital_travel:
+        daily_travel, baseline_travel = summarize_daily_travel(travel_routes, travel)
+        if daily_travel is not None:
+            print(f"路程估算：平均每天 {daily_travel:.0f} 分钟，随机搭配医院时约 {baseline_travel:.0f} 分钟，"
+                  f"平均每天节省约 {baseline_travel - daily_travel:.0f} 分钟")
     
     final_ratio = (obgyn_visit_count / total_visits) if total_visits > 0 else 0
-    if final_ratio > 0.2 and last_batch_meta and last_batch_visits:
-        ob_depts = ['妇科', '产科', '妇产科', '中医妇产科']
-        if last_batch_meta['dept'] in ob_depts:
+    if final_ratio > 0.2 and last_batch_meta and last_batch_meta['rows'][1] > last_batch_meta['rows'][0]:
+        if is_obgyn(last_batch_meta['dept']):
             last_day = last_batch_meta['day_str']
             last_visitor = last_batch_meta['visitor']
             last_hospital = last_batch_meta['hospital']
-            # 修复：不能直接将包含字典的列表转换为集合，需要逐个比较
-            to_remove_set = set(v['医生名称'] for v in last_batch_visits)  # 使用医生名称作为唯一标识
-            visit_plan = [v for v in visit_plan if v['医生名称'] not in to_remove_set]
-            used_doctors = set([v['医生名称'] for v in visit_plan])
+            # 最后一批拜访是存储末尾的若干行（之后没有再追加），截断即撤回；
+            # 若已被时间截断或整体回滚，截断到批次起始行不会多删
+            batch_start, batch_stop = last_batch_meta['rows']
+            visitor_start = last_batch_meta['visitor_start']
+            store.truncate(batch_start)
+            doctor_labels = store.labels('doctor')
+            used_doctors = {doctor_labels[code] for code in np.unique(store.column('doctor')).tolist()}
             current_dept_counts = defaultdict(int)
-            for v in visit_plan:
-                if v['日期'] == last_day and v['拜访人'] == last_visitor:
-                    key = f"{v['医院名称']}_{v['科室']}"
-                    current_dept_counts[key] += 1
-            needed = len(last_batch_visits)
-            new_batch = []
+            for row in range(visitor_start, len(store)):
+                key = f"{store.label('hospital', row)}_{store.label('dept', row)}"
+                current_dept_counts[key] += 1
+            needed = batch_stop - batch_start
             candidate_hospitals = hospital_assignment[last_visitor]
+            non_obgyn_mask = ~df['科室'].map(is_obgyn).astype(bool)
             hosp_counts = {}
             for h in candidate_hospitals:
-                avail = df[(df['医院名称'] == h) & (~df['医生名称'].isin(used_doctors)) & (~df['科室'].isin(ob_depts))]
+                avail = df[(df['医院名称'] == h) & (~df['医生名称'].isin(used_doctors)) & non_obgyn_mask]
                 hosp_counts[h] = len(avail)
             for hospital, _ in sorted(hosp_counts.items(), key=lambda x: x[1], reverse=True):
                 if needed <= 0:
                     break
-                avail = df[(df['医院名称'] == hospital) & (~df['医生名称'].isin(used_doctors)) & (~df['科室'].isin(ob_depts))]
+                avail = df[(df['医院名称'] == hospital) & (~df['医生名称'].isin(used_doctors)) & non_obgyn_mask]
                 if len(avail) == 0:
                     continue
                 for dept, dept_doctors in avail.groupby('科室'):
@@ -587,36 +786,264 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                         continue
                     remaining = max_dept_visits - cur
                     cap = min(remaining, len(dept_doctors), needed)
-                    exist_names = [v['医生名称'] for v in visit_plan if v['日期'] == last_day and v['拜访人'] == last_visitor and v['医院名称'] == hospital and v['科室'] == dept]
+                    exist_surnames = {get_surname(store.label('doctor', r)) for r in range(visitor_start, len(store))
+                                      if store.label('hospital', r) == hospital and store.label('dept', r) == dept}
                     selected = []
                     rows = list(dept_doctors.iterrows())
                     random.shuffle(rows)
                     for _, row in rows:
                         if len(selected) >= cap:
                             break
-                        check_list = exist_names + [d['医生名称'] for d in selected]
-                        if not check_same_surname(row['医生名称'], check_list):
+                        if not check_same_surname(row['医生名称'], exist_surnames):
                             selected.append(row)
+                            exist_surnames.add(get_surname(row['医生名称']))
                     for row in selected:
                         if needed <= 0:
                             break
-                        hospital_addr = df_addr[df_addr['医院名称'] == row['医院名称']]
-                        address = hospital_addr['地址'].iloc[0] if len(hospital_addr) > 0 else '地址未找到'
-                        nv = {
-                            '日期': last_day,
-                            '医院名称': row['医院名称'],
-                            '拜访人': last_visitor,
-                            '科室': row['科室'],
-                            '医生名称': row['医生名称'],
-                            '地址': address
-                        }
-                        new_batch.append(nv)
+                        store.append(last_day, last_visitor, row['医院名称'], row['科室'], row['医生名称'])
                         used_doctors.add(row['医生名称'])
                         current_dept_counts[f"{hospital}_{dept}"] += 1
                         needed -= 1
-            visit_plan.extend(new_batch)
-            day_visits = [v for v in visit_plan if v['日期'] == last_day and v['拜访人'] == last_visitor]
-            day_visits = calculate_visit_times(day_visits, last_visitor)
+            # 重新计算该拜访人当天的时间，超过最晚开始时间的拜访不再保留
+            visits_today = drop_short_last_hospital(calculate_visit_times(store.to_dicts(visitor_start), last_visitor, visit_travel))
+            store.set_times(visitor_start, visits_today)
+            store.truncate(visitor_start + len(visits_today))
+    if pending_day is not None and len(store) > pending_day[1]:
+        yield pending_day[0], store.to_dicts(pending_day[1], addresses=addresses)
+
+def _solve_visitor_counts(hospitals, dept_doctors, working_days, visitor_target, daily_visits_range, time_limit,
+                          hospital_travel=None):
+    """求解一位拜访人整月每天每家医院的拜访条数（妇产科、其他科室分别计数）
+    
+    hospital_travel: 函数 (医院A, 医院B) -> 路程分钟数或None，用于估算两家医院搭配时的路程；未提供时按 HOP_MINUTES
+    返回: ({日序号: [(医院, 是否妇产科, 条数)]}, 求解信息)，未得到可行解时返回 (None, 求解信息)
+    """
+    # 变量：x[日, 医院, 是否妇产科] 拜访条数，y[日, 医院] 当天是否拜访该医院，t[日] 当天跨医院路程分钟数
+    # 每天条数上限为该类科室每天上限（4-6条且不超过不同姓氏数）之和，整月不超过该类医生数
+    class_caps = {}
+    class_doctors = {}
+    for hospital in hospitals:
+        for dept, doctors in dept_doctors.get(hospital, {}).items():
+            key = (hospital, is_obgyn(dept))
+            class_caps[key] = class_caps.get(key, 0) + min(6, len(set(surname for _, surname in doctors)))
+            class_doctors[key] = class_doctors.get(key, 0) + len(doctors)
+    if not class_caps:
+        return {}, '没有可拜访的医生'
+    daily_caps = [random.randint(*daily_visits_range) for _ in working_days]
+    x_keys = [(d, hospital, obgyn) for (hospital, obgyn) in class_caps for d in range(len(working_days))]
+    x_caps = [min(class_caps[(hospital, obgyn)], daily_caps[d]) for d, hospital, obgyn in x_keys]
+    y_keys = [(d, hospital) for hospital in hospitals for d in range(len(working_days))]
+    y_index = {key: len(x_keys) + i for i, key in enumerate(y_keys)}
+    t_offset = len(x_keys) + len(y_keys)
+    n_vars = t_offset + len(working_days)
+    # 两家医院之间的路程：没有路程数据的按 HOP_MINUTES；各对医院路程相同时只需一个约束
+    hops = {}
+    for i, a in enumerate(hospitals):
+        for b in hospitals[i + 1:]:
+            minutes = hospital_travel(a, b) if hospital_travel is not None else None
+            hops[(a, b)] = HOP_MINUTES if minutes is None else minutes
+    min_hop = min(hops.values(), default=0)
+    
+    rows, cols, vals, lower, upper = [], [], [], [], []
+    def add_constraint(terms, lb, ub):
+        row = len(lower)
+        for col, val in terms:
+            rows.append(row)
+            cols.append(col)
+            vals.append(val)
+        lower.append(lb)
+        upper.append(ub)
+    
+    day_x = defaultdict(list)  # 日 -> x 变量
+    hospital_x = defaultdict(list)  # (日, 医院) -> x 变量
+    class_x = defaultdict(list)  # (医院, 是否妇产科) -> x 变量
+    obgyn_terms = []
+    for i, (d, hospital, obgyn) in enumerate(x_keys):
+        day_x[d].append(i)
+        hospital_x[(d, hospital)].append(i)
+        class_x[(hospital, obgyn)].append(i)
+        # 有拜访才能安排：x <= cap * y
+        add_constraint([(i, 1), (y_index[(d, hospital)], -x_caps[i])], -np.inf, 0)
+        # 妇产科占比：0.8 * 妇产科条数 - 0.2 * 其他条数 <= 0
+        obgyn_terms.append((i, 0.8 if obgyn else -0.2))
+    add_constraint(obgyn_terms, -np.inf, 0)
+    add_constraint([(i, 1) for i in range(len(x_keys))], 0, visitor_target)
+    for key, indices in class_x.items():
+        add_constraint([(i, 1) for i in indices], 0, class_doctors[key])
+    for (d, hospital), indices in hospital_x.items():
+        # 当天拜访该医院时至少3条，最多不超过当天上限（收紧线性松弛，加快求解）
+        y = y_index[(d, hospital)]
+        add_constraint([(i, 1) for i in indices] + [(y, -3)], 0, np.inf)
+        add_constraint([(i, 1) for i in indices] + [(y, -daily_caps[d])], -np.inf, 0)
+    for d in range(len(working_days)):
+        y_terms = [(y_index[(d, hospital)], 1) for hospital in hospitals]
+        add_constraint([(i, 1) for i in day_x[d]], 0, daily_caps[d])
+        add_constraint(y_terms, 0, 2)
+        # 时间估算：平均每条拜访 AVG_VISIT_MINUTES 分钟，加上当天两家医院之间的路程
+        t = t_offset + d
+        add_constraint([(i, AVG_VISIT_MINUTES) for i in day_x[d]] + [(t, 1)], -np.inf, WORKDAY_MINUTES)
+        # 路程下界：同一天拜访两家医院时 t >= 这两家医院的路程（每天最多2家医院，y 之和减1即是否跨医院）
+        add_constraint([(t, 1)] + [(y, -min_hop) for y, _ in y_terms], -min_hop, np.inf)
+        for (a, b), minutes in hops.items():
+            if minutes > min_hop:
+                add_constraint([(t, 1), (y_index[(d, a)], -minutes), (y_index[(d, b)], -minutes)], -minutes, np.inf)
+        # 不连续3天（日历上的连续日期）拜访同一医院
+        if d + 2 < len(working_days) and (working_days[d + 2] - working_days[d]).days == 2:
+            for hospital in hospitals:
+                add_constraint([(y_index[(d + offset, hospital)], 1) for offset in range(3)], 0, 2)
+    
+    # 目标：拜访条数最多，其次医院数最少（减少跨医院）
+    objective = np.concatenate([-np.ones(len(x_keys)), np.full(len(y_keys), 0.01), np.zeros(len(working_days))])
+    result = milp(objective,
+                  constraints=LinearConstraint(sparse.csr_matrix((vals, (rows, cols)), shape=(len(lower), n_vars)), lower, upper),
+                  integrality=np.concatenate([np.ones(t_offset), np.zeros(len(working_days))]),
+                  bounds=Bounds(np.zeros(n_vars), np.concatenate([x_caps, np.ones(len(y_keys)),
+                                                                  np.full(len(working_days), np.inf)])),
+                  options={'time_limit': time_limit, 'mip_rel_gap': SOLVER_GAP, 'disp': False})
+    if result.x is None:
+        return None, result.message
+    
+    day_plan = defaultdict(list)
+    for (d, hospital, obgyn), count in zip(x_keys, np.round(result.x[:len(x_keys)]).astype(int)):
+        if count > 0:
+            day_plan[d].append((hospital, obgyn, count))
+    return day_plan, f"{n_vars}个变量，{len(lower)}个约束，{result.message}"
+
+def _pick_class_doctors(hospital_depts, obgyn, count, doctor_visited):
+    """从医院的妇产科或其他科室中挑选 count 位当天拜访的医生，返回 [(科室, 医生名称)]
+    
+    科室按剩余医生数从多到少依次选满，每个科室每天不超过4-6条（条数不够时放宽到6条），同科室不同姓；
+    选满一个科室再换下一个，使当天涉及的科室尽量少（每换一次科室多5-10分钟间隔，条数多的日子容易超过17:05）；
+    同一科室内优先选剩余人数多的姓氏，给后面的日期留下更多不同姓氏
+    """
+    candidates = []
+    for dept, doctors in hospital_depts.items():
+        if is_obgyn(dept) != obgyn:
+            continue
+        by_surname = defaultdict(list)
+        for name, surname in doctors:
+            if name not in doctor_visited:
+                by_surname[surname].append(name)
+        if not by_surname:
+            continue
+        # 每个姓氏随机取一位，姓氏按剩余人数从多到少排列（人数相同时随机）
+        surnames = sorted(by_surname, key=lambda surname: (-len(by_surname[surname]), random.random()))
+        names = [random.choice(by_surname[surname]) for surname in surnames[:6]]
+        remaining = sum(len(surname_names) for surname_names in by_surname.values())
+        candidates.append((remaining, dept, names, random.randint(4, 6)))
+    
+    candidates.sort(key=lambda item: item[0], reverse=True)
+    taken = [0] * len(candidates)
+    for relaxed in (False, True):
+        for index, (_, dept, names, max_dept_visits) in enumerate(candidates):
+            limit = len(names) if relaxed else min(len(names), max_dept_visits)
+            extra = min(limit - taken[index], count - sum(taken))
+            if extra > 0:
+                taken[index] += extra
+    selected = []
+    for (_, dept, names, _), n in zip(candidates, taken):
+        selected.extend((dept, name) for name in names[:n])
+    return selected
+
+def solver_visit_planning(df, df_addr, working_days, visitors, target_visits, daily_visits_range, time_limit=None):
+    """使用整数规划制定拜访计划（需要 scipy，求解失败时退回贪心算法）
+    
+    以每天每家医院的拜访条数（妇产科、其他科室分别计数）为变量一次求解整月安排，目标为拜访条数最多，约束与贪心算法一致：
+    - 每家医院分配给一个拜访人（与贪心算法相同的分配结果），因此每位拜访人单独求解
+    - 每人每天最多2家医院、拜访条数不超过当天随机上限，并按平均拜访和路程时间估算不超过17:05
+    - 医院当天有拜访时至少3条；妇产科、其他科室每天的条数不超过各科室上限（每科室最多6条且不超过不同姓氏数）之和
+    - 不连续3天（日历上的连续日期）拜访同一家医院
+    - 每位拜访人的妇产科占比不超过20%（总占比因此也不超过20%）
+    求解后逐天把条数分配到科室、挑选具体医生并计算时间，时间截断后不足3条的医院整体撤回，医生留给后面的日期
+    """
+    time_limit = SOLVER_TIME_LIMIT if time_limit is None else time_limit
+    if not SCIPY_AVAILABLE:
+        print("未安装 scipy，使用贪心算法")
+        return greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, daily_visits_range)
+    
+    with PROFILER.phase('医院分配'):
+        hospital_coords = geocode_hospitals(df_addr) if ASSIGNMENT_MODE == 'geo' else {}
+        hospital_assignment = assign_hospitals_to_visitors(df['医院名称'].unique(), visitors, df, hospital_coords)
+        _, visit_travel = load_travel(df_addr, hospital_coords)
+    # 模型中的路程与 calculate_visit_times 一致：有计算拜访时间用的矩阵时按矩阵，没有时按45-60分钟
+    hospital_travel = visit_travel.minutes if visit_travel is not None and len(visit_travel) else None
+    visitor_targets = balance_daily_visits(df, visitors, target_visits)
+    
+    # 医生池：同名医生只保留一位（与贪心算法按姓名记录已拜访医生一致）
+    pool = df.drop_duplicates('医生名称').copy()
+    pool['姓氏'] = pool['医生名称'].map(get_surname)
+    dept_doctors = defaultdict(dict)  # 医院 -> 科室 -> [(医生名称, 姓氏)]
+    for (hospital, dept), doctors in pool.groupby(['医院名称', '科室']):
+        dept_doctors[hospital][dept] = list(zip(doctors['医生名称'], doctors['姓氏']))
+    
+    day_plan = defaultdict(list)  # 日序号 -> [(医院, 是否妇产科, 条数)]
+    with PROFILER.phase('模型求解'):
+        for visitor in visitors:
+            visitor_plan, message = _solve_visitor_counts(
+                hospital_assignment[visitor], dept_doctors, working_days, visitor_targets[visitor],
+                daily_visits_range, time_limit / len(visitors), hospital_travel)
+            if visitor_plan is None:
+                print(f"{visitor} 整数规划未得到可行解（{message}），使用贪心算法")
+                return greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, daily_visits_range)
+            print(f"{visitor} 整数规划：{message}")
+            for d, items in visitor_plan.items():
+                day_plan[d].extend(items)
+    
+    addresses = dict(zip(df_addr['医院名称'], df_addr['地址'])) if len(df_addr) else {}
+    hospital_visitor = {hospital: visitor for visitor in visitors for hospital in hospital_assignment[visitor]}
+    visit_plan = []
+    doctor_visited = set()
+    for d, day in enumerate(working_days):
+        day_str = day.strftime('%Y-%m-%d')
+        visitor_visits = defaultdict(list)
+        for hospital, obgyn, count in sorted(day_plan.get(d, []), key=lambda item: (item[0], item[1])):
+            with PROFILER.phase('姓氏检查'):
+                selected = _pick_class_doctors(dept_doctors[hospital], obgyn, count, doctor_visited)
+            for dept, doctor_name in selected:
+                visitor_visits[hospital_visitor[hospital]].append({
+                    '日期': day_str,
+                    '医院名称': hospital,
+                    '拜访人': hospital_visitor[hospital],
+                    '科室': dept,
+                    '医生名称': doctor_name,
+                    '地址': addresses.get(hospital, '地址未找到'),
+                })
+        for visitor, visits_today in visitor_visits.items():
+            # 同医院同科室连续拜访（减少科室间隔）；条数少的医院排在前面，时间截断只截掉最后几条
+            hospital_sizes = defaultdict(int)
+            for visit in visits_today:
+                hospital_sizes[visit['医院名称']] += 1
+            visits_today.sort(key=lambda visit: (hospital_sizes[visit['医院名称']], visit['医院名称'], visit['科室']))
+            with PROFILER.phase('时间安排'):
+                visits_today = calculate_visit_times(visits_today, visitor, visit_travel)
+            # 时间截断后不足3条的医院整体撤回
+            hospital_counts = defaultdict(int)
+            for visit in visits_today:
+                hospital_counts[visit['医院名称']] += 1
+            visits_today = [visit for visit in visits_today if hospital_counts[visit['医院名称']] >= 3]
+            doctor_visited.update(visit['医生名称'] for visit in visits_today)
+            visit_plan.extend(visits_today)
+
+    # 撤回和截断的多为其他科室时，妇产科占比可能略超20%：从最后的日期开始撤掉妇产科拜访（医院当天至少保留3条）
+    obgyn_count = sum(1 for visit in visit_plan if is_obgyn(visit['科室']))
+    hospital_day_counts = defaultdict(int)
+    for visit in visit_plan:
+        hospital_day_counts[(visit['日期'], visit['医院名称'])] += 1
+    removed = set()
+    for index in range(len(visit_plan) - 1, -1, -1):
+        if obgyn_count <= 0.2 * (len(visit_plan) - len(removed)):
+            break
+        visit = visit_plan[index]
+        key = (visit['日期'], visit['医院名称'])
+        if is_obgyn(visit['科室']) and hospital_day_counts[key] > 3:
+            removed.add(index)
+            hospital_day_counts[key] -= 1
+            obgyn_count -= 1
+    if removed:
+        visit_plan = [visit for index, visit in enumerate(visit_plan) if index not in removed]
+        print(f"妇产科占比超过20%，撤回 {len(removed)} 条妇产科拜访")
+
+    print(f"整数规划安排拜访 {len(visit_plan)} 条（目标 {min(target_visits, len(df))} 条）")
     return visit_plan
 
 def save_to_excel(visit_plan, output_file, visitor_names):
@@ -665,7 +1092,28 @@ def print_calendar_info(working_days):
         weekday_name = ['周一', '周二', '周三', '周四', '周五', '周六', '周日'][day.weekday()]
         print(f"  {day.strftime('%Y-%m-%d')} ({weekday_name})")
 
-def main(visitor_config, daily_visits_range, excel_file, output_file, start_date, end_date, target_visits=400, target_hospitals=None, target_cities=None):
+def main(visitor_config, daily_visits_range, excel_file, output_file, start_date, end_date, target_visits=400, target_hospitals=None, target_cities=None,
+         profile=False, profile_json=None, cprofile_file=None, planning_mode='greedy'):
+    """
+    planning_mode: 'greedy' 贪心算法逐天安排；'solver' 整数规划整月求解（见 solver_visit_planning）
+    profile: 打印分阶段耗时表（Excel读取、医院分配、每日选院、医院排序、医生筛选、科室分组、姓氏检查、时间安排、导出等）
+    profile_json: 分阶段耗时追加写入的JSON文件（每次运行一行，便于跟踪趋势）
+    cprofile_file: 同时用 cProfile 记录函数级数据并保存到该文件
+    """
+    if profile or profile_json or cprofile_file:
+        PROFILER.enable(cprofile=bool(cprofile_file))
+    try:
+        _run(visitor_config, daily_visits_range, excel_file, output_file, start_date, end_date, target_visits, target_hospitals, target_cities, planning_mode)
+    finally:
+        if PROFILER.enabled:
+            PROFILER.disable()
+            PROFILER.report()
+            if profile_json:
+                PROFILER.save_json(profile_json, excel_file=excel_file, target_visits=target_visits)
+            if cprofile_file:
+                PROFILER.dump_cprofile(cprofile_file)
+
+def _run(visitor_config, daily_visits_range, excel_file, output_file, start_date, end_date, target_visits, target_hospitals, target_cities, planning_mode):
     # 验证配置
     if isinstance(visitor_config, str):
         # 单个拜访人模式
@@ -686,7 +1134,8 @@ def main(visitor_config, daily_visits_range, excel_file, output_file, start_date
     
     # 读取数据
     print("\n正在读取Excel文件...")
-    df, df_addr = read_excel_data(excel_file)
+    with PROFILER.phase('Excel读取'):
+        df, df_addr = read_excel_data(excel_file)
     if df is None or df_addr is None:
         return
     
@@ -717,12 +1166,16 @@ def main(visitor_config, daily_visits_range, excel_file, output_file, start_date
     print_calendar_info(working_days)
     
     # 生成拜访计划
-    print("\n正在生成拜访计划...")
-    visit_plan = greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, daily_visits_range)
+    print(f"\n正在生成拜访计划（{'整数规划' if planning_mode == 'solver' else '贪心算法'}）...")
+    if planning_mode == 'solver':
+        visit_plan = solver_visit_planning(df, df_addr, working_days, visitors, target_visits, daily_visits_range)
+    else:
+        visit_plan = greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, daily_visits_range)
     
     # 保存结果
     print("\n正在保存结果...")
-    df_result = save_to_excel(visit_plan, output_file, visitors)
+    with PROFILER.phase('导出'):
+        df_result = save_to_excel(visit_plan, output_file, visitors)
     
     # 打印统计信息
     print("\n=== 拜访计划统计 ===")
@@ -760,6 +1213,27 @@ VISITOR_CONFIG = [ '何勇','张丹凤','胡乐凤','蔡林川']
 # 目标拜访总数
 TARGET_VISITS = 20000
 
+# 规划方式：'greedy' 贪心算法逐天安排；'solver' 整数规划整月求解（需要 scipy，失败时退回贪心算法）
+# 'solver' 主要保证妇产科占比和每院每天不少于3条不违规；拜访条数受每天随机条数上限约束，与贪心算法相近
+# （planner_benchmark 实测 seed 42/1/2：城市规模 1497/1516/1544 条，贪心 1510/1493/1499 条；耗时1.4-3.9秒，贪心1.4-1.9秒）
+PLANNING_MODE = 'greedy'
+SOLVER_TIME_LIMIT = 60  # 整数规划求解时间限制（秒）
+SOLVER_GAP = 0.01  # 与最优解的相对差距小于该值即停止求解
+
+# 贪心算法的每日选院方式：'lookahead' 按日历前瞻，提前搭配小医院（见 select_daily_hospitals_lookahead）；
+# 'most_remaining' 每天选剩余医生最多的医院
+HOSPITAL_SELECTION = 'lookahead'
+LOOKAHEAD_BUFFER_DAYS = 3  # 剩余工作日比待排小医院数多出不到该天数时，每天搭配一家小医院
+
+# 医院分配方式：'balanced' 按医生总量均衡分配；'geo' 按地理位置分片区分配，每天搭配路程近的医院并报告节省的路程
+# （坐标取 '医院地址' 标签页的 '经纬度' 列，没有时按地址用百度地理编码查询一次并缓存，见 hospital_geo.py）
+ASSIGNMENT_MODE = 'balanced'
+
+# 跨医院路程：True 按医院间路程时间矩阵计算拜访时间并搭配路程近的医院，没有路程数据的医院之间仍按45-60分钟；
+# 矩阵文件存在且包含全部医院时直接读取（可手工修改），否则由医院坐标按距离估算后保存到该文件（见 hospital_geo.py）
+USE_TRAVEL_MATRIX = True
+TRAVEL_MATRIX_FILE = '/Users/a000/Documents/济生/医院拜访25/医院路程矩阵.csv'
+
 # 文件路径配置
 EXCEL_FILE = '/Users/a000/Documents/济生/医院拜访25/贵州省医院医生信息_20251207.xlsx'  # 输入Excel文件路径
 OUTPUT_FILE = '/Users/a000/Documents/济生/医院拜访25/2512/贵州医生拜访2512-贵阳/贵州医生拜访2512-贵阳7.xlsx'  # 输出Excel文件路径
@@ -789,4 +1263,14 @@ TARGET_CITIES = '贵阳'  # 设置为None表示使用所有城市
 
 # ==================== 程序入口 ====================
 if __name__ == "__main__":
-    main(VISITOR_CONFIG, DAILY_VISITS_RANGE, EXCEL_FILE, OUTPUT_FILE, START_DATE, END_DATE, TARGET_VISITS, TARGET_HOSPITALS, TARGET_CITIES)
+    # 可选参数：--profile 打印分阶段耗时；--profile-json 文件 追加写入JSON；--cprofile 文件 保存 cProfile 数据
+    parser = argparse.ArgumentParser(description='医院拜访安排（妇产科动态优先）')
+    parser.add_argument('--profile', action='store_true', help='打印分阶段耗时表')
+    parser.add_argument('--profile-json', help='分阶段耗时追加写入的JSON文件')
+    parser.add_argument('--cprofile', help='cProfile 数据保存路径')
+    parser.add_argument('--mode', choices=['greedy', 'solver'], default=PLANNING_MODE, help='规划方式')
+    parser.add_argument('--assignment', choices=['balanced', 'geo'], default=ASSIGNMENT_MODE, help='医院分配方式')
+    args = parser.parse_args()
+    ASSIGNMENT_MODE = args.assignment
+    main(VISITOR_CONFIG, DAILY_VISITS_RANGE, EXCEL_FILE, OUTPUT_FILE, START_DATE, END_DATE, TARGET_VISITS, TARGET_HOSPITALS, TARGET_CITIES,
+         profile=args.profile, profile_json=args.profile_json, cprofile_file=args.cprofile, planning_mode=args.mode)
@@ -8,6 +8,8 @@ import random
 from collections import defaultdict
 import openpyxl
 from openpyxl import Workbook
+
+from department_categories import PRIORITY_CATEGORIES, department_category, is_obgyn
 import os
 import json
 
@@ -253,56 +255,30 @@ def calculate_visit_times(visits_today, visitor):
     
     return visits_today
 
-def check_same_surname(doctor_name, existing_doctors):
-    """检查医生姓氏是否与已安排的医生相同"""
-    if not existing_doctors:
-        return False
-    
-    # 处理医生姓名中的空格
-    clean_name = doctor_name.strip() if doctor_name else ''
-    doctor_surname = clean_name[0] if clean_name else ''
-    
-    for existing_doctor in existing_doctors:
-        clean_existing = existing_doctor.strip() if existing_doctor else ''
-        existing_surname = clean_existing[0] if clean_existing else ''
-        if doctor_surname == existing_surname and doctor_surname != '':
-            return True
-    
-    return False
+def get_surname(doctor_name):
+    """医生姓氏（去掉空格后的第一个字，没有姓名时为空字符串）"""
+    clean_name = doctor_name.strip() if isinstance(doctor_name, str) else ''
+    return clean_name[0] if clean_name else ''
+
+def check_same_surname(doctor_name, existing_surnames):
+    """检查医生姓氏是否与已安排的医生相同（existing_surnames 为已安排医生的姓氏集合）"""
+    surname = get_surname(doctor_name)
+    return surname != '' and surname in existing_surnames
 
 def check_consecutive_hospital_visits(visitor_hospital_history, hospital, current_date_str):
     """检查拜访者是否在连续2天拜访同一家医院后，第三天又安排同一家医院
     
+    visitor_hospital_history: 日期字符串 -> 当天拜访的医院集合
     注意：这里的"连续"是指日历上的连续日期，不考虑节假日
     """
-    if len(visitor_hospital_history) < 2:
-        return False  # 历史记录不足2天，无法形成连续2天后的第三天
-    
-    # 将当前日期字符串转换为日期对象
-    current_date = datetime.strptime(current_date_str, '%Y-%m-%d').date()
-    
     # 计算前两天的日期（日历上的连续日期，不考虑节假日）
-    prev_day_1 = current_date - timedelta(days=1)  # 前一天
-    prev_day_2 = current_date - timedelta(days=2)  # 前两天
-    
-    # 收集每一天拜访的所有医院（处理一天拜访多家医院的情况）
-    prev_day_1_hospitals = set()
-    prev_day_2_hospitals = set()
-    
-    for record in visitor_hospital_history:
-        record_date = datetime.strptime(record['date'], '%Y-%m-%d').date()
-        if record_date == prev_day_1:
-            prev_day_1_hospitals.add(record['hospital'])
-        elif record_date == prev_day_2:
-            prev_day_2_hospitals.add(record['hospital'])
+    current_date = datetime.strptime(current_date_str, '%Y-%m-%d').date()
+    prev_day_1 = (current_date - timedelta(days=1)).strftime('%Y-%m-%d')  # 前一天
+    prev_day_2 = (current_date - timedelta(days=2)).strftime('%Y-%m-%d')  # 前两天
     
     # 如果前两天都拜访了同一家医院，并且当前要安排的也是这家医院，则返回True（不允许）
-    # 检查两个集合的交集
-    common_hospitals = prev_day_1_hospitals & prev_day_2_hospitals
-    if common_hospitals and hospital in common_hospitals:
-        return True
-    
-    return False
+    return (hospital in visitor_hospital_history.get(prev_day_1, ()) and
+            hospital in visitor_hospital_history.get(prev_day_2, ()))
 
 def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, daily_visits_range):
     """使用贪心算法制定拜访计划"""
@@ -318,9 +294,9 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
     visit_plan = []
     doctor_visited = set()  # 记录已拜访的医生
     daily_hospital_dept_count = defaultdict(lambda: defaultdict(int))  # 每天每家医院每个科室的拜访次数
-    daily_hospital_dept_doctors = defaultdict(lambda: defaultdict(list))  # 每天每家医院每个科室已安排的医生姓名
+    daily_hospital_dept_surnames = defaultdict(lambda: defaultdict(set))  # 每天每家医院每个科室已安排医生的姓氏
     visitor_visit_count = {visitor: 0 for visitor in visitors}  # 记录每个拜访人的拜访次数
-    visitor_hospital_history = {visitor: [] for visitor in visitors}  # 记录每个拜访者的医院拜访历史
+    visitor_hospital_history = {visitor: {} for visitor in visitors}  # 记录每个拜访者的医院拜访历史：日期 -> 当天拜访的医院集合
     
     total_visits = 0
     
@@ -332,7 +308,7 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
             
         day_str = day.strftime('%Y-%m-%d')
         daily_hospital_dept_count[day_str] = defaultdict(int)
-        daily_hospital_dept_doctors[day_str] = defaultdict(list)
+        daily_hospital_dept_surnames[day_str] = defaultdict(set)
         
         for visitor in visitors:
             # 检查该拜访人是否已达到目标拜访量
@@ -417,21 +393,15 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                 # 按科室分组
                 dept_groups = available_doctors.groupby('科室')
                 
-                # 定义妇产科相关科室列表（最低优先级）
-                obgyn_departments = ['妇科', '产科', '妇产科', '中医妇产科']
-                
-                # 定义优先科室关键词列表（最高优先级）
-                priority_dept_keywords = ['呼吸', '肺', '泌尿', '儿科', '肾', '中医', '全科','老年','儿内','小儿普胸泌外科','男科']
-                
-                # 重新排序科室：优先安排包含关键词的科室，妇产科放最后
+                # 重新排序科室：优先安排优先类别的科室，妇产科放最后（类别见 department_categories）
                 priority_groups = []
                 normal_groups = []
                 obgyn_groups = []
                 
                 for dept, dept_doctors in dept_groups:
-                    if dept in obgyn_departments:
+                    if is_obgyn(dept):
                         obgyn_groups.append((dept, dept_doctors))
-                    elif any(keyword in dept for keyword in priority_dept_keywords):
+                    elif department_category(dept) in PRIORITY_CATEGORIES:
                         priority_groups.append((dept, dept_doctors))
                     else:
                         normal_groups.append((dept, dept_doctors))
@@ -459,7 +429,7 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                     )
                     
                     # 逐个选择医生，确保不重复姓氏
-                    existing_doctors_in_dept = daily_hospital_dept_doctors[day_str][f"{hospital}_{dept}"]
+                    dept_surnames = set(daily_hospital_dept_surnames[day_str][f"{hospital}_{dept}"])
                     selected_doctors = []
                     available_doctors_list = list(dept_doctors.iterrows())
                     random.shuffle(available_doctors_list)  # 随机打乱顺序
@@ -469,9 +439,9 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                             break
                             
                         # 检查与已选择的医生和当天已安排的医生是否有相同姓氏
-                        current_dept_doctors = existing_doctors_in_dept + [d['医生名称'] for d in selected_doctors]
-                        if not check_same_surname(doctor_row['医生名称'], current_dept_doctors):
+                        if not check_same_surname(doctor_row['医生名称'], dept_surnames):
                             selected_doctors.append(doctor_row)
+                            dept_surnames.add(get_surname(doctor_row['医生名称']))
                     
                     if len(selected_doctors) == 0:
                         continue
@@ -496,7 +466,7 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                         visits_today.append(visit)
                         doctor_visited.add(doctor_row['医生名称'])
                         daily_hospital_dept_count[day_str][f"{hospital}_{dept}"] += 1
-                        daily_hospital_dept_doctors[day_str][f"{hospital}_{dept}"].append(doctor_row['医生名称'])
+                        daily_hospital_dept_surnames[day_str][f"{hospital}_{dept}"].add(get_surname(doctor_row['医生名称']))
                         hospital_visits += 1
                         total_visits += 1
                         visitor_visit_count[visitor] += 1
@@ -512,8 +482,7 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
                         visitor_visit_count[visitor] -= 1
                         dept_key = f"{hospital}_{v['科室']}"
                         daily_hospital_dept_count[day_str][dept_key] -= 1
-                        if v['医生名称'] in daily_hospital_dept_doctors[day_str][dept_key]:
-                            daily_hospital_dept_doctors[day_str][dept_key].remove(v['医生名称'])
+                        daily_hospital_dept_surnames[day_str][dept_key].discard(get_surname(v['医生名称']))
                     hospital_visits = 0  # 重置该医院的拜访次数
                 
                 hospital_visits_today[hospital] = hospital_visits
@@ -524,14 +493,7 @@ def greedy_visit_planning(df, df_addr, working_days, visitors, target_visits, da
             
             # 更新拜访者的医院历史记录
             if visits_today:
-                # 获取当天拜访的医院列表（去重）
-                hospitals_visited_today = list(set([visit['医院名称'] for visit in visits_today]))
-                # 为每个拜访的医院添加记录
-                for hospital in hospitals_visited_today:
-                    visitor_hospital_history[visitor].append({
-                        'date': day_str,
-                        'hospital': hospital
-                    })
+                visitor_hospital_history[visitor].setdefault(day_str, set()).update(visit['医院名称'] for visit in visits_today)
     
     return visit_plan
 
@@ -695,25 +657,25 @@ EXCEL_FILE = '/Users/a000/Documents/济生/医院拜访25/贵州省医院医生
 output_file = '/Users/a000/Documents/济生/医院拜访25/2512/贵州医生拜访2512-贵阳/贵州医生拜访2512-贵阳21-31 3.xlsx'
 OUTPUT_FILE = output_file
 
-# 将路径写入配置文件，供后续同一批次脚本读取
-
+# 将路径写入配置文件，供后续同一批次脚本读取（运行脚本时写入，见程序入口）
+def write_batch_config(output_file):
+    """将配置文件同时放到脚本所在目录和输出文件同目录下"""
+    # 1. 首先获取脚本所在目录
+    script_dir = os.path.dirname(os.path.abspath(__file__))
 
-# 将配置文件同时放到脚本所在目录和输出文件同目录下
-# 1. 首先获取脚本所在目录
-script_dir = os.path.dirname(os.path.abspath(__file__))
+    # 2. 获取输出文件所在目录
+    output_dir = os.path.dirname(output_file)
 
-# 2. 获取输出文件所在目录
-output_dir = os.path.dirname(output_file)
+    # 3. 脚本所在目录
+    script_config_path = os.path.join(script_dir, 'baifang_config.json')
+    with open(script_config_path, 'w', encoding='utf-8') as f:
+        json.dump({'output_file': output_file}, f, ensure_ascii=False, indent=2)
 
-# 3. 脚本所在目录
-script_config_path = os.path.join(script_dir, 'baifang_config.json')
-with open(script_config_path, 'w', encoding='utf-8') as f:
-    json.dump({'output_file': output_file}, f, ensure_ascii=False, indent=2)
+    # 4. 输出文件同目录
+    output_config_path = os.path.join(output_dir, 'baifang_config.json')
+    with open(output_config_path, 'w', encoding='utf-8') as f:
+        json.dump({'output_file': output_file}, f, ensure_ascii=False, indent=2)
 
-# 4. 输出文件同目录
-output_config_path = os.path.join(output_dir, 'baifang_config.json')
-with open(output_config_path, 'w', encoding='utf-8') as f:
-    json.dump({'output_file': output_file}, f, ensure_ascii=False, indent=2)
 # 拜访日期范围配置（具体日期）
 START_DATE = datetime(2025, 12, 21)  # 开始日期：年-月-日
 END_DATE = datetime(2025, 12, 31)   # 结束日期：年-月-日
@@ -761,4 +723,5 @@ TARGET_CITIES = '贵阳'  # 设置为None表示使用所有城市
 
 # ==================== 程序入口 ====================
 if __name__ == "__main__":
+    write_batch_config(OUTPUT_FILE)
     main(VISITOR_CONFIG, DAILY_VISITS_RANGE, EXCEL_FILE, OUTPUT_FILE, START_DATE, END_DATE, TARGET_VISITS, TARGET_HOSPITALS, TARGET_CITIES)
\ No newline at end of file
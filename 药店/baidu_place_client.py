@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+百度地图地点检索（Place API）共享客户端
+功能：
+1. 连接池复用的 requests.Session
+2. 令牌桶限速（全局QPS），多线程并发查询多个区域/坐标
+3. 磁盘持久化的API调用配额账本：按AK按天记录调用次数，多个脚本共享当天总数；
+   每个脚本另有本次运行的调用预算，任一达到上限后干净地停止
+4. 可选的磁盘响应缓存（SQLite），相同查询不再重复调用API
+5. 可选的翻页日志（JSONL，只追加），中断后重新运行从上次停止的页继续
+6. base_url 可配置，便于对接本地模拟服务器测试
+
+使用示例：
+    client = BaiduPlaceClient(AK)
+    for region, (pois, complete) in client.map_concurrent(
+            lambda r: client.fetch_all_pages(query="药店", region=r), regions):
+        ...
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# fcntl 可选：没有时（Windows）账本只在进程内加锁，多个脚本同时运行可能少计
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# ===================== 配置项 =====================
+PLACE_SEARCH_URL = "https://api.map.baidu.com/place/v2/search"
+# 配额账本文件（所有脚本共用同一份，按AK、按天分别计数）
+QUOTA_LEDGER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baidu_api_quota.json")
+MAX_API_CALLS = 30000  # 默认每次运行最大API调用次数
+DAILY_API_CALLS = 30000  # 每个AK每天最大API调用次数（所有脚本合计，按百度控制台中该AK的日配额修改）
+LEDGER_KEEP_DAYS = 30  # 账本保留最近多少天的记录
+REQUESTS_PER_SECOND = 2.0  # 全局请求速率（次/秒）
+MAX_WORKERS = 4  # 最大并发数
+PAGE_SIZE = 20  # 每页返回的POI数量，最大为20条
+REQUEST_TIMEOUT = 10
+# =================================================
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceeded(Exception):
+    """API调用次数已达到配额上限"""
+
+
+class QuotaLedger:
+    """
+    API调用次数账本，线程安全，多个进程共享（有 fcntl 时用文件锁）
+    - 本次运行的调用次数 count 不超过 max_calls（各脚本自己的预算，每次运行从0开始）
+    - 该AK当天所有脚本的调用总数 daily_count 不超过 daily_limit（记录在磁盘账本中，按天重新计数）
+    文件格式: {"<ak>": {"YYYY-MM-DD": {"count": 当天已调用次数, "updated": "最后更新时间"}}}
+    """
+
+    def __init__(self, ak, max_calls=MAX_API_CALLS, path=QUOTA_LEDGER_PATH, daily_limit=DAILY_API_CALLS):
+        self.ak = ak
+        self.max_calls = max_calls
+        self.daily_limit = daily_limit
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        with self._locked():
+            self.daily_count = self._days(self._load()).get(self._today(), {}).get("count", 0)
+
+    @staticmethod
+    def _today():
+        return time.strftime("%Y-%m-%d")
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """进程内线程锁 + 跨进程文件锁，保证读取、加一、写回之间不被其他脚本插入"""
+        with self._lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            with open(f"{self.path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"读取配额账本失败 {self.path}: {e}")
+            return {}
+
+    def _days(self, ledger):
+        """该AK按天的记录；旧格式（不分天的累计次数）视为没有记录"""
+        days = ledger.get(self.ak, {})
+        return {} if "count" in days else days
+
+    def _save(self, ledger):
+        # 写临时文件再替换，避免中断时损坏账本
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(ledger, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def remaining(self):
+        remaining = max(self.max_calls - self.count, 0)
+        if self.daily_limit is not None:
+            remaining = min(remaining, max(self.daily_limit - self.daily_count, 0))
+        return remaining
+
+    @property
+    def exhausted(self):
+        return self.remaining == 0
+
+    def reserve(self):
+        """预占一次调用额度并落盘（重新读取当天总数后加一），任一额度用尽时抛出 QuotaExceeded"""
+        with self._locked():
+            if self.count >= self.max_calls:
+                raise QuotaExceeded(f"已达到本次运行的API调用次数限制 ({self.max_calls} 次)")
+            ledger = self._load()
+            today = self._today()
+            days = self._days(ledger)
+            self.daily_count = days.get(today, {}).get("count", 0)
+            if self.daily_limit is not None and self.daily_count >= self.daily_limit:
+                raise QuotaExceeded(f"该AK今天的API调用次数已达上限 ({self.daily_limit} 次)")
+            self.daily_count += 1
+            days[today] = {"count": self.daily_count, "updated": time.strftime("%Y-%m-%d %H:%M:%S")}
+            ledger[self.ak] = {day: days[day] for day in sorted(days)[-LEDGER_KEEP_DAYS:]}
+            self._save(ledger)
+            self.count += 1
+            return self.count
+
+
+class TokenBucket:
+    """令牌桶限速器，线程安全"""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ResponseCache:
+    """
+    磁盘响应缓存（SQLite），线程安全
+    以查询参数字典为键，保存完整翻页后的POI列表
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, pois TEXT, created TEXT)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(params):
+        return json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+    def get(self, params):
+        """返回缓存的POI列表，未命中返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT pois FROM responses WHERE key = ?", (self.make_key(params),)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, params, pois):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, pois, created) VALUES (?, ?, ?)",
+                (self.make_key(params), json.dumps(pois, ensure_ascii=False), time.strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PageJournal:
+    """
+    只追加的翻页结果日志（JSONL），线程安全
+    每行记录一页结果，键为 (查询参数, 页码)；重新运行时已记录的页直接读取，不再调用API
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pages = {}  # 查询键 -> {页码: 记录}
+        torn = False  # 最后一行没有换行（上次写到一半中断）
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 上次中断时可能写了半行，忽略即可
+                        continue
+                    self._pages.setdefault(record["key"], {})[record["page_num"]] = record
+        self._file = open(path, "a", encoding="utf-8")
+        if torn:
+            # 先补上换行，新记录不会接在半行后面（否则下次读取时连同新记录一起被忽略）
+            self._file.write("\n")
+            self._file.flush()
+
+    def __len__(self):
+        return sum(len(pages) for pages in self._pages.values())
+
+    def get(self, params, page_num):
+        """返回已记录的页 {"total": .., "results": [..]}，未记录返回None"""
+        return self._pages.get(ResponseCache.make_key(params), {}).get(page_num)
+
+    def put(self, params, page_num, data):
+        record = {
+            "key": ResponseCache.make_key(params),
+            "page_num": page_num,
+            "total": data.get("total", 0),
+            "results": data.get("results", []),
+        }
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._pages.setdefault(record["key"], {})[page_num] = record
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class BaiduPlaceClient:
+    """百度地点检索客户端：连接池 + 令牌桶限速 + 共享配额账本 + 有界并发"""
+
+    def __init__(self, ak, ledger=None, rate=REQUESTS_PER_SECOND, max_workers=MAX_WORKERS,
+                 base_url=PLACE_SEARCH_URL, timeout=REQUEST_TIMEOUT, cache=None, journal=None):
+        self.ak = ak
+        self.ledger = ledger if ledger is not None else QuotaLedger(ak)
+        self.cache = cache
+        self.journal = journal
+        self.bucket = TokenBucket(rate)
+        self.max_workers = max_workers
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def search(self, **params):
+        """
+        发起一次地点检索请求
+        返回: API返回的JSON字典；配额用尽时抛出 QuotaExceeded，网络异常时抛出 requests 异常
+        """
+        self.ledger.reserve()
+        self.bucket.acquire()
+        query = {"scope": 2, "output": "json", "ak": self.ak, "page_size": PAGE_SIZE}
+        query.update(params)
+        response = self.session.get(self.base_url, params=query, timeout=self.timeout)
+        logger.info(f"API调用 {self.ledger.count}: {response.url}")
+        return response.json()
+
+    def fetch_all_pages(self, **params):
+        """
+        按 total 翻页获取全部结果（配置了缓存时优先读取缓存，完整获取的结果写入缓存）
+        返回: (pois列表, 是否完整获取)；配额用尽、API报错或网络异常时返回已获取的部分
+        """
+        if self.cache is not None:
+            cached = self.cache.get(params)
+            if cached is not None:
+                return cached, True
+        pois, complete = self._fetch_all_pages(**params)
+        if complete and self.cache is not None:
+            self.cache.set(params, pois)
+        return pois, complete
+
+    def _fetch_all_pages(self, **params):
+        pois = []
+        page_num = 0
+        while True:
+            data = self.journal.get(params, page_num) if self.journal is not None else None
+            if data is not None:
+                data = {"status": 0, "total": data["total"], "results": data["results"]}
+            else:
+                try:
+                    data = self.search(page_num=page_num, **params)
+                except QuotaExceeded as e:
+                    logger.warning(str(e))
+                    return pois, False
+                except requests.exceptions.RequestException as e:
+                    logger.error(f"网络请求异常，参数: {params}, 错误: {e}")
+                    return pois, False
+
+                if data.get("status") != 0:
+                    logger.error(f"请求失败，参数: {params}, 错误: {data.get('message', '未知错误')}")
+                    return pois, False
+                if self.journal is not None:
+                    self.journal.put(params, page_num, data)
+
+            results = data.get("results", [])
+            if not results:
+                return pois, True
+            pois.extend(results)
+
+            total = data.get("total", 0)
+            logger.info(f"参数 {params}: 已获取 {len(pois)}/{total} 条数据, API调用次数: {self.ledger.count}")
+            if len(pois) >= total:
+                return pois, True
+            page_num += 1
+
+    def map_concurrent(self, func, items):
+        """
+        以有界并发对 items 逐个执行 func，按输入顺序产出 (item, 结果)
+        配额用尽后不再提交新任务，已提交的任务完成后结束
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            items = iter(items)
+            finished = False
+            while True:
+                # 保持最多 2 倍并发数的任务在队列中
+                while not finished and len(pending) < self.max_workers * 2 and not self.ledger.exhausted:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        finished = True
+                        break
+                    pending.append((item, executor.submit(func, item)))
+                if not pending:
+                    return
+                item, future = pending.popleft()
+                yield item, future.result()
+
+
+def parse_poi(poi):
+    """提取POI的常用字段，返回字典（坐标格式为 "纬度,经度"）"""
+    location = poi.get("location", {})
+    detail_info = poi.get("detail_info", {})
+    navi_location = detail_info.get("navi_location", {})
+    lat2 = navi_location.get("lat", "")
+    lng2 = navi_location.get("lng", "")
+    return {
+        "uid": poi.get("uid", ""),
+        "street_id": poi.get("street_id", ""),
+        "名称": poi.get("name", ""),
+        "城市": poi.get("city", ""),
+        "区域": poi.get("area", ""),
+        "地址": poi.get("address", ""),
+        "经纬度": f"{location.get('lat', '')},{location.get('lng', '')}",
+        "导航经纬度": f"{lat2},{lng2}" if lat2 and lng2 else "",
+        "营业时间": detail_info.get("shop_hours", ""),
+        "图片数": detail_info.get("image_num", ""),
+        "详情链接": detail_info.get("detail_url", ""),
+    }
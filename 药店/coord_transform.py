@@ -1,7 +1,8 @@
-# 百度坐标系(BD-09)转WGS84坐标系
+# 百度坐标系(BD-09)与WGS84坐标系互转
 # 参考：https://github.com/wandergis/coordTransform_py
 
 import math
+import numpy as np
 import pandas as pd
 
 # 配置部分
@@ -15,6 +16,7 @@ x_PI = 3.14159265358979324 * 3000.0 / 180.0
 PI = 3.1415926535897932384626
 a = 6378245.0
 ee = 0.00669342162296594323
+EARTH_RADIUS_M = 6371008.8  # 地球平均半径（米）
 
 
 def bd09_to_wgs84(bd_lon, bd_lat):
@@ -56,6 +58,37 @@ def gcj02_to_wgs84(gcj_lat, gcj_lon):
     return wgs_lat, wgs_lon
 
 
+def wgs84_to_bd09(wgs_lon, wgs_lat):
+    """WGS84坐标系转百度坐标系(BD-09)"""
+    gcj_lat, gcj_lon = wgs84_to_gcj02(wgs_lat, wgs_lon)
+    bd_lat, bd_lon = gcj02_to_bd09(gcj_lat, gcj_lon)
+    return bd_lon, bd_lat
+
+
+def wgs84_to_gcj02(wgs_lat, wgs_lon):
+    """WGS84坐标系转火星坐标系(GCJ-02)"""
+    if out_of_china(wgs_lat, wgs_lon):
+        return wgs_lat, wgs_lon
+    dlat = _transformlat(wgs_lon - 105.0, wgs_lat - 35.0)
+    dlng = _transformlng(wgs_lon - 105.0, wgs_lat - 35.0)
+    radlat = wgs_lat / 180.0 * PI
+    magic = math.sin(radlat)
+    magic = 1 - ee * magic * magic
+    sqrtmagic = math.sqrt(magic)
+    dlat = (dlat * 180.0) / ((a * (1 - ee)) / (magic * sqrtmagic) * PI)
+    dlng = (dlng * 180.0) / (a / sqrtmagic * math.cos(radlat) * PI)
+    return wgs_lat + dlat, wgs_lon + dlng
+
+
+def gcj02_to_bd09(gcj_lat, gcj_lon):
+    """火星坐标系(GCJ-02)转百度坐标系(BD-09)"""
+    z = math.sqrt(gcj_lon * gcj_lon + gcj_lat * gcj_lat) + 0.00002 * math.sin(gcj_lat * x_PI)
+    theta = math.atan2(gcj_lat, gcj_lon) + 0.000003 * math.cos(gcj_lon * x_PI)
+    bd_lon = z * math.cos(theta) + 0.0065
+    bd_lat = z * math.sin(theta) + 0.006
+    return bd_lat, bd_lon
+
+
 def _transformlat(lng, lat):
     ret = -100.0 + 2.0 * lng + 3.0 * lat + 0.2 * lat * lat + 0.1 * lng * lat + 0.2 * math.sqrt(math.fabs(lng))
     ret += (20.0 * math.sin(6.0 * lng * PI) + 20.0 * math.sin(2.0 * lng * PI)) * 2.0 / 3.0
@@ -77,6 +110,136 @@ def out_of_china(lat, lng):
     return not (73.66 < lng < 135.05 and 3.86 < lat < 53.55)
 
 
+# ==================== 向量化版本（整列转换） ====================
+# 与上面的标量函数公式完全一致，参数为 numpy 数组（或可转为数组的序列），
+# 一次性处理整列坐标，结果与标量版本误差在 1e-9 以内。
+
+def bd09_to_wgs84_np(bd_lon, bd_lat):
+    """百度坐标系(BD-09)转WGS84坐标系（向量化）"""
+    gcj_lat, gcj_lon = bd09_to_gcj02_np(bd_lon, bd_lat)
+    wgs_lat, wgs_lon = gcj02_to_wgs84_np(gcj_lat, gcj_lon)
+    return wgs_lon, wgs_lat
+
+
+def bd09_to_gcj02_np(bd_lon, bd_lat):
+    """百度坐标系(BD-09)转火星坐标系(GCJ-02)（向量化）"""
+    x = np.asarray(bd_lon, dtype=np.float64) - 0.0065
+    y = np.asarray(bd_lat, dtype=np.float64) - 0.006
+    z = np.sqrt(x * x + y * y) - 0.00002 * np.sin(y * x_PI)
+    theta = np.arctan2(y, x) - 0.000003 * np.cos(x * x_PI)
+    gcj_lon = z * np.cos(theta)
+    gcj_lat = z * np.sin(theta)
+    return gcj_lat, gcj_lon
+
+
+def gcj02_to_wgs84_np(gcj_lat, gcj_lon):
+    """火星坐标系(GCJ-02)转WGS84坐标系（向量化），境外坐标原样返回"""
+    gcj_lat = np.asarray(gcj_lat, dtype=np.float64)
+    gcj_lon = np.asarray(gcj_lon, dtype=np.float64)
+    dlat = _transformlat_np(gcj_lon - 105.0, gcj_lat - 35.0)
+    dlng = _transformlng_np(gcj_lon - 105.0, gcj_lat - 35.0)
+    radlat = gcj_lat / 180.0 * PI
+    magic = np.sin(radlat)
+    magic = 1 - ee * magic * magic
+    sqrtmagic = np.sqrt(magic)
+    dlat = (dlat * 180.0) / ((a * (1 - ee)) / (magic * sqrtmagic) * PI)
+    dlng = (dlng * 180.0) / (a / sqrtmagic * np.cos(radlat) * PI)
+    mglat = gcj_lat + dlat
+    mglng = gcj_lon + dlng
+    outside = out_of_china_np(gcj_lat, gcj_lon)
+    wgs_lat = np.where(outside, gcj_lat, gcj_lat * 2 - mglat)
+    wgs_lon = np.where(outside, gcj_lon, gcj_lon * 2 - mglng)
+    return wgs_lat, wgs_lon
+
+
+def _transformlat_np(lng, lat):
+    ret = -100.0 + 2.0 * lng + 3.0 * lat + 0.2 * lat * lat + 0.1 * lng * lat + 0.2 * np.sqrt(np.abs(lng))
+    ret += (20.0 * np.sin(6.0 * lng * PI) + 20.0 * np.sin(2.0 * lng * PI)) * 2.0 / 3.0
+    ret += (20.0 * np.sin(lat * PI) + 40.0 * np.sin(lat / 3.0 * PI)) * 2.0 / 3.0
+    ret += (160.0 * np.sin(lat / 12.0 * PI) + 320 * np.sin(lat * PI / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def _transformlng_np(lng, lat):
+    ret = 300.0 + lng + 2.0 * lat + 0.1 * lng * lng + 0.1 * lng * lat + 0.1 * np.sqrt(np.abs(lng))
+    ret += (20.0 * np.sin(6.0 * lng * PI) + 20.0 * np.sin(2.0 * lng * PI)) * 2.0 / 3.0
+    ret += (20.0 * np.sin(lng * PI) + 40.0 * np.sin(lng / 3.0 * PI)) * 2.0 / 3.0
+    ret += (150.0 * np.sin(lng / 12.0 * PI) + 300.0 * np.sin(lng / 30.0 * PI)) * 2.0 / 3.0
+    return ret
+
+
+def wgs84_to_bd09_np(wgs_lon, wgs_lat):
+    """WGS84坐标系转百度坐标系(BD-09)（向量化）"""
+    gcj_lat, gcj_lon = wgs84_to_gcj02_np(wgs_lat, wgs_lon)
+    bd_lat, bd_lon = gcj02_to_bd09_np(gcj_lat, gcj_lon)
+    return bd_lon, bd_lat
+
+
+def wgs84_to_gcj02_np(wgs_lat, wgs_lon):
+    """WGS84坐标系转火星坐标系(GCJ-02)（向量化），境外坐标原样返回"""
+    wgs_lat = np.asarray(wgs_lat, dtype=np.float64)
+    wgs_lon = np.asarray(wgs_lon, dtype=np.float64)
+    dlat = _transformlat_np(wgs_lon - 105.0, wgs_lat - 35.0)
+    dlng = _transformlng_np(wgs_lon - 105.0, wgs_lat - 35.0)
+    radlat = wgs_lat / 180.0 * PI
+    magic = np.sin(radlat)
+    magic = 1 - ee * magic * magic
+    sqrtmagic = np.sqrt(magic)
+    dlat = (dlat * 180.0) / ((a * (1 - ee)) / (magic * sqrtmagic) * PI)
+    dlng = (dlng * 180.0) / (a / sqrtmagic * np.cos(radlat) * PI)
+    outside = out_of_china_np(wgs_lat, wgs_lon)
+    gcj_lat = np.where(outside, wgs_lat, wgs_lat + dlat)
+    gcj_lon = np.where(outside, wgs_lon, wgs_lon + dlng)
+    return gcj_lat, gcj_lon
+
+
+def gcj02_to_bd09_np(gcj_lat, gcj_lon):
+    """火星坐标系(GCJ-02)转百度坐标系(BD-09)（向量化）"""
+    gcj_lat = np.asarray(gcj_lat, dtype=np.float64)
+    gcj_lon = np.asarray(gcj_lon, dtype=np.float64)
+    z = np.sqrt(gcj_lon * gcj_lon + gcj_lat * gcj_lat) + 0.00002 * np.sin(gcj_lat * x_PI)
+    theta = np.arctan2(gcj_lat, gcj_lon) + 0.000003 * np.cos(gcj_lon * x_PI)
+    bd_lon = z * np.cos(theta) + 0.0065
+    bd_lat = z * np.sin(theta) + 0.006
+    return bd_lat, bd_lon
+
+
+def out_of_china_np(lat, lng):
+    """判断坐标是否在中国境外（向量化），返回布尔数组"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    return ~((lng > 73.66) & (lng < 135.05) & (lat > 3.86) & (lat < 53.55))
+
+
+def haversine_m_np(lat1, lon1, lat2, lon2):
+    """两组坐标之间的球面距离（单位：米，向量化）"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def parse_coord_column(series):
+    """
+    解析"纬度,经度"格式的坐标列
+    返回: (lat数组, lon数组, 有效掩码)，无法解析的行为 NaN 且掩码为 False
+    """
+    if len(series) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty.copy(), np.zeros(0, dtype=bool)
+    parts = series.astype(str).str.strip().str.split(',', n=1, expand=True)
+    if parts.shape[1] < 2:
+        parts[1] = None
+    lat = pd.to_numeric(parts[0], errors='coerce').to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(parts[1], errors='coerce').to_numpy(dtype=np.float64)
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    return lat, lon, valid
+
+
+def format_coord_column(lat, lon, valid):
+    """将坐标数组格式化为"纬度,经度"字符串列表，无效行为空字符串"""
+    return [f"{la:.8f},{lo:.8f}" if ok else '' for la, lo, ok in zip(lat, lon, valid)]
+
+
 def main():
     # 读取Excel文件
     df = pd.read_excel(EXCEL_FILE_PATH, sheet_name=SHEET_NAME)
@@ -89,28 +252,14 @@ def main():
     
     # 处理经纬度转换
     print(f"\n开始转换经纬度...")
-    wgs84_coords = []
-    
-    for idx, row in df.iterrows():
-        try:
-            # 获取百度坐标
-            bd_coord = str(row[INPUT_COLUMN]).strip()
-            if bd_coord and bd_coord != 'nan':
-                # 分割经纬度
-                lat_str, lon_str = bd_coord.split(',')
-                bd_lat = float(lat_str)
-                bd_lon = float(lon_str)
-                
-                # 转换为WGS84
-                wgs_lon, wgs_lat = bd09_to_wgs84(bd_lon, bd_lat)
-                # 格式化为字符串
-                wgs_coord = f"{wgs_lat:.8f},{wgs_lon:.8f}"
-                wgs84_coords.append(wgs_coord)
-            else:
-                wgs84_coords.append('')
-        except Exception as e:
-            print(f"第{idx+1}行转换失败: {e}")
-            wgs84_coords.append('')
+    bd_lat, bd_lon, valid = parse_coord_column(df[INPUT_COLUMN])
+    invalid_rows = np.flatnonzero(~valid & df[INPUT_COLUMN].notna().to_numpy())
+    for idx in invalid_rows:
+        print(f"第{idx+1}行转换失败: 无法解析坐标 {df[INPUT_COLUMN].iloc[idx]!r}")
+
+    # 整列一次性转换为WGS84
+    wgs_lon, wgs_lat = bd09_to_wgs84_np(bd_lon, bd_lat)
+    wgs84_coords = format_coord_column(wgs_lat, wgs_lon, valid)
     
     # 将转换结果写入输出列
     df[OUTPUT_COLUMN] = wgs84_coords
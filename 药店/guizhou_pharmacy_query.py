@@ -1,24 +1,29 @@
-import requests
 import xlrd
 import openpyxl
-import time
-import json
 import logging
 import os
 from datetime import datetime
 
+from baidu_place_client import BaiduPlaceClient, PageJournal, QuotaLedger, parse_poi
+
 # ===================== 配置项 =====================
 # 设置百度地图API密钥
 AK = "9quP8V19nrZZdtTPu3Dgc66kvPSnV0rf"
 # 设置检索关键字
 QUERY = "药店"
-# 设置每页返回的POI数量，最大为20条
-PAGE_SIZE = 20
 
-# API调用计数器和限制
-API_COUNT = 15021  # 当前已使用的API次数（可配置）
-MAX_API_CALLS = 30000  # 最大API调用次数限制（可配置）
-REQUEST_DELAY = 0.5  # 每两次API请求之间的延迟时间（秒），可配置
+# API调用限制：本次运行的预算；该AK当天所有脚本的合计由共享配额账本 baidu_api_quota.json 按天记录并限制
+MAX_API_CALLS = 30000  # 本次运行最大API调用次数（可配置）
+REQUESTS_PER_SECOND = 2.0  # 全局请求速率（次/秒），可配置
+MAX_WORKERS = 4  # 同时查询的区县数量
+
+# 结果上限与自适应拆分：单个查询最多只能翻页取到 API_RESULT_CAP 条结果，
+# 达到上限的区县按矩形范围四分递归查询，直到每块都低于上限，再按uid合并
+API_RESULT_CAP = 150
+MAX_SPLIT_DEPTH = 6  # 最大四分层数
+SPLIT_MARGIN_DEG = 0.05  # 由已取得结果推算区县范围时向外扩展的度数
+MAX_EXPAND_ROUNDS = 10  # 推算的范围边框中仍有本区县结果时继续向外扩展，最多扩展的次数
+REGION_BOUNDS = {}  # 可手动指定区县范围，如 {"遵义市红花岗区": (27.45, 106.70, 27.80, 107.10)}（南,西,北,东）
 
 # 区划表配置
 DIVISION_FILE_PATH = '/Users/a000/Documents/济生/药店拜访25/福建/福建省市区划.xls'
@@ -45,6 +50,9 @@ OUTPUT_FILE_PATH = os.path.join(OUTPUT_DIR, OUTPUT_FILE_NAME)
 # 日志配置
 LOG_FILE_NAME = f"{output_prefix}药店查询日志_{DATE_SUFFIX}.log"
 LOG_FILE_PATH = os.path.join(OUTPUT_DIR, LOG_FILE_NAME)
+
+# 翻页记录（JSONL，只追加），中断后重新运行会从上次停止的页继续；要重新查询请删除该文件
+JOURNAL_FILE_PATH = os.path.join(OUTPUT_DIR, f"{output_prefix}药店查询记录.jsonl")
 # =================================================
 
 
@@ -54,95 +62,134 @@ logging.basicConfig(filename=LOG_FILE_PATH, level=logging.INFO,
                    encoding='utf-8')
 
 
-# 构建请求URL的函数
-def build_url(page_num, region):
-    return f"https://api.map.baidu.com/place/v2/search?query={QUERY}&region={region}&scope=2&output=json&ak={AK}&page_size={PAGE_SIZE}&page_num={page_num}"
+def split_bounds(bounds):
+    """将矩形范围 (南, 西, 北, 东) 四等分"""
+    south, west, north, east = bounds
+    mid_lat = (south + north) / 2
+    mid_lng = (west + east) / 2
+    return [
+        (south, west, mid_lat, mid_lng),
+        (south, mid_lng, mid_lat, east),
+        (mid_lat, west, north, mid_lng),
+        (mid_lat, mid_lng, north, east),
+    ]
 
-# 获取单个区县的药店数据并保存到Excel文件的函数
-def get_region_pharmacy_data_and_save(api_count, region, sheet, workbook):
-    page_num = 0
-    all_pois_count = 0  # 用于累计所有页获取到的pois数量
-    region_pois_count = 0  # 当前区县获取到的药店数量
 
-    print(f"正在查询 {region} 的药店数据...")
-    logging.info(f"开始查询区域: {region}")
+def expand_bounds(bounds, margin):
+    """矩形范围 (南, 西, 北, 东) 四边各向外扩展 margin 度"""
+    south, west, north, east = bounds
+    return (south - margin, west - margin, north + margin, east + margin)
 
-    while True:
-        # 检查API调用次数限制
-        if api_count >= MAX_API_CALLS:
-            print(f"已达到API调用次数限制 ({MAX_API_CALLS} 次)，停止查询")
-            logging.warning(f"已达到API调用次数限制 ({MAX_API_CALLS} 次)，停止查询")
-            return api_count, region_pois_count, True  # 返回True表示达到限制
-
-        url = build_url(page_num, region)
-        try:
-            response = requests.get(url, timeout=10)
-            api_count += 1
-            logging.info(f"API调用 {api_count}: {url}")
-            
-            data = response.json()
-            if data["status"] != 0:
-                print(f"请求失败，错误信息：{data.get('message', '未知错误')}")
-                logging.error(f"请求失败，区域: {region}, 错误: {data.get('message', '未知错误')}")
+
+def border_strips(inner, outer):
+    """outer 去掉 inner 后剩下的四条边框（南、北两条横跨整个宽度，西、东两条夹在中间）"""
+    south, west, north, east = inner
+    outer_south, outer_west, outer_north, outer_east = outer
+    return [
+        (outer_south, outer_west, south, outer_east),
+        (north, outer_west, outer_north, outer_east),
+        (south, outer_west, north, west),
+        (south, east, north, outer_east),
+    ]
+
+
+def estimate_region_bounds(region, pois):
+    """由已取得POI的坐标范围向外扩展 SPLIT_MARGIN_DEG 推算区县范围（只是估算，见 get_region_pharmacy_data）"""
+    lats = [poi["location"]["lat"] for poi in pois if poi.get("location")]
+    lngs = [poi["location"]["lng"] for poi in pois if poi.get("location")]
+    return (min(lats) - SPLIT_MARGIN_DEG, min(lngs) - SPLIT_MARGIN_DEG,
+            max(lats) + SPLIT_MARGIN_DEG, max(lngs) + SPLIT_MARGIN_DEG)
+
+
+def fetch_bounds_adaptive(client, region, bounds, depth, stats):
+    """
+    矩形范围查询，结果达到上限时四分递归
+    返回: (pois列表, 是否完整获取)
+    """
+    south, west, north, east = bounds
+    pois, complete = client.fetch_all_pages(query=QUERY, bounds=f"{south:.6f},{west:.6f},{north:.6f},{east:.6f}")
+    stats["tiles"] += 1
+    if not complete or len(pois) < API_RESULT_CAP:
+        return pois, complete
+    if depth >= MAX_SPLIT_DEPTH:
+        logging.warning(f"区域 {region} 范围 {bounds} 已达最大拆分层数，结果可能不完整")
+        return pois, complete
+
+    stats["splits"] += 1
+    merged = list(pois)
+    for sub_bounds in split_bounds(bounds):
+        sub_pois, sub_complete = fetch_bounds_adaptive(client, region, sub_bounds, depth + 1, stats)
+        merged.extend(sub_pois)
+        if not sub_complete:
+            return merged, False
+    return merged, True
+
+
+def merge_region_pois(region, pois):
+    """按uid合并，并剔除矩形范围查询带入的其他区县POI"""
+    merged = {}
+    for poi in pois:
+        area = poi.get("area", "")
+        if area and not region.endswith(area):
+            continue
+        merged.setdefault(poi.get("uid", ""), poi)
+    return list(merged.values())
+
+
+# 查询单个区县的全部药店数据（已记录在翻页记录中的页不再调用API）
+def get_region_pharmacy_data(client, region):
+    """
+    翻页查询区县内的药店，结果达到API上限时自动拆分为矩形范围查询
+    区县范围优先使用 REGION_BOUNDS；没有配置时由第一次查询（已被截断）的结果推算，
+    推算的范围可能漏掉边缘的药店，因此查询后再向外扩一圈查询边框，边框中仍有本区县的药店就继续扩展，
+    扩展 MAX_EXPAND_ROUNDS 次后边框仍有结果时视为未完整获取
+    返回: (pois列表, 是否完整获取, 拆分次数)
+    """
+    logging.info(f"开始查询区域: {region}")
+    pois, complete = client.fetch_all_pages(query=QUERY, region=region)
+    stats = {"tiles": 0, "splits": 0}
+    if complete and len(pois) >= API_RESULT_CAP and pois:
+        logging.info(f"区域 {region} 结果达到上限 {API_RESULT_CAP} 条，开始拆分查询")
+        estimated = region not in REGION_BOUNDS
+        bounds = estimate_region_bounds(region, pois) if estimated else REGION_BOUNDS[region]
+        tile_pois, complete = fetch_bounds_adaptive(client, region, bounds, 0, stats)
+        expand_rounds = 0
+        while estimated and complete:
+            if expand_rounds == MAX_EXPAND_ROUNDS:
+                logging.warning(f"区域 {region} 范围为估算，扩展 {MAX_EXPAND_ROUNDS} 次后边框仍有本区县结果，可能不完整")
+                complete = False
                 break
-                
-            pois = data.get("results", [])
-            if not pois:
+            outer = expand_bounds(bounds, SPLIT_MARGIN_DEG)
+            border_pois = []
+            for strip in border_strips(bounds, outer):
+                strip_pois, complete = fetch_bounds_adaptive(client, region, strip, 0, stats)
+                border_pois.extend(strip_pois)
+                if not complete:
+                    break
+            tile_pois.extend(border_pois)
+            bounds = outer
+            expand_rounds += 1
+            if not merge_region_pois(region, border_pois):
                 break
-                
-            for poi in pois:
-                uid = poi.get("uid", "")
-                street_id = poi.get("street_id", "")
-                name = poi.get("name", "")
-                city = poi.get("city", "")
-                area = poi.get("area", "")
-                address = poi.get("address", "")
-                location_data = poi.get("location", {})
-                lat = location_data.get("lat", "")
-                lng = location_data.get("lng", "")
-                detail_info = poi.get("detail_info", {})
-                detail_url = detail_info.get("detail_url", "")
-                shop_hours = detail_info.get("shop_hours", "")
-                image_num = detail_info.get("image_num", "")
-                navi_location = detail_info.get("navi_location", {})
-                lat2 = navi_location.get("lat", "")
-                lng2 = navi_location.get("lng", "")
-
-                # 将获取到的数据整理为元组形式，方便后续添加到Excel表格中
-                data_tuple = (region, uid, street_id, name, city, area, address, 
-                             f"{lat},{lng}", f"{lat2},{lng2}", shop_hours, image_num, detail_url)
-                sheet.append(data_tuple)
-                region_pois_count += 1
-
-            # 每处理完一页数据就保存一次文件
-            workbook.save(OUTPUT_FILE_PATH)
-
-            total = data.get("total", 0)
-            all_pois_count += len(pois)  # 累计当前页的pois数量
-            
-            print(f"  {region}: 已获取 {all_pois_count}/{total} 条数据 (API调用: {api_count})")
-            logging.info(f"区域 {region}: 已获取 {all_pois_count}/{total} 条数据, API调用次数: {api_count}")
-            
-            if all_pois_count >= total:
-                break
-                
-            page_num += 1
-            time.sleep(REQUEST_DELAY)  # 适当延迟，避免请求过快
-            
-        except requests.exceptions.RequestException as e:
-            print(f"网络请求异常: {e}")
-            logging.error(f"网络请求异常，区域: {region}, 错误: {e}")
-            break
-        except Exception as e:
-            print(f"处理数据时发生异常: {e}")
-            logging.error(f"处理数据异常，区域: {region}, 错误: {e}")
-            import traceback
-            traceback.print_exc()
-            break
-
-    print(f"  {region} 查询完成，共获取 {region_pois_count} 条药店数据")
-    logging.info(f"区域 {region} 查询完成，共获取 {region_pois_count} 条药店数据")
-    return api_count, region_pois_count, False  # 返回False表示未达到限制
+        if expand_rounds:
+            logging.info(f"区域 {region} 范围为估算，向外扩展 {expand_rounds} 次，最终范围 {bounds}")
+        pois = merge_region_pois(region, pois + tile_pois)
+        logging.info(f"区域 {region} 拆分查询 {stats['tiles']} 块（四分 {stats['splits']} 次），合并后 {len(pois)} 条")
+    logging.info(f"区域 {region} 查询完成，共获取 {len(pois)} 条药店数据")
+    return pois, complete, stats["splits"]
+
+
+# 查询结束后一次性生成Excel文件
+def save_results_to_excel(region_results, output_path):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["区域", "uid", "street_id", "名称", "城市", "区", "地址", "经纬度", "导航经纬度", "营业时间", "图片数", "链接"])
+    for region, pois in region_results:
+        for poi in pois:
+            info = parse_poi(poi)
+            ws.append((region, info["uid"], info["street_id"], info["名称"], info["城市"], info["区域"],
+                       info["地址"], info["经纬度"], info["导航经纬度"], info["营业时间"], info["图片数"], info["详情链接"]))
+    wb.save(output_path)
 
 # 从区划表中读取行政区划数据
 def read_divisions():
@@ -208,12 +255,17 @@ if __name__ == "__main__":
     print("=" * 60)
     print("福建省药店查询系统")
     print("=" * 60)
+    journal = PageJournal(JOURNAL_FILE_PATH)
+    client = BaiduPlaceClient(AK, ledger=QuotaLedger(AK, MAX_API_CALLS),
+                              rate=REQUESTS_PER_SECOND, max_workers=MAX_WORKERS, journal=journal)
+
     print(f"目标城市: {', '.join(TARGET_CITIES)}")
-    print(f"API初始使用量: {API_COUNT}")
-    print(f"API最大限制: {MAX_API_CALLS}")
+    print(f"该AK今天已调用（所有脚本合计）: {client.ledger.daily_count}, 每日上限: {client.ledger.daily_limit}")
+    print(f"本次运行API最大限制: {MAX_API_CALLS}")
     print(f"区划表路径: {DIVISION_FILE_PATH}")
     print(f"输出文件: {OUTPUT_FILE_PATH}")
     print(f"日志文件: {LOG_FILE_PATH}")
+    print(f"翻页记录: {JOURNAL_FILE_PATH}（已记录 {len(journal)} 页）")
     print("=" * 60)
     
     # 读取行政区划
@@ -229,58 +281,49 @@ if __name__ == "__main__":
     if len(regions) > 10:
         print(f"  ... 等 {len(regions)} 个行政区划")
     
-    # 创建Excel文件并设置表头
-    print(f"\n正在创建输出文件: {OUTPUT_FILE_PATH}")
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.append(["区域", "uid", "street_id", "名称", "城市", "区", "地址", "经纬度", "导航经纬度", "营业时间", "图片数", "链接"])
-    wb.save(OUTPUT_FILE_PATH)
-    
-    print(f"\n开始查询 {', '.join(TARGET_CITIES)} 的药店数据...")
-    print(f"当前API已使用次数: {API_COUNT}, 限制: {MAX_API_CALLS}")
-    logging.info(f"开始批量查询，目标城市: {', '.join(TARGET_CITIES)}, 当前API使用次数: {API_COUNT}, 限制: {MAX_API_CALLS}")
+    print(f"\n开始查询 {', '.join(TARGET_CITIES)} 的药店数据（并发 {MAX_WORKERS}，限速 {REQUESTS_PER_SECOND} 次/秒）...")
+    print(f"该AK今天已调用: {client.ledger.daily_count}, 本次运行限制: {MAX_API_CALLS}")
+    logging.info(f"开始批量查询，目标城市: {', '.join(TARGET_CITIES)}, 该AK今天已调用: {client.ledger.daily_count}, 本次运行限制: {MAX_API_CALLS}")
     
     total_pharmacies = 0  # 总药店数量
     completed_regions = []  # 已完成查询的区县
-    failed_regions = []  # 查询失败的区县
+    failed_regions = []  # 查询失败或未完整获取的区县
+    split_regions = []  # 结果达到上限而拆分查询的区县
+    region_results = []
     
-    # 遍历所有区县进行查询
-    for i, region in enumerate(regions, 1):
-        print(f"\n[{i}/{len(regions)}] 开始查询: {region}")
-        
-        try:
-            API_COUNT, region_count, limit_reached = get_region_pharmacy_data_and_save(
-                API_COUNT, region, ws, wb
-            )
-            
-            total_pharmacies += region_count
-            completed_regions.append((region, region_count))
-            
-            if limit_reached:
-                print(f"\n*** 已达到API调用次数限制，停止查询 ***")
-                print(f"已完成查询的区县: {len(completed_regions)}/{len(regions)}")
-                logging.warning(f"已达到API调用次数限制，停止查询")
-                break
-                
-        except Exception as e:
-            print(f"查询 {region} 时发生异常: {e}")
-            logging.error(f"查询 {region} 时发生异常: {e}")
+    # 多个区县并发查询，每页结果追加到翻页记录
+    results = client.map_concurrent(lambda r: get_region_pharmacy_data(client, r), regions)
+    for i, (region, (pois, complete, splits)) in enumerate(results, 1):
+        region_results.append((region, pois))
+        total_pharmacies += len(pois)
+        if complete:
+            completed_regions.append((region, len(pois)))
+        else:
             failed_regions.append(region)
-            continue
-        
-        # 在区域之间添加延迟，避免请求过快
-        if i < len(regions):  # 不是最后一个区域时添加延迟
-            print(f"\n区域查询间隔延迟 {REQUEST_DELAY} 秒...")
-            time.sleep(REQUEST_DELAY)
+        if splits:
+            split_regions.append(region)
+        split_note = f"，拆分查询 {splits} 次" if splits else ""
+        print(f"[{i}/{len(regions)}] {region}: 获取 {len(pois)} 条药店数据{split_note}{'' if complete else '（未完整获取）'} (API调用: {client.ledger.count})")
+    
+    if client.ledger.exhausted:
+        print(f"\n*** 已达到API调用次数限制，停止查询 ***")
+        print(f"已完成查询的区县: {len(completed_regions)}/{len(regions)}，重新运行即可从翻页记录继续")
+        logging.warning(f"已达到API调用次数限制，停止查询")
+    
+    # 所有区县查询结束后一次性写入Excel
+    journal.close()
+    print(f"\n正在生成输出文件: {OUTPUT_FILE_PATH}")
+    save_results_to_excel(region_results, OUTPUT_FILE_PATH)
     
     # 输出汇总信息
     print("\n" + "=" * 60)
     print(f"查询完成汇总")
     print(f"=" * 60)
-    print(f"总API调用次数: {API_COUNT}")
+    print(f"总API调用次数: {client.ledger.count}")
     print(f"总药店数量: {total_pharmacies}")
     print(f"成功查询区县数: {len(completed_regions)}")
     print(f"失败区县数: {len(failed_regions)}")
+    print(f"拆分查询区县数: {len(split_regions)}")
     
     if completed_regions:
         print(f"\n各区县药店数量统计:")
@@ -298,7 +341,7 @@ if __name__ == "__main__":
     print(f"日志已保存到: {LOG_FILE_PATH}")
     
     # 记录最终汇总日志
-    logging.info(f"查询完成汇总 - 总API调用: {API_COUNT}, 总药店数: {total_pharmacies}, 成功区县: {len(completed_regions)}, 失败区县: {len(failed_regions)}")
+    logging.info(f"查询完成汇总 - 总API调用: {client.ledger.count}, 总药店数: {total_pharmacies}, 成功区县: {len(completed_regions)}, 失败区县: {len(failed_regions)}")
     
     print(f"\n{'=' * 60}")
     print("数据获取及保存完成。")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+照片拍摄位置匹配工具（离线空间索引）
+功能：
+1. 从药店表格（'经纬度'列，百度坐标 "纬度,经度"）和医院地址表格构建本地空间索引
+2. 批量查询每张照片坐标最近的已知药店/医院及距离，全程不调用任何API
+
+使用方法：
+先用 查看照片GPS_百度.py 处理照片文件夹得到 "照片GPS汇总_*.xlsx"，
+再配置下方路径后运行：python location_index.py
+"""
+
+import glob
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from coord_transform import EARTH_RADIUS_M, haversine_m_np, parse_coord_column
+
+# scipy 可选：有则使用 KD 树，否则退化为分块暴力计算
+try:
+    from scipy.spatial import cKDTree
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+    print("警告：未安装 scipy，将使用分块暴力计算最近点（数据量大时较慢）")
+    print("建议安装：pip install scipy")
+
+# =========================================
+# 脚本参数配置区域 - 请在此处修改参数
+# =========================================
+# 照片文件夹（查看照片GPS_百度.py 文件夹模式在其中输出 "照片GPS汇总_<时间>.xlsx"）
+PHOTO_FOLDER = '/Users/a000/Pictures/huawei251210'
+# 照片GPS汇总表，留空时使用 PHOTO_FOLDER 中最新的 照片GPS汇总_*.xlsx
+PHOTO_GPS_FILE = ''
+
+# 药店表格列表（需包含 '名称' 和 '经纬度' 列，百度坐标）
+PHARMACY_FILES = [
+    '/Users/a000/Documents/济生/药店拜访25/贵州药店查询结果_20251213.xlsx',
+]
+
+# 医院地址表格列表：(文件路径, 标签页)，需包含医院名称和 '经纬度' 列（百度坐标）
+HOSPITAL_FILES = [
+    # ('/Users/a000/Documents/济生/医院拜访25/医院拜访.xlsx', '医院地址'),
+]
+
+# 距离不超过该值（米）视为在该地点拍摄
+MATCH_DISTANCE_M = 200
+
+# 暴力计算时每批处理的照片数
+BRUTE_FORCE_CHUNK = 256
+
+
+def _to_unit_xyz(lats, lons):
+    """经纬度（度）转单位球面三维坐标，球面最近点等价于三维欧氏最近点"""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+class LocationIndex:
+    """已知地点（药店/医院）的空间索引，支持批量最近邻查询"""
+
+    def __init__(self, locations):
+        """
+        参数:
+            locations: DataFrame，需包含 '名称'、'类型'、'纬度'、'经度' 列，其余列原样保留
+        """
+        valid = locations['纬度'].notna() & locations['经度'].notna()
+        self.locations = locations[valid].reset_index(drop=True)
+        self._xyz = _to_unit_xyz(self.locations['纬度'], self.locations['经度'])
+        self._tree = cKDTree(self._xyz) if SCIPY_AVAILABLE and len(self._xyz) else None
+        print(f"空间索引构建完成，共 {len(self.locations)} 个地点")
+
+    def __len__(self):
+        return len(self.locations)
+
+    def query(self, lats, lons):
+        """
+        批量查询最近的已知地点
+
+        参数:
+            lats, lons: 查询点坐标数组（与索引坐标系一致），可含 NaN
+        返回:
+            (indices, distances_m)：最近地点在 self.locations 中的行号（无效查询为 -1）及距离（米，无效为 NaN）
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        indices = np.full(len(lats), -1, dtype=np.int64)
+        distances = np.full(len(lats), np.nan)
+        valid = ~(np.isnan(lats) | np.isnan(lons))
+        if not valid.any() or len(self) == 0:
+            return indices, distances
+
+        points = _to_unit_xyz(lats[valid], lons[valid])
+        if self._tree is not None:
+            _, nearest = self._tree.query(points)
+        else:
+            nearest = np.empty(len(points), dtype=np.int64)
+            for start in range(0, len(points), BRUTE_FORCE_CHUNK):
+                chunk = points[start:start + BRUTE_FORCE_CHUNK]
+                nearest[start:start + len(chunk)] = np.argmax(chunk @ self._xyz.T, axis=1)
+
+        indices[valid] = nearest
+        distances[valid] = haversine_m_np(
+            lats[valid], lons[valid],
+            self.locations['纬度'].to_numpy()[nearest], self.locations['经度'].to_numpy()[nearest],
+        )
+        return indices, distances
+
+    def query_k(self, lat, lon, k):
+        """查询单点最近的 k 个地点，返回按距离从近到远排列的行号"""
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty(0, dtype=np.int64)
+        point = _to_unit_xyz([lat], [lon])[0]
+        if self._tree is not None:
+            _, nearest = self._tree.query(point, k=k)
+            return np.atleast_1d(nearest).astype(np.int64)
+        similarity = self._xyz @ point
+        nearest = np.argpartition(-similarity, k - 1)[:k]
+        return nearest[np.argsort(-similarity[nearest])]
+
+    def query_radius(self, lat, lon, radius_m):
+        """查询单点半径范围内的所有地点行号"""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        point = _to_unit_xyz([lat], [lon])[0]
+        # 弧长转弦长
+        chord = 2 * np.sin(radius_m / EARTH_RADIUS_M / 2)
+        if self._tree is not None:
+            return np.asarray(self._tree.query_ball_point(point, chord), dtype=np.int64)
+        return np.flatnonzero(np.linalg.norm(self._xyz - point, axis=1) <= chord)
+
+
+def load_pharmacy_locations(file_path):
+    """读取药店表格，解析 '经纬度' 列"""
+    df = pd.read_excel(file_path)
+    lat, lon, _ = parse_coord_column(df['经纬度'])
+    return pd.DataFrame({
+        '名称': df['名称'],
+        '类型': '药店',
+        '地址': df['地址'] if '地址' in df.columns else '',
+        '纬度': lat,
+        '经度': lon,
+        '详情链接': df['详情链接'].fillna('') if '详情链接' in df.columns else '',
+    })
+
+
+def load_hospital_locations(file_path, sheet_name='医院地址'):
+    """读取医院地址表格，第一列为医院名称，第二列为地址，坐标取 '经纬度' 列"""
+    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    if '经纬度' not in df.columns:
+        print(f"警告：{file_path} [{sheet_name}] 中没有 '经纬度' 列，已跳过")
+        return pd.DataFrame(columns=['名称', '类型', '地址', '纬度', '经度'])
+    lat, lon, _ = parse_coord_column(df['经纬度'])
+    return pd.DataFrame({
+        '名称': df.iloc[:, 0],
+        '类型': '医院',
+        '地址': df.iloc[:, 1] if len(df.columns) > 1 else '',
+        '纬度': lat,
+        '经度': lon,
+    })
+
+
+def build_location_index(pharmacy_files, hospital_files):
+    """由药店表格和医院地址表格构建空间索引"""
+    frames = [load_pharmacy_locations(path) for path in pharmacy_files]
+    frames += [load_hospital_locations(path, sheet) for path, sheet in hospital_files]
+    locations = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['名称', '类型', '地址', '纬度', '经度'])
+    return LocationIndex(locations)
+
+
+def match_photos(photo_df, index, max_distance_m=MATCH_DISTANCE_M):
+    """
+    为照片GPS汇总表的每一行匹配最近的已知地点
+
+    参数:
+        photo_df: 包含 'BD09纬度'、'BD09经度' 列的 DataFrame
+        index: LocationIndex
+    返回:
+        追加了 '最近地点'、'地点类型'、'地点地址'、'距离(米)'、'是否匹配' 列的新 DataFrame
+    """
+    nearest, distances = index.query(photo_df['BD09纬度'], photo_df['BD09经度'])
+    found = nearest >= 0
+    result = photo_df.copy()
+    for column, source in (('最近地点', '名称'), ('地点类型', '类型'), ('地点地址', '地址')):
+        values = np.full(len(result), '', dtype=object)
+        values[found] = index.locations[source].to_numpy()[nearest[found]]
+        result[column] = values
+    result['距离(米)'] = np.round(distances, 1)
+    result['是否匹配'] = np.where(found & (distances <= max_distance_m), '是', '否')
+    return result
+
+
+def find_photo_gps_file(folder):
+    """文件夹中最新的照片GPS汇总表（文件名中的时间戳最大），没有时返回 None"""
+    files = glob.glob(os.path.join(folder, "照片GPS汇总_*.xlsx"))
+    return max(files) if files else None
+
+
+def main():
+    print("=" * 70)
+    print("📍 照片拍摄位置匹配工具（离线空间索引）")
+    print("=" * 70)
+
+    photo_gps_file = PHOTO_GPS_FILE or find_photo_gps_file(PHOTO_FOLDER)
+    if not photo_gps_file:
+        print(f"❌ {PHOTO_FOLDER} 中没有照片GPS汇总表，请先运行 查看照片GPS_百度.py 处理该文件夹")
+        return
+    print(f"照片GPS汇总表: {photo_gps_file}")
+
+    index = build_location_index(PHARMACY_FILES, HOSPITAL_FILES)
+    photo_df = pd.read_excel(photo_gps_file)
+    print(f"读取照片GPS数据，共 {len(photo_df)} 张照片")
+
+    result = match_photos(photo_df, index)
+    matched = int((result['是否匹配'] == '是').sum())
+    print(f"\n✅ 匹配完成：{matched}/{len(result)} 张照片在已知地点 {MATCH_DISTANCE_M} 米范围内")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M')
+    output_file = os.path.join(os.path.dirname(photo_gps_file), f"照片位置匹配_{timestamp}.xlsx")
+    result.to_excel(output_file, index=False)
+    print(f"结果已保存到: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,20 +4,29 @@
 照片GPS信息读取工具（百度地图版）
 功能：
 1. 读取照片的GPS经纬度信息
-2. 将WGS84坐标转换为百度坐标系（BD09）
+2. 将WGS84坐标转换为百度坐标系（BD09）（本地公式换算，无需联网）
 3. 使用百度地图API逆地理编码查询地址
 
 使用方法：
-python 查看照片GPS_百度.py [照片路径]
+python 查看照片GPS_百度.py [照片路径或文件夹路径]
 如果不提供照片路径，默认读取华为照片
+传入文件夹时，多线程只读取每张照片的EXIF段（不解码像素），
+一次性换算为百度坐标，并输出汇总表格到该文件夹
 """
 
+import os
 import sys
 import json
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from urllib import request, parse
+import pandas as pd
 from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS
 
+from coord_transform import wgs84_to_bd09_np, haversine_m_np
+
 # 默认要查看的照片路径
 DEFAULT_PHOTO_PATH = "/Users/a000/Pictures/huawei251210/IMG_20251210_160312.jpg"
 
@@ -28,6 +37,21 @@ BAIDU_AK = "9quP8V19nrZZdtTPu3Dgc66kvPSnV0rf"  # 在这里填入你的百度AK
 # 搜索附近药店的半径（单位：米）
 SEARCH_RADIUS = 300
 
+# 是否调用百度坐标转换API校验本地换算结果（会消耗配额，默认关闭）
+VALIDATE_WITH_API = False
+
+# 支持的照片扩展名
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.heic', '.heif')
+
+# 文件夹模式读取EXIF的线程数
+MAX_WORKERS = 8
+
+# EXIF 标签编号
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+
 
 def get_exif_data(image_path):
     """读取图片的 EXIF 信息"""
@@ -46,6 +70,152 @@ def get_exif_data(image_path):
         return {}
 
 
+def _read_jpeg_app1(f):
+    """顺序扫描JPEG标记段，只读取 APP1(Exif) 段内容，遇到图像数据即停止"""
+    if f.read(2) != b'\xff\xd8':
+        return None
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        # SOS / EOI 之后是图像数据，不再有元数据段
+        if marker[1] in (0xDA, 0xD9):
+            return None
+        seg_len = struct.unpack('>H', f.read(2))[0]
+        if marker[1] == 0xE1:
+            data = f.read(seg_len - 2)
+            if data.startswith(b'Exif\x00\x00'):
+                return data
+        else:
+            f.seek(seg_len - 2, os.SEEK_CUR)
+
+
+def _iter_boxes(data, start, end):
+    """遍历 ISOBMFF(HEIC) 数据中 [start, end) 范围内的 box，返回 (类型, 内容起点, 内容终点)"""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def _read_heic_exif(f):
+    """解析HEIC的 meta/iinf/iloc，定位并只读取 Exif 数据项"""
+    # meta box 位于文件开头附近，读取前 256KB 足够覆盖
+    head = f.read(256 * 1024)
+    meta = next(((s, e) for t, s, e in _iter_boxes(head, 0, len(head)) if t == b'meta'), None)
+    if meta is None:
+        return None
+    # meta 是 full box，内容前有 4 字节 version/flags
+    boxes = {t: (s, e) for t, s, e in _iter_boxes(head, meta[0] + 4, meta[1])}
+    if b'iinf' not in boxes or b'iloc' not in boxes:
+        return None
+
+    # iinf: 找到类型为 Exif 的 item_ID
+    s, e = boxes[b'iinf']
+    version = head[s]
+    pos = s + 4 + (2 if version == 0 else 4)
+    exif_item = None
+    for t, bs, be in _iter_boxes(head, pos, e):
+        if t != b'infe':
+            continue
+        infe_version = head[bs]
+        if infe_version < 2:
+            continue
+        if infe_version == 2:
+            item_id = struct.unpack('>H', head[bs + 4:bs + 6])[0]
+            item_type = head[bs + 8:bs + 12]
+        else:
+            item_id = struct.unpack('>I', head[bs + 4:bs + 8])[0]
+            item_type = head[bs + 10:bs + 14]
+        if item_type == b'Exif':
+            exif_item = item_id
+            break
+    if exif_item is None:
+        return None
+
+    # iloc: 找到该 item 的文件偏移和长度
+    s, e = boxes[b'iloc']
+    version = head[s]
+    offset_size = head[s + 4] >> 4
+    length_size = head[s + 4] & 0x0F
+    base_offset_size = head[s + 5] >> 4
+    index_size = head[s + 5] & 0x0F if version in (1, 2) else 0
+    pos = s + 6
+
+    def _read_uint(size):
+        nonlocal pos
+        value = int.from_bytes(head[pos:pos + size], 'big') if size else 0
+        pos += size
+        return value
+
+    item_count = _read_uint(2 if version < 2 else 4)
+    for _ in range(item_count):
+        item_id = _read_uint(2 if version < 2 else 4)
+        if version in (1, 2):
+            _read_uint(2)  # construction_method
+        _read_uint(2)  # data_reference_index
+        base_offset = _read_uint(base_offset_size)
+        extent_count = _read_uint(2)
+        extents = []
+        for _ in range(extent_count):
+            _read_uint(index_size)
+            extents.append((_read_uint(offset_size), _read_uint(length_size)))
+        if item_id == exif_item and extents:
+            extent_offset, extent_length = extents[0]
+            f.seek(base_offset + extent_offset)
+            data = f.read(extent_length)
+            # Exif 数据项以 4 字节的 TIFF 头偏移开始
+            tiff_offset = struct.unpack('>I', data[:4])[0]
+            return data[4 + tiff_offset:]
+    return None
+
+
+def read_exif_segment(image_path):
+    """
+    只读取照片中的 EXIF 数据段（JPEG 的 APP1 段或 HEIC 的 Exif 数据项），不解码像素
+    返回: PIL.Image.Exif 对象，读取失败返回 None
+    """
+    try:
+        with open(image_path, 'rb') as f:
+            if image_path.lower().endswith(('.heic', '.heif')):
+                data = _read_heic_exif(f)
+            else:
+                data = _read_jpeg_app1(f)
+        if not data:
+            return None
+        exif = Image.Exif()
+        exif.load(data)
+        return exif
+    except Exception as e:
+        print(f"读取EXIF失败 {image_path}: {e}")
+        return None
+
+
+def read_photo_gps(image_path):
+    """
+    读取单张照片的 GPS 坐标(WGS84)和拍摄时间
+    返回: (lat, lon, 拍摄时间字符串)，缺失项为 None
+    """
+    exif = read_exif_segment(image_path)
+    if exif is None:
+        return None, None, None
+    capture_time = exif.get_ifd(EXIF_IFD_POINTER).get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME)
+    gps_ifd = exif.get_ifd(GPS_IFD_POINTER)
+    if not gps_ifd:
+        return None, None, capture_time
+    lat, lon, _ = get_gps_info({"GPSInfo": dict(gps_ifd)})
+    return lat, lon, capture_time
+
+
 def get_gps_info(exif):
     """从 EXIF 中提取 GPS 信息并转换成十进制度经纬度（WGS84坐标系）"""
     gps_info_raw = exif.get("GPSInfo")
@@ -101,9 +271,64 @@ def get_gps_info(exif):
     return lat, lon, gps_info
 
 
+def convert_wgs84_to_bd09_local(lon, lat):
+    """
+    本地将WGS84坐标转换为百度坐标系（BD09），不调用任何网络接口
+    
+    参数:
+        lon: WGS84经度
+        lat: WGS84纬度
+    返回:
+        (bd_lon, bd_lat) 或 (None, None)
+    """
+    if lon is None or lat is None:
+        return None, None
+
+    print(f"\n📍 步骤1: 坐标转换（WGS84 -> BD09，本地换算）")
+    print(f"   原始坐标(WGS84): 经度={lon:.6f}, 纬度={lat:.6f}")
+    bd_lon, bd_lat = wgs84_to_bd09_np(lon, lat)
+    bd_lon, bd_lat = float(bd_lon), float(bd_lat)
+    print(f"   转换后坐标(BD09): 经度={bd_lon:.6f}, 纬度={bd_lat:.6f}")
+    return bd_lon, bd_lat
+
+
+def batch_convert_wgs84_to_bd09(coords):
+    """
+    批量本地转换WGS84坐标为百度坐标系（BD09），一次向量化计算
+    
+    参数:
+        coords: [(lon, lat), ...]，元素可以为 (None, None)
+    返回:
+        [(bd_lon, bd_lat), ...]，与输入一一对应，无坐标的项为 (None, None)
+    """
+    valid = [i for i, (lon, lat) in enumerate(coords) if lon is not None and lat is not None]
+    results = [(None, None)] * len(coords)
+    if not valid:
+        return results
+    bd_lon, bd_lat = wgs84_to_bd09_np([coords[i][0] for i in valid], [coords[i][1] for i in valid])
+    for k, i in enumerate(valid):
+        results[i] = (float(bd_lon[k]), float(bd_lat[k]))
+    return results
+
+
+def validate_bd09_with_api(lon, lat, bd_lon, bd_lat, ak):
+    """
+    调用百度坐标转换API校验本地换算结果，打印两者偏差（米）
+    
+    返回:
+        偏差米数，API调用失败时返回None
+    """
+    api_lon, api_lat = convert_wgs84_to_bd09(lon, lat, ak)
+    if api_lon is None or api_lat is None:
+        return None
+    deviation = float(haversine_m_np(bd_lat, bd_lon, api_lat, api_lon))
+    print(f"   本地换算与API结果偏差: {deviation:.2f}米")
+    return deviation
+
+
 def convert_wgs84_to_bd09(lon, lat, ak):
     """
-    使用百度地图坐标转换API将WGS84坐标转换为百度坐标系（BD09）
+    使用百度地图坐标转换API（仅用于校验本地换算结果）将WGS84坐标转换为百度坐标系（BD09）
     API文档: http://lbsyun.baidu.com/index.php?title=webapi/guide/changeposition
     
     参数:
@@ -132,7 +357,7 @@ def convert_wgs84_to_bd09(lon, lat, ak):
     }
     
     url = base_url + "?" + parse.urlencode(params)
-    print(f"\n📍 步骤1: 坐标转换（WGS84 -> BD09）")
+    print(f"\n📍 校验: 调用百度坐标转换API（WGS84 -> BD09）")
     print(f"   原始坐标(WGS84): 经度={lon:.6f}, 纬度={lat:.6f}")
     
     try:
@@ -287,6 +512,43 @@ def search_nearby_pharmacies(bd_lon, bd_lat, radius, ak):
         print(f"   ❌ 调用POI搜索API出错: {e}")
 
 
+def process_photo_folder(folder_path):
+    """
+    批量读取文件夹内所有照片的GPS信息，并一次性本地换算为百度坐标
+    多线程只读取每张照片的EXIF段，结果写入文件夹下的汇总表格
+    
+    返回:
+        汇总表格 DataFrame（文件, WGS84纬度, WGS84经度, BD09纬度, BD09经度, 拍摄时间）
+    """
+    files = sorted(f for f in os.listdir(folder_path) if f.lower().endswith(PHOTO_EXTENSIONS))
+    print(f"\n📁 文件夹中共有 {len(files)} 张照片: {folder_path}")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        infos = list(executor.map(read_photo_gps, (os.path.join(folder_path, f) for f in files)))
+
+    bd_coords = batch_convert_wgs84_to_bd09([(lon, lat) for lat, lon, _ in infos])
+    rows = []
+    for filename, (lat, lon, capture_time), (bd_lon, bd_lat) in zip(files, infos, bd_coords):
+        rows.append({
+            '文件': filename,
+            'WGS84纬度': lat,
+            'WGS84经度': lon,
+            'BD09纬度': bd_lat,
+            'BD09经度': bd_lon,
+            '拍摄时间': capture_time,
+        })
+    df = pd.DataFrame(rows, columns=['文件', 'WGS84纬度', 'WGS84经度', 'BD09纬度', 'BD09经度', '拍摄时间'])
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M')
+    output_file = os.path.join(folder_path, f"照片GPS汇总_{timestamp}.xlsx")
+    df.to_excel(output_file, index=False)
+
+    located = int(df['BD09纬度'].notna().sum())
+    print(f"\n✅ 完成！共 {len(df)} 张照片，其中 {located} 张包含GPS信息")
+    print(f"   汇总表格已保存到: {output_file}")
+    return df
+
+
 def main():
     print("=" * 70)
     print("📷 照片GPS信息读取工具（百度地图版）")
@@ -297,6 +559,12 @@ def main():
         photo_path = sys.argv[1]
     else:
         photo_path = DEFAULT_PHOTO_PATH
+
+    # 文件夹模式：批量本地换算，不调用任何API
+    if os.path.isdir(photo_path):
+        process_photo_folder(photo_path)
+        print("\n" + "=" * 70)
+        return
     
     print(f"\n📁 正在读取图片: {photo_path}")
     
@@ -318,19 +586,19 @@ def main():
     for k, v in gps_info.items():
         print(f"   {k}: {v}")
     
-    # 坐标转换和药店搜索
+    # 步骤1: 坐标转换（本地换算，无需AK）
+    bd_lon, bd_lat = convert_wgs84_to_bd09_local(lon, lat)
+    
+    # 坐标校验和药店搜索
     if BAIDU_AK:
-        # 步骤1: 坐标转换
-        bd_lon, bd_lat = convert_wgs84_to_bd09(lon, lat, BAIDU_AK)
+        if VALIDATE_WITH_API:
+            validate_bd09_with_api(lon, lat, bd_lon, bd_lat, BAIDU_AK)
         
         # 步骤2: 搜索附近药店
-        if bd_lon and bd_lat:
-            search_nearby_pharmacies(bd_lon, bd_lat, SEARCH_RADIUS, BAIDU_AK)
-        else:
-            print("\n❌ 坐标转换失败，无法查询地址")
+        search_nearby_pharmacies(bd_lon, bd_lat, SEARCH_RADIUS, BAIDU_AK)
     else:
         print("\n" + "=" * 70)
-        print("⚠️  未配置百度地图AK，无法进行坐标转换和地址查询")
+        print("⚠️  未配置百度地图AK，无法进行地址查询")
         print("=" * 70)
         print("\n📝 配置步骤:")
         print("   1. 访问百度地图开放平台: https://lbsyun.baidu.com/")
@@ -339,8 +607,8 @@ def main():
         print("   4. 获取AK（访问应用密钥）")
         print("   5. 在脚本中设置: BAIDU_AK = '你的AK'")
         print("\n💡 需要启用的服务:")
-        print("   - 坐标转换服务")
         print("   - 逆地理编码服务")
+        print("   - 地点检索服务")
     
     print("\n" + "=" * 70)
 
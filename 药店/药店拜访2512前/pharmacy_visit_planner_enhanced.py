@@ -9,35 +9,96 @@
 3. 距离计算和路程时间估算
 4. 生成详细的Excel拜访计划
 5. 自动点击药店获取详情页URL
+
+两种模式：
+- 'browser'：驱动 Chrome 在百度地图上逐个点击"附近"搜索（需要 selenium）
+- 'data'：不打开浏览器，直接用本地药店坐标表（地点检索API的查询结果）和空间索引
+  选择最近的未拜访药店，时间规则与浏览器模式相同；可一次规划多天
 """
 
+import os
+import sys
 import time
 import random
 import re
 from datetime import datetime, timedelta
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException
 import pandas as pd
 import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill
 
+# 共享的坐标解析和空间索引位于上级目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from coord_transform import haversine_m_np
+from location_index import LocationIndex, load_pharmacy_locations
+
+# selenium 只在浏览器模式下需要
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.chrome.options import Options
+    SELENIUM_AVAILABLE = True
+except ImportError:
+    SELENIUM_AVAILABLE = False
+
+# =========================================
+# 脚本参数配置区域
+# =========================================
+# 规划模式：'data' 使用本地药店数据（无浏览器），'browser' 使用浏览器在百度地图上搜索
+PLAN_MODE = 'data'
+
+# 数据模式使用的药店表格（需包含 '名称'、'地址'、'经纬度' 列，百度坐标 "纬度,经度"；可选 '详情链接' 列）
+PHARMACY_FILES = [
+    '/Users/a000/Documents/济生/药店拜访25/贵州药店查询结果_20251213.xlsx',
+]
+
+# 数据模式每次取最近的多少家候选药店，全部已拜访时自动扩大
+NEARBY_CANDIDATES = 32
+
+
+def format_distance(distance_meters):
+    """米数格式化为百度地图风格的距离字符串（与 calculate_travel_time 的解析规则对应）"""
+    if distance_meters < 1000:
+        return f"{int(round(distance_meters))}m"
+    return f"{distance_meters / 1000:.1f}km"
+
+
+def load_pharmacy_dataset(pharmacy_files):
+    """读取药店表格，按名称+地址去重，返回 LocationIndex"""
+    pharmacies = pd.concat([load_pharmacy_locations(path) for path in pharmacy_files], ignore_index=True)
+    pharmacies['名称'] = pharmacies['名称'].astype(str).str.strip()
+    pharmacies['地址'] = pharmacies['地址'].fillna('').astype(str).str.strip()
+    pharmacies = pharmacies.drop_duplicates(subset=['名称', '地址'])
+    print(f"读取药店数据 {len(pharmacies)} 家")
+    return LocationIndex(pharmacies)
+
+
 class EnhancedPharmacyVisitPlanner:
-    def __init__(self, start_pharmacy_name="一心堂大健康药店(花果园C区店)"):
+    def __init__(self, start_pharmacy_name="一心堂大健康药店(花果园C区店)", mode='browser', pharmacy_index=None):
+        """
+        参数:
+            mode: 'browser' 或 'data'
+            pharmacy_index: 数据模式使用的药店空间索引（LocationIndex，见 load_pharmacy_dataset）
+        """
         self.driver = None
         self.wait = None
+        self.mode = mode
+        self.pharmacy_index = pharmacy_index
         self.start_pharmacy_name = start_pharmacy_name
         self.visited_pharmacies = set()  # 已规划拜访的药店唯一标识集合（名称+地址）
         self.visit_plan = []  # 拜访计划列表
         self.current_time = None  # 当前规划时间
         self.max_pharmacies = random.randint(16, 19)  # 一天随机规划16-19家药店
-        self.setup_driver()
+        if mode == 'browser':
+            self.setup_driver()
+        elif pharmacy_index is None:
+            raise ValueError("数据模式需要提供 pharmacy_index")
         
     def setup_driver(self):
         """设置Chrome浏览器驱动"""
+        if not SELENIUM_AVAILABLE:
+            raise RuntimeError("浏览器模式需要安装 selenium：pip install selenium")
         chrome_options = Options()
         chrome_options.add_argument('--window-size=1920,1080')
         chrome_options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
@@ -320,16 +381,17 @@ class EnhancedPharmacyVisitPlanner:
             print(f"点击药店获取URL失败: {e}")
             return ""
     
-    def add_pharmacy_to_plan(self, pharmacy_name, address, detail_url, distance=""):
-        """添加药店到拜访计划"""
+    def add_pharmacy_to_plan(self, pharmacy_name, address, detail_url, distance="", from_start=False):
+        """添加药店到拜访计划（from_start: 从不在计划中的起始位置出发，第一家药店也计路程时间）"""
         # 计算拜访时长（10-20分钟随机）
         visit_duration = random.randint(10, 20)
         
         # 计算路程时间
         travel_time = self.calculate_travel_time(distance) if distance else 0
         
-        # 如果不是第一家药店，需要加上路程时间
-        if len(self.visit_plan) > 0:
+        # 如果不是第一家药店（或从起始位置出发），需要加上路程时间
+        charge_travel = len(self.visit_plan) > 0 or from_start
+        if charge_travel:
             self.current_time += timedelta(minutes=travel_time)
         
         # 调整午休时间
@@ -353,7 +415,7 @@ class EnhancedPharmacyVisitPlanner:
             '拜访结束时间': visit_end.strftime('%H:%M'),
             '药店详情页URL': detail_url,
             '距离': distance,
-            '路程时间(分钟)': travel_time if len(self.visit_plan) > 0 else 0
+            '路程时间(分钟)': travel_time if charge_travel else 0
         }
         
         self.visit_plan.append(plan_item)
@@ -438,54 +500,124 @@ class EnhancedPharmacyVisitPlanner:
         
         print(f"\n拜访计划创建完成！共规划 {len(self.visit_plan)} 家药店")
     
-    def save_to_excel(self, filename=None):
-        """保存拜访计划到Excel文件"""
+    def find_pharmacy(self, pharmacy_name):
+        """在本地数据中查找药店：先精确匹配名称，再模糊匹配，返回行号或 None"""
+        names = self.pharmacy_index.locations['名称']
+        matches = names.index[names == pharmacy_name]
+        if len(matches) == 0:
+            matches = names.index[names.str.contains(pharmacy_name, regex=False)]
+        return int(matches[0]) if len(matches) else None
+
+    def nearest_unvisited(self, lat, lon):
+        """返回最近的未规划药店 (行号, 距离米)，全部规划完返回 None"""
+        locations = self.pharmacy_index.locations
+        k = NEARBY_CANDIDATES
+        while True:
+            candidates = self.pharmacy_index.query_k(lat, lon, k)
+            for idx in candidates:
+                row = locations.iloc[idx]
+                if self.get_pharmacy_unique_key(row['名称'], row['地址']) not in self.visited_pharmacies:
+                    distance = float(haversine_m_np(lat, lon, row['纬度'], row['经度']))
+                    return int(idx), distance
+            if k >= len(locations):
+                return None
+            k *= 4
+
+    def create_visit_plan_from_data(self):
+        """数据模式：从起始药店出发，每次选择最近的未规划药店，规则与浏览器模式相同"""
+        print("开始创建药店拜访计划（本地数据模式）...")
+        self.init_visit_time()
+
+        start_idx = self.find_pharmacy(self.start_pharmacy_name)
+        if start_idx is None:
+            print(f"本地数据中找不到起始药店: {self.start_pharmacy_name}，退出规划")
+            return
+        locations = self.pharmacy_index.locations
+        row = locations.iloc[start_idx]
+        start_planned = self.get_pharmacy_unique_key(row['名称'], row['地址']) in self.visited_pharmacies
+        if start_planned:
+            # 批量规划时起始药店可能已在前几天的计划中，只作为出发位置
+            print(f"起始药店已在之前的计划中，从其位置出发: {row['名称']}")
+        else:
+            self.add_pharmacy_to_plan(row['名称'], row['地址'], row['详情链接'])
+
+        while len(self.visit_plan) < self.max_pharmacies:
+            nearest = self.nearest_unvisited(row['纬度'], row['经度'])
+            if nearest is None:
+                print("没有更多未规划的药店，结束规划")
+                break
+            idx, distance = nearest
+            row = locations.iloc[idx]
+            # 起始药店只作为出发位置时，第一家药店的路程从起始药店算起
+            if not self.add_pharmacy_to_plan(row['名称'], row['地址'], row['详情链接'], format_distance(distance),
+                                             from_start=start_planned):
+                break
+
+        print(f"拜访计划创建完成！共规划 {len(self.visit_plan)} 家药店")
+
+    def plan_days(self, start_pharmacies):
+        """
+        数据模式批量规划：每个起始药店规划一天，各天之间不重复拜访同一家药店
+        返回: {'第1天': 拜访计划列表, ...}
+        """
+        plans = {}
+        for day, start_pharmacy in enumerate(start_pharmacies, 1):
+            print(f"\n=== 第{day}天：从 {start_pharmacy} 出发 ===")
+            self.start_pharmacy_name = start_pharmacy
+            self.visit_plan = []
+            self.max_pharmacies = random.randint(16, 19)
+            self.create_visit_plan_from_data()
+            plans[f"第{day}天"] = self.visit_plan
+        return plans
+
+    def save_to_excel(self, filename=None, plans=None):
+        """保存拜访计划到Excel文件（plans 为 {标签页名: 拜访计划列表}，默认只保存当前计划）"""
         if not filename:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"贵阳药店拜访计划_增强版_{timestamp}.xlsx"
-        
-        # 创建DataFrame
-        df = pd.DataFrame(self.visit_plan)
+        if plans is None:
+            plans = {'拜访计划': self.visit_plan}
         
         # 保存到Excel
         with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='拜访计划', index=False)
-            
-            # 获取工作表进行格式化
-            worksheet = writer.sheets['拜访计划']
-            
-            # 设置列宽
-            column_widths = {
-                'A': 8,   # 编号
-                'B': 25,  # 药店名称
-                'C': 30,  # 地址
-                'D': 12,  # 拜访开始时间
-                'E': 12,  # 拜访结束时间
-                'F': 50,  # 药店详情页URL
-                'G': 10,  # 距离
-                'H': 12   # 路程时间
-            }
-            
-            for col, width in column_widths.items():
-                worksheet.column_dimensions[col].width = width
-            
-            # 设置标题行格式
-            header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-            header_font = Font(color='FFFFFF', bold=True)
-            
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            
-            # 设置数据行格式
-            for row in worksheet.iter_rows(min_row=2, max_row=len(self.visit_plan)+1):
-                for cell in row:
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
+            for sheet_name, visit_plan in plans.items():
+                pd.DataFrame(visit_plan).to_excel(writer, sheet_name=sheet_name, index=False)
+                self._format_sheet(writer.sheets[sheet_name], len(visit_plan))
         
         print(f"拜访计划已保存到: {filename}")
         return filename
     
+    def _format_sheet(self, worksheet, row_count):
+        """设置拜访计划标签页的列宽和对齐"""
+        # 设置列宽
+        column_widths = {
+            'A': 8,   # 编号
+            'B': 25,  # 药店名称
+            'C': 30,  # 地址
+            'D': 12,  # 拜访开始时间
+            'E': 12,  # 拜访结束时间
+            'F': 50,  # 药店详情页URL
+            'G': 10,  # 距离
+            'H': 12   # 路程时间
+        }
+        
+        for col, width in column_widths.items():
+            worksheet.column_dimensions[col].width = width
+        
+        # 设置标题行格式
+        header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+        header_font = Font(color='FFFFFF', bold=True)
+        
+        for cell in worksheet[1]:
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+        
+        # 设置数据行格式
+        for row in worksheet.iter_rows(min_row=2, max_row=row_count+1):
+            for cell in row:
+                cell.alignment = Alignment(horizontal='center', vertical='center')
+    
     def close(self):
         """关闭浏览器"""
         if self.driver:
@@ -499,7 +631,10 @@ class EnhancedPharmacyVisitPlanner:
         
         try:
             # 创建拜访计划
-            self.create_visit_plan()
+            if self.mode == 'data':
+                self.create_visit_plan_from_data()
+            else:
+                self.create_visit_plan()
             
             # 保存到Excel
             if self.visit_plan:
@@ -519,9 +654,10 @@ class EnhancedPharmacyVisitPlanner:
             print(f"运行过程中出现错误: {e}")
             return None
         finally:
-            # 保持浏览器打开以便观察
-            input("\n按回车键关闭浏览器...")
-            self.close()
+            if self.driver:
+                # 保持浏览器打开以便观察
+                input("\n按回车键关闭浏览器...")
+                self.close()
 
 def main():
     """主函数"""
@@ -537,14 +673,24 @@ def main():
     print("8. 一天最多规划20家药店")
     
     # 可以修改起始药店
-    start_pharmacy = input("\n请输入起始药店名称（直接回车使用默认）: ").strip()
+    start_pharmacy = input("\n请输入起始药店名称（直接回车使用默认，多天用逗号分隔）: ").strip()
     if not start_pharmacy:
         start_pharmacy = "一心堂大健康药店(花果园C区店)"
+    start_pharmacies = [name.strip() for name in re.split(r'[,，]', start_pharmacy) if name.strip()]
     
-    print(f"\n开始从 '{start_pharmacy}' 规划拜访路线...")
+    print(f"\n开始从 '{start_pharmacy}' 规划拜访路线（{'本地数据' if PLAN_MODE == 'data' else '浏览器'}模式）...")
     
-    planner = EnhancedPharmacyVisitPlanner(start_pharmacy)
-    result_file = planner.run()
+    if PLAN_MODE == 'data':
+        planner = EnhancedPharmacyVisitPlanner(start_pharmacies[0], mode='data',
+                                               pharmacy_index=load_pharmacy_dataset(PHARMACY_FILES))
+        if len(start_pharmacies) > 1:
+            plans = planner.plan_days(start_pharmacies)
+            result_file = planner.save_to_excel(plans=plans) if any(plans.values()) else None
+        else:
+            result_file = planner.run()
+    else:
+        planner = EnhancedPharmacyVisitPlanner(start_pharmacies[0])
+        result_file = planner.run()
     
     if result_file:
         print(f"\n✅ 拜访计划已生成: {result_file}")
@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 import collections
+import heapq
 from sklearn.neighbors import KDTree
 from datetime import datetime
 
@@ -83,49 +84,104 @@ def greedy_algorithm(data, x_column_name, y_column_name, id_column_name):
     return regions, result_data
 
 
+class GridDensityIndex:
+    """
+    增量维护的网格密度结构
+    - counts: 每个网格内剩余点数
+    - density: 每个网格3x3邻域内剩余点数，移除点时只更新受影响的9个网格
+    - 最大堆（惰性删除）保存网格密度，取当前密度最高网格为 O(log n)
+    """
+
+    def __init__(self, lats, lngs, point_indices, grid_size):
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        self.min_lat = lats.min()
+        self.min_lng = lngs.min()
+        self.grid_size = grid_size
+        self.grid_rows = int((lats.max() - self.min_lat) / grid_size) + 1
+        self.grid_cols = int((lngs.max() - self.min_lng) / grid_size) + 1
+
+        # 每个点所在网格（确保索引在有效范围内）
+        rows = np.minimum(((lats - self.min_lat) / grid_size).astype(np.int64), self.grid_rows - 1)
+        cols = np.minimum(((lngs - self.min_lng) / grid_size).astype(np.int64), self.grid_cols - 1)
+        self.point_cell = {}
+        self.cell_points = collections.defaultdict(set)
+        for point_idx in point_indices:
+            cell = (int(rows[point_idx]), int(cols[point_idx]))
+            self.point_cell[point_idx] = cell
+            self.cell_points[cell].add(point_idx)
+
+        self.counts = np.zeros((self.grid_rows, self.grid_cols), dtype=np.int64)
+        for (row, col), points in self.cell_points.items():
+            self.counts[row, col] = len(points)
+
+        # 3x3邻域求和得到初始密度
+        padded = np.pad(self.counts, 1)
+        self.density = sum(
+            padded[1 + dr:1 + dr + self.grid_rows, 1 + dc:1 + dc + self.grid_cols]
+            for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+        )
+
+        self.heap = [(-int(self.density[cell]), cell) for cell in self.cell_points]
+        heapq.heapify(self.heap)
+
+    def _is_current(self, neg_density, cell):
+        """堆顶记录是否仍有效：网格非空且密度未变化"""
+        return self.counts[cell] > 0 and -neg_density == self.density[cell]
+
+    def densest_cells(self):
+        """返回当前密度最高的所有网格（并列时全部返回）及其密度"""
+        while self.heap and not self._is_current(*self.heap[0]):
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return [], 0
+
+        max_density = -self.heap[0][0]
+        cells, popped = [], []
+        while self.heap and -self.heap[0][0] == max_density:
+            entry = heapq.heappop(self.heap)
+            if self._is_current(*entry) and entry[1] not in cells:
+                cells.append(entry[1])
+                popped.append(entry)
+        for entry in popped:
+            heapq.heappush(self.heap, entry)
+        return cells, max_density
+
+    def remove(self, point_idx):
+        """移除一个点，增量更新所在网格及邻域密度"""
+        cell = self.point_cell.pop(point_idx, None)
+        if cell is None:
+            return
+        self.cell_points[cell].discard(point_idx)
+        row, col = cell
+        self.counts[row, col] -= 1
+        for nr in range(max(row - 1, 0), min(row + 2, self.grid_rows)):
+            for nc in range(max(col - 1, 0), min(col + 2, self.grid_cols)):
+                self.density[nr, nc] -= 1
+                if self.counts[nr, nc] > 0:
+                    heapq.heappush(self.heap, (-int(self.density[nr, nc]), (nr, nc)))
+
+    def add(self, point_idx, lat, lng):
+        """添加一个点，增量更新所在网格及邻域密度"""
+        row = min(int((lat - self.min_lat) / self.grid_size), self.grid_rows - 1)
+        col = min(int((lng - self.min_lng) / self.grid_size), self.grid_cols - 1)
+        self.point_cell[point_idx] = (row, col)
+        self.cell_points[(row, col)].add(point_idx)
+        self.counts[row, col] += 1
+        for nr in range(max(row - 1, 0), min(row + 2, self.grid_rows)):
+            for nc in range(max(col - 1, 0), min(col + 2, self.grid_cols)):
+                self.density[nr, nc] += 1
+                if self.counts[nr, nc] > 0:
+                    heapq.heappush(self.heap, (-int(self.density[nr, nc]), (nr, nc)))
+
+
 def initialize_grid(data, x_column_name, y_column_name, remaining_points):
     """
     初始化网格系统，用于快速密度估算
-    网格大小基于数据的地理范围和threshold值
+    网格大小基于数据的地理范围和threshold值，约为threshold的2倍
     """
-    # 计算数据的地理边界
-    min_lat = data[x_column_name].min()
-    max_lat = data[x_column_name].max()
-    min_lng = data[y_column_name].min()
-    max_lng = data[y_column_name].max()
-    
-    # 根据threshold确定网格大小，网格大小约为threshold的2倍
-    grid_size = threshold * 2
-    
-    # 计算网格数量
-    grid_rows = int((max_lat - min_lat) / grid_size) + 1
-    grid_cols = int((max_lng - min_lng) / grid_size) + 1
-    
-    # 初始化网格，存储每个网格内的点索引
-    grid = [[[] for _ in range(grid_cols)] for _ in range(grid_rows)]
-    
-    # 将所有点分配到对应网格
-    for point_idx in remaining_points:
-        lat = data.iloc[point_idx][x_column_name]
-        lng = data.iloc[point_idx][y_column_name]
-        
-        row = int((lat - min_lat) / grid_size)
-        col = int((lng - min_lng) / grid_size)
-        
-        # 确保索引在有效范围内
-        row = min(row, grid_rows - 1)
-        col = min(col, grid_cols - 1)
-        
-        grid[row][col].append(point_idx)
-    
-    return {
-        'grid': grid,
-        'min_lat': min_lat,
-        'min_lng': min_lng,
-        'grid_size': grid_size,
-        'grid_rows': grid_rows,
-        'grid_cols': grid_cols
-    }
+    return GridDensityIndex(data[x_column_name].to_numpy(), data[y_column_name].to_numpy(),
+                            remaining_points, threshold * 2)
 
 
 def select_start_index_grid(data, x_column_name, y_column_name, remaining_points, grid_system):
@@ -135,67 +191,26 @@ def select_start_index_grid(data, x_column_name, y_column_name, remaining_points
     if len(remaining_points) <= 1:
         return remaining_points[0] if remaining_points else None
     
-    grid = grid_system['grid']
-    max_density = 0
-    best_candidates = []
-    
-    # 遍历所有网格，找到密度最高的网格
-    for row in range(grid_system['grid_rows']):
-        for col in range(grid_system['grid_cols']):
-            if grid[row][col]:  # 如果网格内有点
-                # 计算该网格及其邻近网格的总点数作为密度指标
-                density = calculate_grid_density(grid, row, col, grid_system['grid_rows'], grid_system['grid_cols'])
-                
-                if density > max_density:
-                    max_density = density
-                    best_candidates = grid[row][col].copy()
-                elif density == max_density:
-                    best_candidates.extend(grid[row][col])
+    # 取密度最高的网格（网格内只保存剩余点，无需再校验）
+    best_cells, _ = grid_system.densest_cells()
+    best_candidates = [idx for cell in best_cells for idx in grid_system.cell_points[cell]]
     
     # 从最佳候选点中随机选择
     if best_candidates:
-        # 确保候选点都在remaining_points中
-        valid_candidates = [idx for idx in best_candidates if idx in remaining_points]
-        if valid_candidates:
-            return np.random.choice(valid_candidates)
+        return np.random.choice(sorted(best_candidates))
     
     # 如果没有找到合适的候选点，随机选择
     return np.random.choice(remaining_points)
 
 
-def calculate_grid_density(grid, row, col, grid_rows, grid_cols):
-    """
-    计算指定网格及其邻近网格的点密度
-    """
-    density = 0
-    # 检查3x3邻域
-    for dr in [-1, 0, 1]:
-        for dc in [-1, 0, 1]:
-            nr, nc = row + dr, col + dc
-            if 0 <= nr < grid_rows and 0 <= nc < grid_cols:
-                density += len(grid[nr][nc])
-    return density
-
-
 def update_grid(grid_system, data, x_column_name, y_column_name, point_idx, remove=True):
     """
     更新网格系统，添加或移除点
     """
-    lat = data.iloc[point_idx][x_column_name]
-    lng = data.iloc[point_idx][y_column_name]
-    
-    row = int((lat - grid_system['min_lat']) / grid_system['grid_size'])
-    col = int((lng - grid_system['min_lng']) / grid_system['grid_size'])
-    
-    # 确保索引在有效范围内
-    row = min(row, grid_system['grid_rows'] - 1)
-    col = min(col, grid_system['grid_cols'] - 1)
-    
     if remove:
-        if point_idx in grid_system['grid'][row][col]:
-            grid_system['grid'][row][col].remove(point_idx)
+        grid_system.remove(point_idx)
     else:
-        grid_system['grid'][row][col].append(point_idx)
+        grid_system.add(point_idx, data.iloc[point_idx][x_column_name], data.iloc[point_idx][y_column_name])
 
 
 def select_start_index(data, x_column_name, y_column_name, remaining_points):
@@ -1,11 +1,13 @@
-import csv
-import requests
-import json
 import logging
-import openpyxl
+import os
+import sys
 import pandas as pd
 from datetime import datetime
 
+# 共享的百度地点检索客户端位于上级目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from baidu_place_client import BaiduPlaceClient, QuotaLedger, parse_poi
+
 # 配置参数
 excel_file_path = '/Users/a000/Documents/济生/药店拜访25/贵州药店查询结果_20251213.xlsx'  # 输入文件
 out_file_path = f'/Users/a000/Documents/济生/药店拜访25/贵州附近药店数据_{datetime.now().strftime("%Y%m%d_%H%M")}.xlsx'  # 输出文件
@@ -15,9 +17,9 @@ log_file_path = f'/Users/a000/Documents/济生/药店拜访25/贵州药店查询
 ak = "9quP8V19nrZZdtTPu3Dgc66kvPSnV0rf"
 radius = "1000"
 query = "药店"
-page_size = 20
-api_count = 15312  # 当前已使用的API次数
-max_api_calls = 50000  # 最大API调用次数
+max_api_calls = 50000  # 本次运行最大API调用次数（该AK当天所有脚本的合计由共享配额账本限制）
+requests_per_second = 2.0  # 全局请求速率（次/秒）
+max_workers = 4  # 同时查询的源药店数量
 
 # 设置日志
 logging.basicConfig(
@@ -26,85 +28,16 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# 构建请求URL的函数
-def build_url(page_num, location):
-    return f"https://api.map.baidu.com/place/v2/search?query={query}&scope=2&location={location}&radius={radius}&output=json&ak={ak}&page_size={page_size}&page_num={page_num}"
-
-# 获取所有药店数据并返回数据列表
-def get_all_pharmacy_data(api_count, location, source_name):
-    page_num = 0
-    all_pois_count = 0
+# 获取单个坐标附近的所有药店数据，返回 (数据列表, 是否完整获取)
+# 配额用尽、API报错或网络异常时只有部分数据，complete 为 False，需要重新查询
+def get_all_pharmacy_data(client, location, source_name):
+    pois, complete = client.fetch_all_pages(query=query, location=location, radius=radius)
     data_list = []  # 存储所有数据
-    
-    while api_count < max_api_calls:
-        url = build_url(page_num, location)
-        try:
-            response = requests.get(url, timeout=10)
-            api_count += 1
-            logging.info(f"API调用 {api_count}: {url}")
-            
-            data = response.json()
-            if data["status"] != 0:
-                logging.warning(f"API返回错误状态: {data.get('message', '未知错误')}")
-                break
-                
-            pois = data["results"]
-            if not pois:
-                break
-                
-            for poi in pois:
-                uid = poi["uid"]
-                street_id = poi.get("street_id", "")
-                name = poi["name"]
-                city = poi["city"]
-                area = poi["area"]
-                address = poi["address"]
-                location_data = poi["location"]
-                lat = location_data["lat"]
-                lng = location_data["lng"]
-                detail_url = poi["detail_info"].get("detail_url", "")
-                shop_hours = poi["detail_info"].get("shop_hours", "")
-                image_num = poi["detail_info"].get("image_num", "")
-                navi_location = poi["detail_info"].get("navi_location", {})
-                lat2 = navi_location.get("lat", "")
-                lng2 = navi_location.get("lng", "")
-
-                data_row = {
-                    '源药店': source_name,
-                    '源坐标': location,
-                    'uid': uid,
-                    'street_id': street_id,
-                    '名称': name,
-                    '城市': city,
-                    '区域': area,
-                    '地址': address,
-                    '经纬度': f"{lat},{lng}",
-                    '导航经纬度': f"{lat2},{lng2}" if lat2 and lng2 else "",
-                    '营业时间': shop_hours,
-                    '图片数': image_num,
-                    '详情链接': detail_url
-                }
-                data_list.append(data_row)
-
-            all_pois_count += len(pois)
-            page_num += 1
-
-            total = data.get("total", 0)
-            logging.info(f"已获取: {all_pois_count}, 总计: {total}, API调用次数: {api_count}")
-            
-            if all_pois_count >= total:
-                break
-                
-        except Exception as e:
-            logging.error(f"请求出错: {str(e)}")
-            break
-            
-        # 检查API调用次数
-        if api_count >= max_api_calls:
-            logging.warning(f"已达到最大API调用次数限制: {max_api_calls}")
-            break
-
-    return data_list, api_count
+    for poi in pois:
+        data_row = {'源药店': source_name, '源坐标': location}
+        data_row.update(parse_poi(poi))
+        data_list.append(data_row)
+    return data_list, complete
 
 # 从Excel读取药店数据
 def read_pharmacy_data_from_excel(file_path):
@@ -142,9 +75,12 @@ def save_to_excel(data_list, output_path):
     print(f"共保存 {len(data_list)} 条记录")
 
 if __name__ == "__main__":
+    client = BaiduPlaceClient(ak, ledger=QuotaLedger(ak, max_api_calls),
+                              rate=requests_per_second, max_workers=max_workers)
+    
     print(f"开始处理遵义市药店附近搜索...")
-    print(f"当前API调用次数: {api_count}")
-    print(f"最大API调用次数: {max_api_calls}")
+    print(f"该AK今天已调用（所有脚本合计）: {client.ledger.daily_count}, 每日上限: {client.ledger.daily_limit}")
+    print(f"本次运行最大API调用次数: {max_api_calls}")
     
     # 读取药店数据
     pharmacy_data = read_pharmacy_data_from_excel(excel_file_path)
@@ -152,20 +88,25 @@ if __name__ == "__main__":
     
     all_results = []
     processed_count = 0
+    incomplete = []  # 未完整获取的药店
     
-    for pharmacy in pharmacy_data:
-        if api_count >= max_api_calls:
-            print(f"已达到API调用次数限制，停止处理")
-            break
-            
-        print(f"正在处理第 {processed_count + 1}/{len(pharmacy_data)} 个药店: {pharmacy['name']}")
-        
-        # 获取附近药店数据
-        nearby_data, api_count = get_all_pharmacy_data(api_count, pharmacy['location'], pharmacy['name'])
+    # 多个源药店并发查询，按输入顺序依次汇总结果
+    results = client.map_concurrent(
+        lambda p: get_all_pharmacy_data(client, p['location'], p['name']),
+        pharmacy_data
+    )
+    for pharmacy, (nearby_data, complete) in results:
         all_results.extend(nearby_data)
         
+        if not complete:
+            # 部分数据照常保存，但不算处理完成
+            incomplete.append(pharmacy)
+            print(f"药店未完整获取: {pharmacy['name']}，获得 {len(nearby_data)} 条附近药店数据，需要重新查询")
+            logging.warning(f"未完整获取: {pharmacy['name']} ({pharmacy['location']})")
+            continue
+        
         processed_count += 1
-        print(f"已处理 {processed_count} 个药店，获得 {len(nearby_data)} 条附近药店数据，累计API调用: {api_count}")
+        print(f"已处理第 {processed_count}/{len(pharmacy_data)} 个药店: {pharmacy['name']}，获得 {len(nearby_data)} 条附近药店数据，累计API调用: {client.ledger.count}")
         
         # 每处理200个药店保存一次（防止数据丢失）
         if processed_count % 200 == 0:
@@ -173,12 +114,19 @@ if __name__ == "__main__":
             save_to_excel(all_results, temp_file)
             print(f"临时保存到: {temp_file}")
     
+    if client.ledger.exhausted:
+        print(f"已达到API调用次数限制，停止处理")
+    if incomplete:
+        print(f"有 {len(incomplete)} 个药店未完整获取（配额用尽、API报错或网络异常），需要重新查询:")
+        for pharmacy in incomplete:
+            print(f"  {pharmacy['name']} ({pharmacy['location']})")
+    
     # 最终保存
     save_to_excel(all_results, out_file_path)
     
     print(f"\n处理完成!")
-    print(f"总共处理了 {processed_count} 个药店")
+    print(f"总共处理了 {processed_count} 个药店，未完整获取 {len(incomplete)} 个")
     print(f"获得 {len(all_results)} 条附近药店数据")
-    print(f"最终API调用次数: {api_count}")
+    print(f"最终API调用次数: {client.ledger.count}")
     print(f"数据保存到: {out_file_path}")
-    print(f"日志保存到: {log_file_path}")
\ No newline at end of file
+    print(f"日志保存到: {log_file_path}")
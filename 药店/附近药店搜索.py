@@ -1,12 +1,13 @@
-import csv
-import requests
-import json
 import logging
-import openpyxl
+import math
+import numpy as np
 import pandas as pd
+from collections import defaultdict
 from datetime import datetime
 import os
-import time
+
+from baidu_place_client import BaiduPlaceClient, QuotaLedger, ResponseCache, parse_poi
+from coord_transform import EARTH_RADIUS_M
 
 # 配置参数
 excel_file_path = '/Users/a000/Documents/济生/药店拜访25/贵州药店查询结果_20251213.xlsx'  # 输入文件
@@ -29,10 +30,14 @@ log_file_path = f'{input_dir}/附近药店搜索_{datetime.now().strftime("%Y%m%
 ak = "9quP8V19nrZZdtTPu3Dgc66kvPSnV0rf"
 radius = "3000"
 query = "药店"
-page_size = 20
-api_count = 0  # 当前已使用的API次数
-max_api_calls = 100  # 最大API调用次数
-request_delay = 0.5  # API调用之间的延迟时间（秒），可根据需要调整
+max_api_calls = 100  # 本次运行最大API调用次数（该AK当天所有脚本的合计由共享配额账本限制）
+requests_per_second = 2.0  # 全局请求速率（次/秒），可根据需要调整
+max_workers = 4  # 同时查询的源药店数量
+
+# 查询缓存与覆盖规划
+cache_file_path = f'{input_dir}/附近药店搜索缓存.sqlite'  # 响应缓存（跨次运行复用）
+location_decimals = 4  # 查询坐标保留的小数位数（约10米），相同量化坐标+半径直接命中缓存
+coverage_threshold = 0.9  # 源药店的搜索圆被已查询的圆覆盖比例达到该值时跳过
 
 # 设置日志
 logging.basicConfig(
@@ -41,88 +46,81 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# 构建请求URL的函数
-def build_url(page_num, location):
-    return f"https://api.map.baidu.com/place/v2/search?query={query}&scope=2&location={location}&radius={radius}&output=json&ak={ak}&page_size={page_size}&page_num={page_num}"
+# 覆盖规划：跳过搜索圆已基本被之前查询覆盖的源药店
+class CoveragePlanner:
+    def __init__(self, radius_m, samples=64):
+        self.radius_m = radius_m
+        # 圆盘内均匀分布的采样点（Fibonacci 螺旋），以米为单位的偏移
+        k = np.arange(samples) + 0.5
+        r = np.sqrt(k / samples) * radius_m
+        theta = k * math.pi * (3 - math.sqrt(5))
+        self.offsets = np.column_stack((r * np.cos(theta), r * np.sin(theta)))
+        # 已查询的圆心按网格存放，网格边长为半径对应的纬度差
+        self.cell_deg = math.degrees(radius_m / EARTH_RADIUS_M)
+        self.cells = defaultdict(list)
 
-# 获取所有药店数据并返回数据列表
-def get_all_pharmacy_data(api_count, location, source_name):
-    page_num = 0
-    all_pois_count = 0
-    data_list = []  # 存储所有数据
-    
-    while api_count < max_api_calls:
-        url = build_url(page_num, location)
-        try:
-            response = requests.get(url, timeout=10)
-            api_count += 1
-            logging.info(f"API调用 {api_count}: {url}")
-            
-            # 添加请求延迟，避免请求过快
-            time.sleep(request_delay)
-            
-            data = response.json()
-            if data["status"] != 0:
-                logging.warning(f"API返回错误状态: {data.get('message', '未知错误')}")
-                break
-                
-            pois = data["results"]
-            if not pois:
-                break
-                
-            for poi in pois:
-                uid = poi["uid"]
-                street_id = poi.get("street_id", "")
-                name = poi["name"]
-                city = poi["city"]
-                area = poi["area"]
-                address = poi["address"]
-                location_data = poi["location"]
-                lat = location_data["lat"]
-                lng = location_data["lng"]
-                detail_url = poi["detail_info"].get("detail_url", "")
-                shop_hours = poi["detail_info"].get("shop_hours", "")
-                image_num = poi["detail_info"].get("image_num", "")
-                navi_location = poi["detail_info"].get("navi_location", {})
-                lat2 = navi_location.get("lat", "")
-                lng2 = navi_location.get("lng", "")
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
 
-                data_row = {
-                    '源药店': source_name,
-                    '源坐标': location,
-                    'uid': uid,
-                    'street_id': street_id,
-                    '名称': name,
-                    '城市': city,
-                    '区域': area,
-                    '地址': address,
-                    '经纬度': f"{lat},{lng}",
-                    '导航经纬度': f"{lat2},{lng2}" if lat2 and lng2 else "",
-                    '营业时间': shop_hours,
-                    '图片数': image_num,
-                    '详情链接': detail_url
-                }
-                data_list.append(data_row)
+    def _nearby_centers(self, lat, lng):
+        """取出可能与该点搜索圆相交的已查询圆心（圆心距离不超过2倍半径）"""
+        row, col = self._cell(lat, lng)
+        lng_span = int(math.ceil(2 / max(math.cos(math.radians(lat)), 1e-6)))
+        centers = []
+        for dr in range(-2, 3):
+            for dc in range(-lng_span, lng_span + 1):
+                centers.extend(self.cells.get((row + dr, col + dc), ()))
+        return centers
 
-            all_pois_count += len(pois)
-            page_num += 1
+    def coverage(self, lat, lng):
+        """返回以 (lat, lng) 为圆心的搜索圆被已查询圆覆盖的比例"""
+        centers = self._nearby_centers(lat, lng)
+        if not centers:
+            return 0.0
+        # 以当前圆心为原点做局部平面投影（米）
+        centers = np.asarray(centers)
+        scale_x = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat))
+        scale_y = math.radians(1) * EARTH_RADIUS_M
+        cx = (centers[:, 1] - lng) * scale_x
+        cy = (centers[:, 0] - lat) * scale_y
+        dx = self.offsets[:, 0:1] - cx
+        dy = self.offsets[:, 1:2] - cy
+        covered = ((dx * dx + dy * dy) <= self.radius_m ** 2).any(axis=1)
+        return float(covered.mean())
 
-            total = data.get("total", 0)
-            logging.info(f"已获取: {all_pois_count}, 总计: {total}, API调用次数: {api_count}")
-            
-            if all_pois_count >= total:
-                break
-                
-        except Exception as e:
-            logging.error(f"请求出错: {str(e)}")
-            break
-            
-        # 检查API调用次数
-        if api_count >= max_api_calls:
-            logging.warning(f"已达到最大API调用次数限制: {max_api_calls}")
-            break
+    def mark(self, lat, lng):
+        self.cells[self._cell(lat, lng)].append((lat, lng))
 
-    return data_list, api_count
+
+def quantize_location(location):
+    """将 "纬度,经度" 坐标量化到 location_decimals 位小数，作为查询坐标和缓存键"""
+    lat, lng = (float(v) for v in location.split(','))
+    return f"{lat:.{location_decimals}f},{lng:.{location_decimals}f}"
+
+
+def plan_queries(pharmacy_data, radius_m):
+    """按输入顺序规划需要查询的源药店，返回 (序号列表, 跳过数量)"""
+    planner = CoveragePlanner(radius_m)
+    planned = []
+    for i, pharmacy in enumerate(pharmacy_data):
+        lat, lng = (float(v) for v in pharmacy['location'].split(','))
+        if planner.coverage(lat, lng) >= coverage_threshold:
+            continue
+        planner.mark(lat, lng)
+        planned.append(i)
+    return planned, len(pharmacy_data) - len(planned)
+
+
+# 获取单个坐标附近的所有药店数据，返回 (数据列表, 是否完整获取)
+# 配额用尽、API报错或网络异常时只有部分数据，complete 为 False，下次需要重新查询
+def get_all_pharmacy_data(client, location, source_name):
+    pois, complete = client.fetch_all_pages(query=query, location=quantize_location(location), radius=radius)
+    data_list = []  # 存储所有数据
+    for poi in pois:
+        data_row = {'源药店': source_name, '源坐标': location}
+        data_row.update(parse_poi(poi))
+        data_list.append(data_row)
+    return data_list, complete
 
 # 从Excel读取药店数据
 def read_pharmacy_data_from_excel(file_path):
@@ -205,9 +203,13 @@ def save_to_excel(data_list, output_path):
     print(f"移除重复记录数: {removed_count}")
 
 if __name__ == "__main__":
+    cache = ResponseCache(cache_file_path)
+    client = BaiduPlaceClient(ak, ledger=QuotaLedger(ak, max_api_calls),
+                              rate=requests_per_second, max_workers=max_workers, cache=cache)
+    
     print(f"开始处理药店附近搜索...")
-    print(f"当前API调用次数: {api_count}")
-    print(f"最大API调用次数: {max_api_calls}")
+    print(f"该AK今天已调用（所有脚本合计）: {client.ledger.daily_count}, 每日上限: {client.ledger.daily_limit}")
+    print(f"本次运行最大API调用次数: {max_api_calls}")
     
     # 读取药店数据
     pharmacy_data = read_pharmacy_data_from_excel(excel_file_path)
@@ -226,23 +228,46 @@ if __name__ == "__main__":
             print(f"警告: 在数据中未找到指定的起始uid '{start_from_uid}'，将从头开始处理")
             start_index = 0
     
+    # 覆盖规划在完整列表上进行，保证从中间继续时与之前的规划一致
+    planned, skipped_count = plan_queries(pharmacy_data, float(radius))
+    planned = [i for i in planned if i >= start_index]
+    print(f"覆盖规划: 跳过 {skipped_count} 个搜索范围已被覆盖的源药店，待查询 {len(planned)} 个")
+    logging.info(f"覆盖规划: 跳过 {skipped_count} 个源药店，待查询 {len(planned)} 个")
+    
     all_results = []
-    processed_count = start_index  # 初始化为起始索引
+    seen_uids = set()  # 按uid流式去重
+    duplicate_count = 0
+    processed_count = 0
+    last_index = start_index - 1  # 从起始位置开始连续完整获取的最后一个药店，下次从它之后继续
+    incomplete = []  # 未完整获取的药店序号
     
-    for i in range(start_index, len(pharmacy_data)):
+    # 多个源药店并发查询，按输入顺序依次汇总结果
+    results = client.map_concurrent(
+        lambda i: get_all_pharmacy_data(client, pharmacy_data[i]['location'], pharmacy_data[i]['name']),
+        planned
+    )
+    for i, (nearby_data, complete) in results:
         pharmacy = pharmacy_data[i]
-        if api_count >= max_api_calls:
-            print(f"已达到API调用次数限制，停止处理")
-            break
-            
-        print(f"正在处理第 {i + 1}/{len(pharmacy_data)} 个药店: {pharmacy['name']}")
+        new_rows = 0
+        for row in nearby_data:
+            if row['uid'] in seen_uids:
+                duplicate_count += 1
+                continue
+            seen_uids.add(row['uid'])
+            all_results.append(row)
+            new_rows += 1
         
-        # 获取附近药店数据
-        nearby_data, api_count = get_all_pharmacy_data(api_count, pharmacy['location'], pharmacy['name'])
-        all_results.extend(nearby_data)
+        if not complete:
+            # 部分数据照常保存，但不算处理完成，续查位置停在它之前
+            incomplete.append(i)
+            print(f"第 {i + 1}/{len(pharmacy_data)} 个药店未完整获取: {pharmacy['name']}，获得 {len(nearby_data)} 条附近药店数据，下次需重新查询")
+            logging.warning(f"未完整获取: {pharmacy['name']} ({pharmacy['location']})")
+            continue
         
         processed_count += 1
-        print(f"已处理 {processed_count} 个药店，获得 {len(nearby_data)} 条附近药店数据，累计API调用: {api_count}")
+        if not incomplete:
+            last_index = i
+        print(f"已处理第 {i + 1}/{len(pharmacy_data)} 个药店: {pharmacy['name']}，获得 {len(nearby_data)} 条附近药店数据（新增 {new_rows} 条），累计API调用: {client.ledger.count}")
         
         # 每处理200个药店保存一次（防止数据丢失）
         if processed_count % 200 == 0:
@@ -250,12 +275,30 @@ if __name__ == "__main__":
             save_to_excel(all_results, temp_file)
             print(f"临时保存到: {temp_file}")
     
+    if client.ledger.exhausted:
+        print(f"已达到API调用次数限制，停止处理")
+    if incomplete:
+        print(f"有 {len(incomplete)} 个药店未完整获取（配额用尽、API报错或网络异常），需要重新查询:")
+        for i in incomplete:
+            print(f"  第 {i + 1} 个: {pharmacy_data[i]['name']} (uid: {pharmacy_data[i].get('uid', '')})")
+    if client.ledger.exhausted or incomplete:
+        # 续查位置之后已完整获取的药店重新运行时直接读取缓存，不再调用API
+        if last_index >= start_index:
+            if last_index < len(pharmacy_data) - 1:
+                print(f"下次可从uid为 '{pharmacy_data[last_index].get('uid', '')}' 的药店之后继续")
+        elif start_from_uid:
+            print(f"下次仍从uid为 '{start_from_uid}' 的药店之后继续")
+        else:
+            print(f"下次仍从头开始")
+    
     # 最终保存
     save_to_excel(all_results, out_file_path)
+    cache.close()
     
     print(f"\n处理完成!")
-    print(f"总共处理了 {processed_count - start_index} 个药店 (从第 {start_index + 1} 个开始)")
-    print(f"获得 {len(all_results)} 条附近药店数据")
-    print(f"最终API调用次数: {api_count}")
+    print(f"总共查询了 {processed_count} 个药店，未完整获取 {len(incomplete)} 个 (从第 {start_index + 1} 个开始，跳过 {skipped_count} 个已覆盖的药店)")
+    print(f"缓存命中 {cache.hits} 次，未命中 {cache.misses} 次")
+    print(f"获得 {len(all_results)} 条附近药店数据（按uid去重移除 {duplicate_count} 条）")
+    print(f"最终API调用次数: {client.ledger.count}")
     print(f"数据保存到: {out_file_path}")
-    print(f"日志保存到: {log_file_path}")
\ No newline at end of file
+    print(f"日志保存到: {log_file_path}")